@@ -0,0 +1,169 @@
+"""
+Бенчмарк разбора тикеров: прежний путь против таблицы полей и быстрого JSON.
+
+Сообщения проходят через настоящий менеджер pybit (без подключения):
+разбор JSON, наложение delta, callback и применение к TickerStateTable.
+Результат - сообщений в секунду на одно ядро.
+
+    python -m benchmarks.bench_decoder --messages 50000 --repeat 5
+"""
+import sys
+import os
+import argparse
+import json
+import random
+from time import perf_counter, time
+
+# Добавляем корневую директорию в путь Python
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pybit._websocket_stream import _V5WebSocketManager
+
+from utils.ticker_decoder import JSON_BACKEND, json_loads, install_fast_handler
+from utils.ticker_state import TickerStateTable
+from tickers_linear_streamer import LINEAR_FLOAT_FIELDS, LINEAR_STATE_TIME_FIELDS, LINEAR_TEXT_FIELDS
+from tickers_spot_streamer import SPOT_FLOAT_FIELDS, SPOT_TEXT_FIELDS
+
+
+class LegacyStateTable(TickerStateTable):
+    """TickerStateTable с прежним разбором: цикл по полям и float() на каждое значение"""
+
+    def apply(self, data, event_time=0, snapshot=False):
+        symbol = data.get('symbol')
+        if not symbol:
+            return None
+
+        with self._lock:
+            i = self._row_index(symbol)
+            values = self.values[i]
+            seen = self.seen[i]
+
+            for j, key in enumerate(self.float_fields):
+                value = data.get(key)
+                if value is None or value == '':
+                    continue
+                try:
+                    values[j] = float(value)
+                    seen[j] = True
+                except (ValueError, TypeError):
+                    pass
+
+            for j, key in enumerate(self.time_fields):
+                value = data.get(key)
+                if value:
+                    try:
+                        self.times[i, j] = int(value)
+                    except (ValueError, TypeError):
+                        pass
+
+            for j, key in enumerate(self.text_fields):
+                value = data.get(key)
+                if value is not None:
+                    self.texts[i, j] = value
+
+            if event_time:
+                self.event_time[i] = event_time
+
+            if not self.ready[i] and (snapshot or seen.all()):
+                self.ready[i] = True
+
+            return i if self.ready[i] else None
+
+
+def make_frames(category, count, symbols=300):
+    """Сырые WebSocket кадры: snapshot на символ, затем delta (linear) или snapshot (spot)"""
+    float_keys = [k for k, _ in (LINEAR_FLOAT_FIELDS if category == 'linear' else SPOT_FLOAT_FIELDS)]
+    now_ms = int(time() * 1000)
+
+    def full(symbol):
+        data = {key: f"{random.uniform(0.01, 70000):.4f}" for key in float_keys}
+        data.update({'symbol': symbol, 'tickDirection': 'PlusTick'})
+        if category == 'linear':
+            data['nextFundingTime'] = str(now_ms + 3600000)
+        return data
+
+    frames = []
+    for i in range(count):
+        symbol = f"SYM{i % symbols}USDT"
+        if category == 'linear' and i >= symbols:
+            # Delta: только изменившиеся поля
+            data = {'symbol': symbol}
+            for key in random.sample(float_keys, 4):
+                data[key] = f"{random.uniform(0.01, 70000):.4f}"
+            kind = 'delta'
+        else:
+            data = full(symbol)
+            kind = 'snapshot'
+        frames.append(json.dumps({
+            'topic': f"tickers.{symbol}", 'type': kind, 'ts': now_ms + i, 'cs': i, 'data': data
+        }))
+    return frames, [f"tickers.SYM{i}USDT" for i in range(symbols)]
+
+
+def make_pipeline(category, topics, fast):
+    """Менеджер pybit с обработчиком как в стримере"""
+    if category == 'linear':
+        fields = dict(float_fields=[k for k, _ in LINEAR_FLOAT_FIELDS],
+                      time_fields=[k for k, _ in LINEAR_STATE_TIME_FIELDS],
+                      text_fields=[k for k, _ in LINEAR_TEXT_FIELDS])
+    else:
+        fields = dict(float_fields=[k for k, _ in SPOT_FLOAT_FIELDS],
+                      text_fields=[k for k, _ in SPOT_TEXT_FIELDS])
+    state = TickerStateTable(**fields) if fast else LegacyStateTable(**fields)
+
+    def handler(message):
+        data = message.get('data', {})
+        event_time = int(message.get('ts') or data.get('ts'))
+        row = state.apply(data, event_time, snapshot=message.get('type') == 'snapshot')
+        if row is not None:
+            state.record(row)
+
+    ws = _V5WebSocketManager('bench', testnet=False)
+    ws.data = {}
+    for topic in topics:
+        ws.callback_directory[topic] = handler
+    if fast:
+        install_fast_handler(ws)
+    return ws
+
+
+def bench(name, func, count, repeat):
+    best = min(_timed(func) for _ in range(repeat))
+    rate = count / best
+    print(f"  {name:<36} {rate:>12,.0f} msg/s   {best / count * 1e6:7.2f} us/msg")
+    return rate
+
+
+def _timed(func):
+    start = perf_counter()
+    func()
+    return perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ticker decoder benchmark")
+    parser.add_argument('--messages', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"📊 Ticker decoder benchmark: {args.messages} messages, {args.repeat} repeats, "
+          f"JSON backend: {JSON_BACKEND}")
+
+    for category in ('spot', 'linear'):
+        frames, topics = make_frames(category, args.messages)
+        print(f"{category}:")
+
+        bench("json.loads", lambda: [json.loads(f) for f in frames], len(frames), args.repeat)
+        bench(f"{JSON_BACKEND} loads", lambda: [json_loads(f) for f in frames], len(frames), args.repeat)
+
+        legacy = make_pipeline(category, topics, fast=False)
+        fast = make_pipeline(category, topics, fast=True)
+        legacy_rate = bench("current handler (pybit + field loop)",
+                            lambda: [legacy._on_message(f) for f in frames], len(frames), args.repeat)
+        fast_rate = bench("fast handler (decoder table)",
+                          lambda: [fast._on_message(f) for f in frames], len(frames), args.repeat)
+        print(f"  Speedup: x{fast_rate / legacy_rate:.1f}")
+
+
+if __name__ == '__main__':
+    main()
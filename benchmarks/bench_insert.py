@@ -0,0 +1,173 @@
+"""
+Бенчмарк подготовки пакета тикеров к вставке: строки-кортежи против колонок NumPy.
+
+Обе ветки проходят полный клиентский путь: разбор сообщения, сборка пакета
+и сериализация блока в native протокол clickhouse_driver (в пустой сокет).
+Сервер для запуска не нужен.
+
+    python -m benchmarks.bench_insert --rows 10000 --repeat 5
+"""
+import sys
+import os
+import argparse
+import random
+from datetime import datetime
+from time import perf_counter, time
+
+# Добавляем корневую директорию в путь Python
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from clickhouse_driver import Client
+from clickhouse_driver.block import RowOrientedBlock, ColumnOrientedBlock
+from clickhouse_driver.bufferedwriter import BufferedSocketWriter
+from clickhouse_driver.connection import ServerInfo
+from clickhouse_driver.streams.native import BlockOutputStream
+
+from utils.column_buffer import ColumnBuffer
+from tickers_linear_streamer import (
+    LINEAR_FLOAT_FIELDS, LINEAR_TIME_COLUMNS, LINEAR_TEXT_COLUMNS, LINEAR_FLOAT_COLUMNS
+)
+
+# JSON ключи Bybit в порядке LINEAR_FLOAT_COLUMNS
+FLOAT_KEYS = [key for key, _ in LINEAR_FLOAT_FIELDS]
+
+COLUMN_TYPES = (
+    [(name, 'DateTime64(3)') for name in LINEAR_TIME_COLUMNS if name != 'next_funding_time'] +
+    [('next_funding_time', 'Nullable(DateTime64(3))'), ('symbol', 'String')] +
+    [(name, 'String') for name in LINEAR_TEXT_COLUMNS] +
+    [(name, 'Float64') for name in LINEAR_FLOAT_COLUMNS]
+)
+
+
+class NullSocket:
+    """Сокет, который выбрасывает все записанные данные"""
+
+    def __init__(self):
+        self.bytes_sent = 0
+
+    def sendall(self, data):
+        self.bytes_sent += len(data)
+
+
+def make_messages(count, symbols=500):
+    """Синтетические linear тикеры в формате Bybit"""
+    now_ms = int(time() * 1000)
+    messages = []
+    for i in range(count):
+        data = {key: f"{random.uniform(0.01, 70000):.4f}" for key in FLOAT_KEYS}
+        data.update({
+            'symbol': f"SYM{i % symbols}USDT",
+            'tickDirection': random.choice(['PlusTick', 'MinusTick', 'ZeroPlusTick']),
+            'nextFundingTime': str(now_ms + 3600000),
+        })
+        messages.append({'topic': f"tickers.{data['symbol']}", 'ts': now_ms + i, 'data': dict(data, ts=now_ms + i)})
+    return messages
+
+
+def make_output_stream(use_numpy):
+    """Поток сериализации блоков с контекстом как у подключенного клиента"""
+    client = Client('localhost', settings={'use_numpy': use_numpy})
+    client.make_query_settings(None)
+    context = client.connection.context
+    context.server_info = ServerInfo('ClickHouse', 23, 8, 0, 54468, 'UTC', 'bench', 54468)
+    return BlockOutputStream(BufferedSocketWriter(NullSocket(), 1 << 20), context)
+
+
+def safe_float(value, default=0.0):
+    if value is None or value == '':
+        return default
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return default
+
+
+def safe_datetime(ts_value):
+    if not ts_value:
+        return None
+    try:
+        return datetime.fromtimestamp(int(ts_value) / 1000)
+    except (ValueError, TypeError):
+        return None
+
+
+def build_rows(messages):
+    """Прежний путь: кортеж Python объектов и datetime на каждую строку"""
+    rows = []
+    for message in messages:
+        data = message['data']
+        rows.append((
+            safe_datetime(data.get('ts')) or datetime.now(),
+            datetime.now(),
+            safe_datetime(data.get('nextFundingTime')),
+            data.get('symbol', ''),
+            data.get('tickDirection', ''),
+            *[safe_float(data.get(key)) for key in FLOAT_KEYS]
+        ))
+    return rows
+
+
+def build_columns(messages, buffer):
+    """Колоночный путь: значения пишутся в предвыделенные массивы"""
+    buffer.clear()
+    for message in messages:
+        data = message['data']
+        times = (int(data.get('ts')), int(time() * 1000), int(data.get('nextFundingTime') or 0))
+        floats = [safe_float(data.get(key)) for key in FLOAT_KEYS]
+        buffer.append(times, data.get('symbol', ''), (data.get('tickDirection', ''),), floats)
+    return buffer.columns()
+
+
+def bench(name, func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = perf_counter()
+        func()
+        timings.append(perf_counter() - start)
+    best = min(timings)
+    print(f"  {name:<28} best {best * 1000:8.1f} ms   avg {sum(timings) / len(timings) * 1000:8.1f} ms")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Row vs columnar insert preparation benchmark")
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    messages = make_messages(args.rows)
+    buffer = ColumnBuffer(
+        time_columns=LINEAR_TIME_COLUMNS,
+        symbol_column='symbol',
+        text_columns=LINEAR_TEXT_COLUMNS,
+        float_columns=LINEAR_FLOAT_COLUMNS,
+        nullable_time_columns=['next_funding_time'],
+        capacity=args.rows
+    )
+    # Порядок типов должен совпадать с порядком колонок буфера
+    types = dict(COLUMN_TYPES)
+    columns_with_types = [(name, types[name]) for name in buffer.column_names]
+    row_columns_with_types = [(name, types[name]) for name in
+                              LINEAR_TIME_COLUMNS + ['symbol'] + LINEAR_TEXT_COLUMNS + LINEAR_FLOAT_COLUMNS]
+
+    row_stream = make_output_stream(use_numpy=False)
+    numpy_stream = make_output_stream(use_numpy=True)
+
+    print(f"📊 Insert preparation benchmark: {args.rows} rows, {args.repeat} repeats")
+
+    print("Build only:")
+    rows_build = bench("row tuples", lambda: build_rows(messages), args.repeat)
+    columns_build = bench("numpy columns", lambda: build_columns(messages, buffer), args.repeat)
+
+    print("Build + native encoding:")
+    rows_total = bench("row tuples", lambda: row_stream.write(
+        RowOrientedBlock(row_columns_with_types, build_rows(messages))), args.repeat)
+    columns_total = bench("numpy columns", lambda: numpy_stream.write(
+        ColumnOrientedBlock(columns_with_types, build_columns(messages, buffer))), args.repeat)
+
+    print(f"\nSpeedup (build): x{rows_build / columns_build:.1f}")
+    print(f"Speedup (build + encode): x{rows_total / columns_total:.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Бенчмарк проверки правил алертов по всем символам.
+
+    python -m benchmarks.bench_rules --symbols 1000 --rules 50 --repeat 200
+"""
+import sys
+import os
+import argparse
+import random
+from time import perf_counter
+
+# Добавляем корневую директорию в путь Python
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.rules_engine import RulesEngine, METRIC_FIELDS
+from utils.ticker_state import TickerStateTable
+from tickers_linear_streamer import LINEAR_FLOAT_FIELDS, LINEAR_STATE_TIME_FIELDS, LINEAR_TEXT_FIELDS
+
+
+def make_state(symbols):
+    state = TickerStateTable(
+        float_fields=[k for k, _ in LINEAR_FLOAT_FIELDS],
+        time_fields=[k for k, _ in LINEAR_STATE_TIME_FIELDS],
+        text_fields=[k for k, _ in LINEAR_TEXT_FIELDS]
+    )
+    for n in range(symbols):
+        price = random.uniform(0.01, 70000)
+        data = {key: str(random.uniform(0.01, 1000)) for key, _ in LINEAR_FLOAT_FIELDS}
+        data.update({
+            'symbol': f"SYM{n}USDT",
+            'lastPrice': str(price),
+            'prevPrice1h': str(price * random.uniform(0.9, 1.1)),
+            'price24hPcnt': str(random.uniform(-0.2, 0.2)),
+            'fundingRate': str(random.uniform(-0.002, 0.002)),
+            'bid1Price': str(price * 0.9995),
+            'ask1Price': str(price * 1.0005),
+        })
+        state.apply(data, snapshot=True)
+    return state
+
+
+def make_rules(count):
+    metrics = list(METRIC_FIELDS)
+    patterns = ['*', 'SYM1*', ['SYM2USDT', 'SYM3*'], 'SYM*USDT']
+    return [{
+        'name': f"rule {n}",
+        'metric': metrics[n % len(metrics)],
+        'op': ('>', '<', 'abs>')[n % 3],
+        'threshold': random.uniform(0.0, 0.1),
+        'symbols': patterns[n % len(patterns)],
+        'debounce': 60,
+    } for n in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Alert rules engine benchmark")
+    parser.add_argument('--symbols', type=int, default=1000)
+    parser.add_argument('--rules', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    state = make_state(args.symbols)
+    triggers = []
+    engine = RulesEngine(state, make_rules(args.rules), lambda *trigger: triggers.append(trigger))
+
+    # Первый проход: сопоставление шаблонов символов и первые срабатывания
+    start = perf_counter()
+    engine.evaluate()
+    first = perf_counter() - start
+
+    timings = []
+    for _ in range(args.repeat):
+        start = perf_counter()
+        engine.evaluate()
+        timings.append(perf_counter() - start)
+    timings.sort()
+
+    print(f"📊 Rules engine: {args.symbols} symbols x {args.rules} rules")
+    print(f"  first pass (pattern matching)  {first * 1000:8.3f} ms, {len(triggers)} triggers")
+    print(f"  evaluate p50                   {timings[len(timings) // 2] * 1000:8.3f} ms")
+    print(f"  evaluate p99                   {timings[int(len(timings) * 0.99) - 1] * 1000:8.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
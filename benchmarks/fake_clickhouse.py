@@ -0,0 +1,294 @@
+"""
+Локальный сервер, отвечающий clickhouse_driver по native протоколу.
+
+Поддерживается ровно то, что нужно бенчмаркам: Hello, Ping, SELECT с
+заранее заданными ответами и INSERT (блоки принимаются, разбираются и
+считаются). Сервер объявляет ревизию протокола 54429: настройки запроса
+передаются строками, а ProfileEvents, параметры запроса и addendum
+клиент не отправляет и не ждет. Сжатие не поддерживается.
+
+Чтение и запись блоков - классы самого clickhouse_driver, поэтому
+клиентская часть (кодирование колонок, буферы сокета, пул соединений)
+работает как с настоящим сервером.
+
+    server = FakeClickHouseServer()
+    server.respond(r"SELECT count\\(\\) FROM trades", [('count()', 'UInt64')], [(100,)])
+    server.start()
+    client = ClickHouseClient(config=server.client_config())
+"""
+import re
+import socket
+import socketserver
+import threading
+
+from clickhouse_driver import Client
+from clickhouse_driver.block import BlockInfo, RowOrientedBlock
+from clickhouse_driver.bufferedreader import BufferedSocketReader
+from clickhouse_driver.bufferedwriter import BufferedSocketWriter
+from clickhouse_driver.connection import ServerInfo
+from clickhouse_driver.protocol import ClientPacketTypes, ServerPacketTypes
+from clickhouse_driver.reader import read_binary_str, read_binary_uint8
+from clickhouse_driver.streams.native import BlockInputStream, BlockOutputStream
+from clickhouse_driver.varint import read_varint, write_varint
+from clickhouse_driver.writer import write_binary_int32, write_binary_str, write_binary_uint8
+
+from utils.schema import TABLES
+
+REVISION = 54429
+VERSION = (23, 8, 0)
+
+# Ошибки ClickHouse: UNKNOWN_TABLE, SYNTAX_ERROR
+UNKNOWN_TABLE = 60
+SYNTAX_ERROR = 62
+
+INSERT_RE = re.compile(r"^\s*INSERT\s+INTO\s+([\w.]+)\s*(?:\(([^)]*)\))?\s*VALUES", re.IGNORECASE)
+
+
+class QueryError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+def make_context(use_numpy=False):
+    """Контекст блоков как у клиента, подключенного к серверу ревизии REVISION"""
+    client = Client('localhost', settings={'use_numpy': use_numpy})
+    client.make_query_settings(None)
+    context = client.connection.context
+    context.server_info = ServerInfo('ClickHouse', *VERSION, REVISION, 'UTC', 'fake', REVISION)
+    return context
+
+
+class FakeClickHouseServer:
+    """Сервер в потоке текущего процесса (порт выбирается свободный)"""
+
+    def __init__(self, host='127.0.0.1', port=0, decode_inserts=True):
+        """
+        Args:
+            host: Адрес сервера
+            port: Порт (0 - свободный)
+            decode_inserts: Разбирать колонки вставок в NumPy (как сервер их читает);
+                False - блоки все равно читаются целиком, но в кортежи Python
+        """
+        self.host = host
+        self.port = port
+        self.decode_inserts = decode_inserts
+        self._responses = []
+        self._lock = threading.Lock()
+        self._server = None
+
+        # Счетчики
+        self.queries = 0
+        self.inserted_rows = {}
+        self.inserted_blocks = 0
+
+        self.respond(r"^\s*SELECT\s+1\s*$", [('1', 'UInt8')], [(1,)])
+
+    def respond(self, pattern, columns_with_types, rows=None):
+        """
+        Ответ на SELECT, текст которого совпадает с pattern (re.search, без учета регистра)
+
+        Args:
+            pattern: Регулярное выражение
+            columns_with_types: [(имя, тип ClickHouse)] или функция query -> (columns_with_types, rows)
+            rows: Строки ответа (список кортежей)
+        """
+        self._responses.insert(0, (re.compile(pattern, re.IGNORECASE | re.DOTALL), columns_with_types, rows))
+
+    def client_config(self, **settings):
+        """Параметры clickhouse_driver.Client для подключения к серверу"""
+        return {
+            'host': self.host,
+            'port': self.port,
+            'user': 'default',
+            'password': '',
+            'database': 'default',
+            'settings': {'use_numpy': False, **settings},
+        }
+
+    def start(self):
+        fake = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                fake._serve(self.request)
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self._server = socketserver.ThreadingTCPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name="fake-clickhouse", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # Соединение
+
+    def _serve(self, sock):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        fin = BufferedSocketReader(sock, 1 << 20)
+        fout = BufferedSocketWriter(sock, 1 << 20)
+        block_in = BlockInputStream(fin, make_context(use_numpy=self.decode_inserts))
+        block_out = BlockOutputStream(fout, make_context())
+        try:
+            self._receive_hello(fin)
+            self._send_hello(fout)
+            while True:
+                packet = read_varint(fin)
+                if packet == ClientPacketTypes.PING:
+                    write_varint(ServerPacketTypes.PONG, fout)
+                    fout.flush()
+                elif packet == ClientPacketTypes.QUERY:
+                    self._query(fin, fout, block_in, block_out)
+                elif packet == ClientPacketTypes.CANCEL:
+                    continue
+                else:
+                    raise ValueError(f"Unsupported client packet {packet}")
+        except (EOFError, ConnectionError, OSError):
+            pass
+
+    def _receive_hello(self, fin):
+        if read_varint(fin) != ClientPacketTypes.HELLO:
+            raise ValueError("Expected Hello")
+        read_binary_str(fin)  # имя клиента
+        read_varint(fin)  # major
+        read_varint(fin)  # minor
+        read_varint(fin)  # ревизия клиента
+        read_binary_str(fin)  # база
+        read_binary_str(fin)  # пользователь
+        read_binary_str(fin)  # пароль
+
+    def _send_hello(self, fout):
+        write_varint(ServerPacketTypes.HELLO, fout)
+        write_binary_str('ClickHouse', fout)
+        write_varint(VERSION[0], fout)
+        write_varint(VERSION[1], fout)
+        write_varint(REVISION, fout)
+        write_binary_str('UTC', fout)
+        write_binary_str('fake', fout)
+        write_varint(VERSION[2], fout)
+        fout.flush()
+
+    def _read_query(self, fin):
+        """Пакет Query ревизии REVISION: id, ClientInfo, настройки, стадия, сжатие, текст"""
+        read_binary_str(fin)  # query_id
+        if read_binary_uint8(fin):  # query_kind: 0 - ClientInfo пустой
+            for _ in range(3):  # initial_user, initial_query_id, initial_address
+                read_binary_str(fin)
+            read_binary_uint8(fin)  # interface
+            for _ in range(3):  # os_user, client_hostname, client_name
+                read_binary_str(fin)
+            for _ in range(3):  # major, minor, revision
+                read_varint(fin)
+            read_binary_str(fin)  # quota_key
+            read_varint(fin)  # version_patch
+
+        settings = {}
+        while True:
+            name = read_binary_str(fin)
+            if not name:
+                break
+            read_binary_uint8(fin)  # флаги
+            settings[name] = read_binary_str(fin)
+
+        read_varint(fin)  # стадия
+        if read_varint(fin):
+            raise ValueError("Compression is not supported by the fake server")
+        return read_binary_str(fin), settings
+
+    def _read_data(self, fin, block_in):
+        if read_varint(fin) != ClientPacketTypes.DATA:
+            raise ValueError("Expected Data")
+        read_binary_str(fin)  # имя временной таблицы
+        return block_in.read()
+
+    def _query(self, fin, fout, block_in, block_out):
+        query, _ = self._read_query(fin)
+        # Внешние таблицы: клиент всегда завершает их пустым блоком
+        while self._read_data(fin, block_in).num_rows:
+            pass
+        with self._lock:
+            self.queries += 1
+
+        try:
+            insert = INSERT_RE.match(query)
+            if insert:
+                self._insert(insert, fin, fout, block_in, block_out)
+            else:
+                columns_with_types, rows = self._select(query)
+                # Как настоящий сервер: сначала заголовок (из него клиент берет типы колонок), затем строки
+                self._send_header(fout, columns_with_types)
+                if rows:
+                    self._send_data(fout, block_out, RowOrientedBlock(columns_with_types, rows))
+        except QueryError as e:
+            self._send_exception(fout, e.code, str(e))
+            return
+        write_varint(ServerPacketTypes.END_OF_STREAM, fout)
+        fout.flush()
+
+    def _select(self, query):
+        for pattern, columns_with_types, rows in self._responses:
+            if pattern.search(query):
+                if callable(columns_with_types):
+                    return columns_with_types(query)
+                return columns_with_types, rows
+        raise QueryError(SYNTAX_ERROR, f"No fake response for query: {query.strip()[:200]}")
+
+    def _insert(self, match, fin, fout, block_in, block_out):
+        table = match.group(1).split('.')[-1]
+        schema = TABLES.get(table)
+        if schema is None:
+            raise QueryError(UNKNOWN_TABLE, f"Table {table} doesn't exist")
+        types = {c.name: c.type for c in schema.columns}
+        names = [n.strip() for n in match.group(2).split(',')] if match.group(2) else schema.column_names
+
+        # Пустой блок со структурой таблицы: по нему клиент кодирует данные
+        self._send_header(fout, [(n, types[n]) for n in names])
+        rows = 0
+        blocks = 0
+        while True:
+            block = self._read_data(fin, block_in)
+            if not block.num_columns and not block.num_rows:
+                break
+            rows += block.num_rows
+            blocks += 1
+        with self._lock:
+            self.inserted_rows[table] = self.inserted_rows.get(table, 0) + rows
+            self.inserted_blocks += blocks
+
+    def _send_data(self, fout, block_out, block):
+        write_varint(ServerPacketTypes.DATA, fout)
+        write_binary_str('', fout)
+        block_out.write(block)
+
+    def _send_header(self, fout, columns_with_types):
+        # Блок без строк: только имена и типы колонок (BlockOutputStream писал бы префиксы
+        # состояния колонок, которые клиент для пустого блока не читает)
+        write_varint(ServerPacketTypes.DATA, fout)
+        write_binary_str('', fout)
+        BlockInfo().write(fout)
+        write_varint(len(columns_with_types), fout)
+        write_varint(0, fout)
+        for name, type_ in columns_with_types:
+            write_binary_str(name, fout)
+            write_binary_str(type_, fout)
+        fout.flush()
+
+    def _send_exception(self, fout, code, message):
+        write_varint(ServerPacketTypes.EXCEPTION, fout)
+        write_binary_int32(code, fout)
+        write_binary_str('DB::Exception', fout)
+        write_binary_str(message, fout)
+        write_binary_str('', fout)
+        write_binary_uint8(0, fout)
+        fout.flush()
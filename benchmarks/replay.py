@@ -0,0 +1,317 @@
+"""
+Воспроизведение записанных WebSocket кадров через обработчик стримера.
+
+Кадры из записи FrameRecorder (INGEST_RECORD_DIR) подаются в настоящий
+LinearTickerStreamer/SpotTickerStreamer через тот же путь, что и в
+работе: менеджер pybit с install_fast_handler, planner.on_message,
+handle_*_ticker, очередь BatchWriter и поток записи. Сеть не нужна:
+подписка не выполняется, а ClickHouse заменяется приемником:
+
+    null        - вставки только считаются
+    native      - блоки сериализуются в native протокол clickhouse_driver
+                  (как при настоящей вставке, в пустой сокет)
+    clickhouse  - настоящий ClickHouseClient (таблицы должны существовать)
+
+Режимы: как можно быстрее (по умолчанию) или в реальном времени
+(--realtime, ускорение --speed) по времени приема кадров.
+
+Отчет: сообщений в секунду, перцентили времени обработки кадра,
+сборки мусора и прирост выделенных блоков памяти; --trace-alloc
+включает tracemalloc (медленнее) и выводит места выделения памяти.
+
+    python -m benchmarks.replay data/recordings/linear-0-*.ndjson.zst
+    python -m benchmarks.replay --synthetic 200000 --category spot --sink native
+    python -m benchmarks.replay data/recordings --realtime --speed 10
+"""
+import sys
+import os
+import argparse
+import gc
+import json
+import tempfile
+import tracemalloc
+from itertools import islice
+from time import perf_counter, perf_counter_ns, sleep, time
+
+# Добавляем корневую директорию в путь Python
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pybit._websocket_stream import _V5WebSocketManager
+
+from config.ingest_config import INGEST_CONFIG
+from utils.frame_recorder import read_frames, recording_files
+from utils.metrics import Histogram
+from utils.schema import TABLES
+from utils.ticker_decoder import JSON_BACKEND
+
+
+class NullPool:
+    """Пул без соединений (метрики BatchWriter читают in_use и reconnects)"""
+
+    in_use = 0
+    reconnects = 0
+
+    def stats(self):
+        return {'size': 0, 'created': 0, 'idle': 0, 'in_use': 0, 'reconnects': 0}
+
+
+class NullClickHouse:
+    """Приемник вставок без сервера: строки только считаются"""
+
+    def __init__(self):
+        self.pool = NullPool()
+        self.inserts = 0
+        self.rows = {}
+        # Счетчики повторов ClickHouseClient (метрики BatchWriter)
+        self.insert_attempts = 0
+        self.retried_inserts = 0
+        self.retry_seconds = 0.0
+        self.failed_inserts = 0
+
+    def execute(self, query, params=None, **kwargs):
+        return []
+
+    def pool_stats(self):
+        return self.pool.stats()
+
+    def insert_data(self, table, data, dedup_token=None):
+        if data:
+            self._count(table, len(data))
+
+    def insert_columns(self, table, column_names, columns, dedup_token=None):
+        if columns and len(columns[0]):
+            self._count(table, len(columns[0]))
+
+    def _count(self, table, rows):
+        self.inserts += 1
+        self.insert_attempts += 1
+        self.rows[table] = self.rows.get(table, 0) + rows
+
+
+class NativeClickHouse(NullClickHouse):
+    """Приемник с сериализацией блоков в native протокол, как у clickhouse_driver перед отправкой"""
+
+    def __init__(self):
+        super().__init__()
+        from benchmarks.bench_insert import make_output_stream
+        self._row_stream = make_output_stream(use_numpy=False)
+        self._numpy_stream = make_output_stream(use_numpy=True)
+
+    def insert_data(self, table, data, dedup_token=None):
+        from clickhouse_driver.block import RowOrientedBlock
+        if not data:
+            return
+        types = [(c.name, c.type) for c in TABLES[table].columns][:len(data[0])]
+        self._row_stream.write(RowOrientedBlock(types, data))
+        self._count(table, len(data))
+
+    def insert_columns(self, table, column_names, columns, dedup_token=None):
+        from clickhouse_driver.block import ColumnOrientedBlock
+        if not columns or not len(columns[0]):
+            return
+        types = {c.name: c.type for c in TABLES[table].columns}
+        self._numpy_stream.write(ColumnOrientedBlock([(name, types[name]) for name in column_names], columns))
+        self._count(table, len(columns[0]))
+
+
+class AllTopics(dict):
+    """callback_directory, отдающий обработчик для любого топика (подписки при воспроизведении нет)"""
+
+    def __init__(self, callback):
+        super().__init__()
+        self.callback = callback
+
+    def get(self, topic, default=None):
+        return self.callback
+
+
+def make_sink(name):
+    if name == 'null':
+        return NullClickHouse()
+    if name == 'native':
+        return NativeClickHouse()
+    from utils.clickhouse_client import ClickHouseClient
+    return ClickHouseClient()
+
+
+def make_streamer(category, sink, spill_dir):
+    """Стример без подписки, Telegram и HTTP метрик"""
+    INGEST_CONFIG.update({'spill_dir': spill_dir, 'record_dir': '', 'metrics_port': 0})
+    if category == 'linear':
+        import tickers_linear_streamer as module
+        module.BOT_AVAILABLE = False
+        return module.LinearTickerStreamer(symbols=[], ch_client=sink)
+    else:
+        import tickers_spot_streamer as module
+        module.BOT_AVAILABLE = False
+        return module.SpotTickerStreamer(symbols=[], ch_client=sink)
+
+
+def make_connection(streamer):
+    """Менеджер pybit без подключения, настроенный как соединение стримера"""
+    ws = _V5WebSocketManager('replay', testnet=False)
+    ws.data = {}
+    # Тот же callback, что передает планировщик подписок (с учетом первого сообщения символа)
+    ws.callback_directory = AllTopics(streamer.planner.on_message)
+    streamer.prepare_connection(ws)
+    return ws
+
+
+def load_frames(paths, limit=None):
+    """Кадры всех файлов в память (распаковка не входит в замер)"""
+    files = []
+    for path in paths:
+        files.extend(recording_files(path) if os.path.isdir(path) else [path])
+    if not files:
+        raise SystemExit("❌ No recordings found")
+    return files, list(islice(read_frames(files), limit))
+
+
+def synthetic_frames(category, count, rate):
+    """Синтетические кадры с равномерным временем приема (rate сообщений в секунду)"""
+    from benchmarks.bench_decoder import make_frames
+    frames, _ = make_frames(category, count)
+    start_us = int(time() * 1e6)
+    return [(start_us + int(i * 1e6 / rate), frame.encode()) for i, frame in enumerate(frames)]
+
+
+def replay(ws, frames, realtime=False, speed=1.0):
+    """
+    Подача кадров в обработчик
+
+    Returns:
+        (seconds, latency): время подачи и гистограмма времени обработки кадра (сек)
+    """
+    on_message = ws._on_message
+    latency = Histogram(lowest=1e-7, highest=10)
+    observe = latency.observe
+    if not frames:
+        return 0.0, latency
+
+    first_us = frames[0][0]
+    started = perf_counter()
+    for received_us, raw in frames:
+        if realtime:
+            delay = (received_us - first_us) / 1e6 / speed - (perf_counter() - started)
+            if delay > 0:
+                sleep(delay)
+        t0 = perf_counter_ns()
+        on_message(raw)
+        observe((perf_counter_ns() - t0) / 1e9)
+    return perf_counter() - started, latency
+
+
+def run(category, frames, sink_name='null', realtime=False, speed=1.0, trace_alloc=False):
+    """Воспроизведение и отчет (dict)"""
+    sink = make_sink(sink_name)
+    with tempfile.TemporaryDirectory(prefix='replay-spill-') as spill_dir:
+        streamer = make_streamer(category, sink, spill_dir)
+        ws = make_connection(streamer)
+        streamer.writer.start()
+
+        if trace_alloc:
+            tracemalloc.start(10)
+            before = tracemalloc.take_snapshot()
+        gc_before = [s['collections'] for s in gc.get_stats()]
+        blocks_before = sys.getallocatedblocks()
+
+        seconds, latency = replay(ws, frames, realtime=realtime, speed=speed)
+
+        blocks = sys.getallocatedblocks() - blocks_before
+        collections = [s['collections'] - b for s, b in zip(gc.get_stats(), gc_before)]
+        top = []
+        peak = None
+        if trace_alloc:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            top = [(str(stat.traceback[0]), stat.size_diff, stat.count_diff)
+                   for stat in snapshot.compare_to(before, 'lineno')[:10]]
+
+        # Остаток очереди дописывается: время до последней вставки показывает, успевает ли запись
+        drain_started = perf_counter()
+        streamer.writer.stop()
+        drain = perf_counter() - drain_started
+        writer = streamer.writer.stats()
+
+    count = len(frames)
+    quantiles = latency.quantiles((0.5, 0.9, 0.99, 0.999))
+    return {
+        'category': category,
+        'sink': sink_name,
+        'mode': f"realtime x{speed:g}" if realtime else 'max speed',
+        'json_backend': JSON_BACKEND,
+        'messages': count,
+        'seconds': seconds,
+        'messages_per_second': count / seconds if seconds else 0.0,
+        'latency_us': {f"p{q * 100:g}": value * 1e6 for q, value in quantiles.items()},
+        'latency_max_us': latency.max * 1e6,
+        'drain_seconds': drain,
+        'flushed_rows': writer['flushed_rows'],
+        'failed_rows': writer['failed_rows'],
+        'conflated_rows': writer['conflated'],
+        'dropped_rows': writer['dropped'],
+        'sink_inserts': getattr(sink, 'inserts', None),
+        'gc_collections': collections,
+        # gc.collect поколения 0 запускается после threshold[0] новых контейнеров: оценка выделений
+        'container_allocs_per_message': collections[0] * gc.get_threshold()[0] / count if count else 0.0,
+        'allocated_blocks_delta': blocks,
+        'traced_peak_bytes': peak,
+        'top_allocations': top,
+    }
+
+
+def print_report(report):
+    print(f"📊 Replay {report['category']}: {report['messages']} frames, {report['mode']}, "
+          f"sink {report['sink']}, JSON backend {report['json_backend']}")
+    print(f"  throughput      {report['messages_per_second']:>12,.0f} msg/s   ({report['seconds']:.2f}s)")
+    latency = report['latency_us']
+    print(f"  handler latency p50 {latency['p50']:.1f}us  p90 {latency['p90']:.1f}us  "
+          f"p99 {latency['p99']:.1f}us  p99.9 {latency['p99.9']:.1f}us  max {report['latency_max_us']:.0f}us")
+    print(f"  writer          flushed {report['flushed_rows']} rows in {report['sink_inserts']} inserts, "
+          f"conflated {report['conflated_rows']}, dropped {report['dropped_rows']}, "
+          f"failed {report['failed_rows']}, drain {report['drain_seconds']:.2f}s")
+    print(f"  allocations     gc collections {report['gc_collections']}, "
+          f"~{report['container_allocs_per_message']:.1f} container allocs/msg, "
+          f"net blocks {report['allocated_blocks_delta']:+d}")
+    if report['traced_peak_bytes'] is not None:
+        print(f"  tracemalloc     peak {report['traced_peak_bytes'] / 1024 / 1024:.1f} MB, top net allocations:")
+        for where, size, count in report['top_allocations']:
+            print(f"    {size / 1024:+10.1f} KB {count:+8d} blocks  {where}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded WebSocket frames through a streamer")
+    parser.add_argument('paths', nargs='*', help="Recording files or directories")
+    parser.add_argument('--category', choices=['linear', 'spot'],
+                        help="Streamer category (by default from the recording file name)")
+    parser.add_argument('--sink', choices=['null', 'native', 'clickhouse'], default='null')
+    parser.add_argument('--realtime', action='store_true', help="Keep recorded inter-arrival times")
+    parser.add_argument('--speed', type=float, default=1.0, help="Realtime speed-up factor")
+    parser.add_argument('--limit', type=int, help="Replay at most this many frames")
+    parser.add_argument('--synthetic', type=int, help="Generate this many frames instead of reading recordings")
+    parser.add_argument('--rate', type=float, default=5000, help="Synthetic frames per second (for --realtime)")
+    parser.add_argument('--trace-alloc', action='store_true', help="Trace allocations with tracemalloc")
+    parser.add_argument('--json', help="Write the report to this JSON file")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        category = args.category or 'linear'
+        frames = synthetic_frames(category, args.synthetic, args.rate)
+    else:
+        if not args.paths:
+            parser.error("recording paths or --synthetic are required")
+        files, frames = load_frames(args.paths, args.limit)
+        category = args.category or os.path.basename(files[0]).split('-', 1)[0]
+        if category not in ('linear', 'spot'):
+            parser.error(f"cannot infer category from {files[0]}, use --category")
+
+    report = run(category, frames, args.sink, args.realtime, args.speed, args.trace_alloc)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
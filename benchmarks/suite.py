@@ -0,0 +1,457 @@
+"""
+Набор бенчмарков горячего пути стриминга с проверкой регрессий.
+
+Каждый бенчмарк измеряет операции в секунду (лучший из repeat прогонов):
+
+    decode.*     - safe_float/safe_timestamp стримера и таблица полей TickerDecoder
+    record.*     - сборка записи: наложение delta на состояние, строка и колоночный буфер
+    insert.*     - вставка строками и колонками NumPy через ClickHouseClient в локальный
+                   сервер native протокола (benchmarks/fake_clickhouse.py)
+    telegram.*   - форматирование ответов команд бота
+    analysis.*   - запросы analyze_trading_data и /stats через тот же сервер
+
+Результаты сравниваются с базовыми (JSON): при падении скорости больше
+чем на --max-regression процентов запуск завершается с кодом 1.
+
+    python -m benchmarks --save-baseline          # на эталонной ветке
+    python -m benchmarks --max-regression 10      # проверка изменений
+    python -m benchmarks --filter insert --repeat 10
+"""
+import sys
+import os
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import platform
+import random
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from time import perf_counter
+
+# Добавляем корневую директорию в путь Python
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_decoder import make_frames
+from benchmarks.bench_insert import build_columns, build_rows, make_messages
+from benchmarks.fake_clickhouse import FakeClickHouseServer
+from utils.clickhouse_client import ClickHouseClient
+from utils.column_buffer import ColumnBuffer
+from utils.ticker_decoder import TickerDecoder, field_specs, json_loads
+from utils.ticker_state import TickerStateTable
+from tickers_linear_streamer import (
+    LinearTickerStreamer, LINEAR_FLOAT_FIELDS, LINEAR_STATE_TIME_FIELDS, LINEAR_TEXT_FIELDS,
+    LINEAR_TIME_COLUMNS, LINEAR_TEXT_COLUMNS, LINEAR_FLOAT_COLUMNS
+)
+
+BASELINE_PATH = os.path.join('data', 'benchmarks', 'baseline.json')
+
+Benchmark = namedtuple('Benchmark', ['name', 'unit', 'setup'])
+
+BENCHMARKS = []
+
+
+def benchmark(name, unit='ops'):
+    """
+    Регистрация бенчмарка
+
+    Функция setup(env) возвращает (func, ops): func() выполняет ops операций.
+    """
+    def register(setup):
+        BENCHMARKS.append(Benchmark(name, unit, setup))
+        return setup
+    return register
+
+
+class Environment:
+    """Общие данные бенчмарков: сообщения, локальный сервер и клиент к нему"""
+
+    def __init__(self, size=20000):
+        self.size = size
+        random.seed(1)
+        self._server = None
+        self._ch = None
+
+    @property
+    def server(self):
+        if self._server is None:
+            self._server = FakeClickHouseServer().start()
+            register_responses(self._server)
+        return self._server
+
+    @property
+    def ch(self):
+        if self._ch is None:
+            self._ch = ClickHouseClient(config=self.server.client_config(), pool_size=2)
+        return self._ch
+
+    def close(self):
+        if self._ch is not None:
+            self._ch.pool.close()
+        if self._server is not None:
+            self._server.stop()
+
+
+# Разбор значений
+
+def raw_values(count):
+    """Строковые значения как в тикерах Bybit, с пустыми и некорректными"""
+    values = [f"{random.uniform(0.0001, 70000):.6f}" for _ in range(count)]
+    for i in range(0, count, 50):
+        values[i] = ''
+    for i in range(25, count, 100):
+        values[i] = 'n/a'
+    return values
+
+
+@benchmark('decode.safe_float', 'values')
+def bench_safe_float(env):
+    values = raw_values(env.size * 10)
+    safe_float = LinearTickerStreamer.safe_float
+    return (lambda: [safe_float(None, v) for v in values]), len(values)
+
+
+@benchmark('decode.safe_timestamp', 'values')
+def bench_safe_timestamp(env):
+    now_ms = int(time.time() * 1000)
+    values = [str(now_ms + i) for i in range(env.size * 10)]
+    values[::100] = [''] * len(values[::100])
+    safe_timestamp = LinearTickerStreamer.safe_timestamp
+    return (lambda: [safe_timestamp(None, v, 0) for v in values]), len(values)
+
+
+@benchmark('decode.ticker_fields', 'msgs')
+def bench_ticker_fields(env):
+    frames, _ = make_frames('linear', env.size)
+    datas = [json_loads(f)['data'] for f in frames]
+    decode = TickerDecoder(field_specs(
+        float_fields=LINEAR_FLOAT_FIELDS,
+        time_fields=LINEAR_STATE_TIME_FIELDS,
+        text_fields=LINEAR_TEXT_FIELDS
+    )).decode
+    return (lambda: [decode(d) for d in datas]), len(datas)
+
+
+# Сборка записей
+
+@benchmark('record.linear', 'msgs')
+def bench_record_linear(env):
+    frames, _ = make_frames('linear', env.size)
+    messages = [json_loads(f) for f in frames]
+    buffer = ColumnBuffer(
+        time_columns=LINEAR_TIME_COLUMNS,
+        symbol_column='symbol',
+        text_columns=LINEAR_TEXT_COLUMNS,
+        float_columns=LINEAR_FLOAT_COLUMNS,
+        nullable_time_columns=['next_funding_time'],
+        capacity=len(messages)
+    )
+
+    def run():
+        # Как в handle_linear_ticker: состояние -> запись -> колоночный буфер
+        state = TickerStateTable(
+            float_fields=[k for k, _ in LINEAR_FLOAT_FIELDS],
+            time_fields=[k for k, _ in LINEAR_STATE_TIME_FIELDS],
+            text_fields=[k for k, _ in LINEAR_TEXT_FIELDS]
+        )
+        buffer.clear()
+        receive_time = int(time.time() * 1000)
+        for message in messages:
+            event_time = message['ts']
+            row = state.apply(message['data'], event_time, snapshot=message['type'] == 'snapshot')
+            if row is None:
+                continue
+            symbol, state_times, texts, floats = state.record(row)
+            buffer.append((event_time, receive_time) + state_times, symbol, texts, floats)
+
+    return run, len(messages)
+
+
+# Вставка
+
+def insert_payload(env):
+    messages = make_messages(env.size)
+    buffer = ColumnBuffer(
+        time_columns=LINEAR_TIME_COLUMNS,
+        symbol_column='symbol',
+        text_columns=LINEAR_TEXT_COLUMNS,
+        float_columns=LINEAR_FLOAT_COLUMNS,
+        nullable_time_columns=['next_funding_time'],
+        capacity=len(messages)
+    )
+    return messages, buffer
+
+
+@benchmark('insert.rows', 'rows')
+def bench_insert_rows(env):
+    messages, _ = insert_payload(env)
+    rows = build_rows(messages)
+    query = (f"INSERT INTO bybit_tickers_linear "
+             f"({', '.join(LINEAR_TIME_COLUMNS + ['symbol'] + LINEAR_TEXT_COLUMNS + LINEAR_FLOAT_COLUMNS)}) VALUES")
+    ch = env.ch
+    return (lambda: ch.execute(query, rows)), len(rows)
+
+
+@benchmark('insert.columns', 'rows')
+def bench_insert_columns(env):
+    messages, buffer = insert_payload(env)
+    columns = build_columns(messages, buffer)
+    ch = env.ch
+    return (lambda: ch.insert_columns('bybit_tickers_linear', buffer.column_names, columns)), len(messages)
+
+
+# Ответы сервера для запросов анализа и команд бота
+
+STRATEGIES = [f"strategy_{i}" for i in range(8)]
+SYMBOLS = [f"SYM{i}USDT" for i in range(50)]
+
+
+def register_responses(server):
+    now = datetime(2024, 1, 1, 12, 0, 0)
+
+    # analyze_trading_data
+    server.respond(r"SELECT COUNT\(\*\) FROM trades", [('count()', 'UInt64')], [(125000,)])
+    server.respond(r"SELECT COUNT\(\*\) FROM orders", [('count()', 'UInt64')], [(250000,)])
+    server.respond(r"argMax\(drawdown, timestamp\).*FROM strategy_metrics", [
+        ('strategy', 'String'), ('pnl', 'Float64'), ('drawdown', 'Float64'), ('sharpe_ratio', 'Float64'),
+        ('total_trades', 'Int32'), ('winning_trades', 'Int32'), ('updated', 'DateTime')
+    ], [(s, 1000.0 - 300 * i, 150.0 + 10 * i, 1.2 - 0.2 * i, 1000 + i, 550 + i, now) for i, s in enumerate(STRATEGIES)])
+    server.respond(r"FROM trades\s+ORDER BY timestamp DESC\s+LIMIT 5", [
+        ('timestamp', 'DateTime'), ('symbol', 'String'), ('side', 'String'),
+        ('price', 'Float64'), ('quantity', 'Float64'), ('strategy', 'String')
+    ], [(now - timedelta(seconds=i), SYMBOLS[i], 'buy' if i % 2 else 'sell', 100.0 + i, 0.5 * i, STRATEGIES[i])
+        for i in range(5)])
+
+    # query_stats (/stats)
+    server.respond(r"^SELECT count\(\), uniqExact\(symbol\) FROM trades$",
+                   [('count()', 'UInt64'), ('uniqExact(symbol)', 'UInt64')], [(125000, 50)])
+    server.respond(r"sum\(price \* quantity\), uniqExact\(symbol\) FROM trades",
+                   [('count()', 'UInt64'), ('sum', 'Float64'), ('uniqExact(symbol)', 'UInt64')], [(5000, 2.5e7, 45)])
+    server.respond(r"GROUP BY symbol ORDER BY volume DESC LIMIT 3",
+                   [('symbol', 'String'), ('volume', 'Float64')], [(s, 1e6 / (i + 1)) for i, s in enumerate(SYMBOLS[:3])])
+    server.respond(r"argMax\(winning_trades, timestamp\) FROM strategy_metrics", [
+        ('strategy', 'String'), ('pnl', 'Float64'), ('total_trades', 'Int32'), ('winning_trades', 'Int32')
+    ], [(s, 1000.0 - 300 * i, 1000 + i, 550 + i) for i, s in enumerate(STRATEGIES)])
+
+    # query_alerts (/alerts)
+    server.respond(r"FROM alerts_log", [
+        ('timestamp', 'DateTime64(3)'), ('source', 'String'), ('alert_type', 'String'),
+        ('severity', 'String'), ('message', 'String')
+    ], [(now - timedelta(minutes=i), f"linear#{i % 4}", 'PRICE_ALERT', ('info', 'warning', 'error')[i % 3],
+         f"{SYMBOLS[i]}: <+5.00%> (цена {100 + i})\n" + "подробности " * 20) for i in range(10)])
+
+
+@benchmark('analysis.analyze_trading_data', 'calls')
+def bench_analyze_trading_data(env):
+    from scripts.analyze_data import analyze_trading_data
+    ch = env.ch
+    count = 20
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            for _ in range(count):
+                analyze_trading_data(ch)
+
+    return run, count
+
+
+@benchmark('analysis.query_stats', 'calls')
+def bench_query_stats(env):
+    from utils.bot_queries import query_stats
+    ch = env.ch
+    count = 20
+    return (lambda: [query_stats(ch) for _ in range(count)]), count
+
+
+@benchmark('analysis.query_stats_cached', 'calls')
+def bench_query_stats_cached(env):
+    # Те же запросы через кэш результатов: после прогрева все ответы из памяти
+    from utils.bot_queries import query_stats
+
+    class Cached:
+        def __init__(self, ch):
+            self.ch = ch
+
+        def execute(self, query, params=None, **kwargs):
+            return self.ch.execute(query, params, cache_ttl=3600, **kwargs)
+
+    ch = Cached(env.ch)
+    count = 200
+    return (lambda: [query_stats(ch) for _ in range(count)]), count
+
+
+# Форматирование ответов бота
+
+class FakeMessage:
+    def __init__(self):
+        self.sent = 0
+        self.last = None
+
+    async def reply_text(self, text, parse_mode=None):
+        self.sent += 1
+        self.last = text
+
+
+class FakeUpdate:
+    def __init__(self):
+        self.message = FakeMessage()
+
+
+def telegram_bench(command, count=2000):
+    """Команда бота с готовыми результатами запросов в кэше"""
+    def setup(env):
+        from utils.bot_queries import query_alerts, query_stats
+        from utils.telegram_client import TelegramBot
+
+        bot = TelegramBot('0:benchmark', [1])
+        now = time.time()
+        values = {
+            'stats': query_stats(env.ch),
+            'alerts': query_alerts(env.ch),
+            'balance': {
+                'totalEquity': '125000.55', 'totalAvailableBalance': '80000.1',
+                'totalInitialMargin': '45000.45', 'totalPerpUPL': '-1234.5',
+                'coin': [{'coin': f"C{i}", 'usdValue': str(125000.55 / (i + 2))} for i in range(10)],
+            },
+        }
+        for name, value in values.items():
+            entry = bot.queries.entries[name]
+            entry.value, entry.updated_at = value, now
+        handler = getattr(bot, f"{command}_command")
+        update = FakeUpdate()
+        loop = asyncio.new_event_loop()
+
+        async def run_all():
+            for _ in range(count):
+                await handler(update, None)
+
+        def run():
+            loop.run_until_complete(run_all())
+            if update.message.last.startswith('❌'):
+                raise RuntimeError(update.message.last)
+
+        return run, count
+    return setup
+
+
+for _command in ('stats', 'alerts', 'balance'):
+    benchmark(f"telegram.{_command}", 'msgs')(telegram_bench(_command))
+
+
+# Запуск
+
+def run_benchmark(bench, env, repeat):
+    func, ops = bench.setup(env)
+    func()  # прогрев: импорты, соединения пула, кэши
+    timings = []
+    for _ in range(repeat):
+        started = perf_counter()
+        func()
+        timings.append(perf_counter() - started)
+    best = min(timings)
+    return {
+        'ops': ops,
+        'unit': bench.unit,
+        'best_seconds': best,
+        'mean_seconds': sum(timings) / len(timings),
+        'ops_per_second': ops / best,
+    }
+
+
+def compare(results, baseline, max_regression):
+    """
+    Сравнение с базовыми результатами
+
+    Returns:
+        list: Имена бенчмарков, скорость которых упала больше max_regression процентов
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        change = result['ops_per_second'] / base - 1
+        result['baseline_ops_per_second'] = base
+        result['change'] = change
+        if change < -max_regression / 100:
+            regressions.append(name)
+    return regressions
+
+
+def load_baseline(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(path, results):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'machine': platform.node(),
+            'python': platform.python_version(),
+            'results': {name: r['ops_per_second'] for name, r in results.items()},
+        }, f, indent=2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description="Ingestion hot path benchmark suite")
+    parser.add_argument('--filter', action='append', default=[], help="Run benchmarks whose name contains this")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--size', type=int, default=20000, help="Messages/rows per benchmark run")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help="Store this run as the baseline")
+    parser.add_argument('--max-regression', type=float, default=10.0,
+                        help="Fail when throughput drops by more than this percentage")
+    parser.add_argument('--json', help="Write results to this JSON file")
+    parser.add_argument('--list', action='store_true', help="List benchmarks and exit")
+    args = parser.parse_args(argv)
+
+    selected = [b for b in BENCHMARKS if not args.filter or any(f in b.name for f in args.filter)]
+    if args.list:
+        for bench in selected:
+            print(bench.name)
+        return 0
+
+    baseline = None if args.save_baseline else load_baseline(args.baseline)
+    print(f"📊 Benchmarks: {len(selected)}, size {args.size}, repeat {args.repeat}, "
+          f"baseline {args.baseline if baseline else 'none'}")
+
+    env = Environment(args.size)
+    results = {}
+    try:
+        for bench in selected:
+            results[bench.name] = run_benchmark(bench, env, args.repeat)
+    finally:
+        env.close()
+
+    regressions = compare(results, baseline['results'], args.max_regression) if baseline else []
+    for name, result in results.items():
+        line = f"  {name:<32} {result['ops_per_second']:>14,.0f} {result['unit']}/s"
+        if 'change' in result:
+            icon = '❌' if name in regressions else '✅'
+            line += f"   {icon} {result['change']:+7.1%} vs {result['baseline_ops_per_second']:,.0f}"
+        print(line)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+        print(f"💾 Baseline saved: {args.baseline}")
+        return 0
+    if regressions:
+        print(f"❌ Throughput regressed by more than {args.max_regression:g}%: {', '.join(regressions)}")
+        return 1
+    if baseline:
+        print(f"✅ No regressions over {args.max_regression:g}%")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
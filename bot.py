@@ -1,10 +1,12 @@
 import os
 import logging
 from datetime import datetime
-from telegram import Bot
 from telegram.ext import Application, CommandHandler, ContextTypes
 import threading
 
+from utils.alert_aggregator import SEVERITY_ICONS
+from utils.telegram_dispatcher import get_dispatcher
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -72,47 +74,27 @@ class TelegramBot:
         """
         update.message.reply_text(help_text)
 
-    # Синхронные методы для отправки сообщений
-    def send_alert(self, alert_type: str, message: str):
-        """Простая отправка алерта (полностью синхронная)"""
-        try:
-            if not self.token:
-                logger.error("❌ Token not available for sending alert")
-                return
-
-            text = f"🚨 {alert_type.upper()}\n{message}\nВремя: {datetime.now().strftime('%H:%M:%S')}"
+    # Неблокирующие методы для отправки сообщений из любых потоков
+    def _dispatch(self, text):
+        """Постановка сообщения для всех администраторов в очередь общего диспетчера"""
+        if not self.token:
+            logger.error("❌ Token not available for sending message")
+            return False
 
-            # Создаем временного бота для отправки
-            temp_bot = Bot(self.token)
-            for chat_id in self.admin_chat_ids:
-                try:
-                    temp_bot.send_message(chat_id=chat_id, text=text)
-                    logger.info(f"✅ Alert sent to {chat_id}")
-                except Exception as e:
-                    logger.error(f"❌ Ошибка отправки сообщения: {e}")
+        futures = get_dispatcher(self.token).broadcast(self.admin_chat_ids, text)
+        # Отброшенные при переполнении очереди сообщения завершаются сразу с False
+        return any(not f.done() or f.result() for f in futures.values())
 
-        except Exception as e:
-            logger.error(f"❌ Ошибка отправки алерта: {e}")
+    def send_alert(self, alert_type: str, message: str, severity: str = "critical"):
+        """Отправка алерта (сообщение ставится в очередь, вызов не ждет Telegram)"""
+        icon = SEVERITY_ICONS.get(severity, "🚨")
+        text = f"{icon} {alert_type.upper()}\n{message}\nВремя: {datetime.now().strftime('%H:%M:%S')}"
+        return self._dispatch(text)
 
     def send_signal(self, symbol: str, action: str, price: float):
-        """Простая отправка торгового сигнала"""
-        try:
-            if not self.token:
-                logger.error("❌ Token not available for sending signal")
-                return
-
-            text = f"📈 {symbol} {action} по {price}\nВремя: {datetime.now().strftime('%H:%M:%S')}"
-
-            temp_bot = Bot(self.token)
-            for chat_id in self.admin_chat_ids:
-                try:
-                    temp_bot.send_message(chat_id=chat_id, text=text)
-                    logger.info(f"✅ Signal sent to {chat_id}")
-                except Exception as e:
-                    logger.error(f"❌ Ошибка отправки сигнала: {e}")
-
-        except Exception as e:
-            logger.error(f"❌ Ошибка отправки сигнала: {e}")
+        """Отправка торгового сигнала (сообщение ставится в очередь)"""
+        text = f"📈 {symbol} {action} по {price}\nВремя: {datetime.now().strftime('%H:%M:%S')}"
+        return self._dispatch(text)
 
 
 # Глобальный экземпляр бота
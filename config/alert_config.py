@@ -0,0 +1,24 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Группировка алертов стримеров (utils/alert_aggregator.py)
+ALERT_CONFIG = {
+    # Окно подсчета событий (сек)
+    'window': int(os.getenv('ALERT_WINDOW', 60)),
+
+    # Минимальный интервал между сводками одной группы по уровню (сек)
+    'cooldowns': {
+        'info': int(os.getenv('ALERT_COOLDOWN_INFO', 600)),
+        'warning': int(os.getenv('ALERT_COOLDOWN_WARNING', 300)),
+        'error': int(os.getenv('ALERT_COOLDOWN_ERROR', 60)),
+        'critical': int(os.getenv('ALERT_COOLDOWN_CRITICAL', 10)),
+    },
+
+    # Повышение уровня, когда событий группы в окне не меньше порога
+    'escalation': {
+        'error': int(os.getenv('ALERT_ESCALATE_ERROR', 100)),
+        'critical': int(os.getenv('ALERT_ESCALATE_CRITICAL', 1000)),
+    },
+}
@@ -0,0 +1,67 @@
+# Правила ценовых алертов (utils/rules_engine.py)
+#
+# Поля правила:
+#   name      - имя правила (в тексте алерта)
+#   metric    - price_change_24h, price_change_1h, funding_rate, open_interest_change, spread, last_price
+#   op        - '>', '<' или 'abs>' (модуль больше порога)
+#   threshold - порог (изменения и спред - доли: 0.05 = 5%)
+#   symbols   - '*', шаблон ('BTC*') или список символов/шаблонов
+#   severity  - уровень алерта: info, warning, error, critical
+#   signal    - BUY/SELL: отправить как торговый сигнал вместо алерта
+#   debounce  - минимальный интервал повторного срабатывания по символу (сек)
+
+MAJOR_SYMBOLS = ['BTC*', 'ETH*', 'SOL*', 'BNB*', 'XRP*', 'ADA*', 'DOT*']
+
+ALERT_RULES = [
+    {
+        'name': 'Изменение за 24ч',
+        'metric': 'price_change_24h',
+        'op': 'abs>',
+        'threshold': 0.05,
+        'symbols': MAJOR_SYMBOLS,
+        'severity': 'info',
+        'debounce': 3600,
+    },
+    {
+        'name': 'Резкое движение за 1ч',
+        'metric': 'price_change_1h',
+        'op': 'abs>',
+        'threshold': 0.1,
+        'symbols': '*',
+        'severity': 'warning',
+        'debounce': 1800,
+    },
+    {
+        'name': 'Высокий funding',
+        'metric': 'funding_rate',
+        'op': 'abs>',
+        'threshold': 0.001,
+        'symbols': '*',
+        'severity': 'info',
+        'debounce': 3600 * 8,
+    },
+    {
+        'name': 'Рост открытого интереса',
+        'metric': 'open_interest_change',
+        'op': '>',
+        'threshold': 0.2,
+        'symbols': '*',
+        'severity': 'warning',
+        'debounce': 1800,
+    },
+    {
+        'name': 'Широкий спред',
+        'metric': 'spread',
+        'op': '>',
+        'threshold': 0.01,
+        'symbols': MAJOR_SYMBOLS,
+        'severity': 'warning',
+        'debounce': 600,
+    },
+]
+
+# Окно изменения открытого интереса (сек)
+OPEN_INTEREST_WINDOW = 900
+
+# Период проверки правил (сек)
+RULES_INTERVAL = 1
@@ -0,0 +1,22 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Инкрементальный расчет strategy_metrics по trades (utils/strategy_analytics.py)
+ANALYTICS_CONFIG = {
+    # Состояние стратегий и водяной знак обработанных сделок
+    'state_path': os.getenv('ANALYTICS_STATE_PATH', os.path.join('data', 'analytics', 'strategy_state.json')),
+
+    # Период доходностей для Sharpe и снимков strategy_metrics (сек)
+    'period_seconds': int(os.getenv('ANALYTICS_PERIOD_SECONDS', 3600)),
+
+    # Сделки моложе этого возраста не обрабатываются: поздние вставки успевают записаться (сек)
+    'settle_seconds': int(os.getenv('ANALYTICS_SETTLE_SECONDS', 60)),
+
+    # Сделок в одном запросе
+    'batch_rows': int(os.getenv('ANALYTICS_BATCH_ROWS', 100000)),
+
+    # Период запуска в режиме --loop (сек)
+    'interval': int(os.getenv('ANALYTICS_INTERVAL', 300)),
+}
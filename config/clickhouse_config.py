@@ -33,4 +33,41 @@ CLICKHOUSE_CONFIG_ALT = {
         'use_numpy': False,
         'connect_timeout': 10,
     }
-}
\ No newline at end of file
+}
+
+# Пул соединений ClickHouseClient
+CLICKHOUSE_POOL_CONFIG = {
+    'size': int(os.getenv('CLICKHOUSE_POOL_SIZE', 4)),
+    'checkout_timeout': float(os.getenv('CLICKHOUSE_POOL_TIMEOUT', 10)),
+    'health_check_interval': 30,
+    'min_backoff': 0.5,
+    'max_backoff': 30,
+}
+
+# Локальный кэш закрытых дней для исследовательских запросов (utils/research_cache.py)
+CLICKHOUSE_RESEARCH_CACHE_CONFIG = {
+    'directory': os.getenv('RESEARCH_CACHE_DIR', os.path.join('data', 'cache')),
+    'max_bytes': int(float(os.getenv('RESEARCH_CACHE_GB', 20)) * 1024 ** 3),
+    # День считается закрытым через столько секунд после полуночи UTC (досылка бэкфилла)
+    'settle_seconds': int(os.getenv('RESEARCH_CACHE_SETTLE_SECONDS', 3600)),
+}
+
+# Кэш результатов ClickHouseClient.execute(..., cache_ttl=...) (utils/result_cache.py)
+CLICKHOUSE_RESULT_CACHE_CONFIG = {
+    'max_bytes': int(float(os.getenv('CLICKHOUSE_RESULT_CACHE_MB', 64)) * 1024 ** 2),
+    'invalidate_on_write': os.getenv('CLICKHOUSE_RESULT_CACHE_INVALIDATE', 'true').lower() == 'true',
+}
+
+# Повтор вставок (utils/clickhouse_client.py). Повтор безопасен: пакет отправляется
+# с insert_deduplication_token - хешем содержимого, одинаковым во всех попытках
+CLICKHOUSE_INSERT_CONFIG = {
+    'retries': int(os.getenv('CLICKHOUSE_INSERT_RETRIES', 3)),
+    'min_backoff': float(os.getenv('CLICKHOUSE_INSERT_MIN_BACKOFF', 0.5)),
+    'max_backoff': float(os.getenv('CLICKHOUSE_INSERT_MAX_BACKOFF', 10)),
+}
+
+# Раскладка таблиц (utils/schema.py)
+CLICKHOUSE_SCHEMA_CONFIG = {
+    # MergeTree или ReplacingMergeTree: тикеры с одинаковыми (symbol, event_time) схлопываются при слиянии
+    'ticker_engine': os.getenv('CLICKHOUSE_TICKER_ENGINE', 'MergeTree'),
+}
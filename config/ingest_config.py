@@ -0,0 +1,55 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Настройки стриминга тикеров в ClickHouse
+INGEST_CONFIG = {
+    # Процессы на категорию (linear/spot) в супервизоре
+    'shards': int(os.getenv('INGEST_SHARDS', max(1, (os.cpu_count() or 2) // 2))),
+    'categories': [c.strip() for c in os.getenv('INGEST_CATEGORIES', 'linear,spot').split(',') if c.strip()],
+
+    # Пакетная запись
+    'batch_rows': int(os.getenv('INGEST_BATCH_ROWS', 10000)),
+    'batch_delay': float(os.getenv('INGEST_BATCH_DELAY', 0.5)),
+
+    # Очередь между WebSocket и записью: block, drop_oldest или conflate
+    'queue_size': int(os.getenv('INGEST_QUEUE_SIZE', 200000)),
+    'overflow_policy': os.getenv('INGEST_OVERFLOW_POLICY', 'conflate'),
+
+    # Журнал неудавшихся вставок (досылается при восстановлении связи)
+    'spill_dir': os.getenv('INGEST_SPILL_DIR', os.path.join('data', 'spill')),
+    'spill_segment_mb': int(os.getenv('INGEST_SPILL_SEGMENT_MB', 64)),
+    'spill_replay_interval': float(os.getenv('INGEST_SPILL_REPLAY_INTERVAL', 10)),
+
+    # Символов на одно WebSocket соединение (соединения открываются и подписываются параллельно)
+    'ws_topics_per_connection': int(os.getenv('INGEST_WS_TOPICS_PER_CONNECTION', 200)),
+
+    # Кэш списка символов instruments-info и период проверки новых/снятых символов (сек)
+    'symbols_cache_dir': os.getenv('INGEST_SYMBOLS_CACHE_DIR', os.path.join('data', 'symbols')),
+    'symbols_cache_ttl': int(os.getenv('INGEST_SYMBOLS_CACHE_TTL', 3600)),
+    'symbols_refresh_interval': int(os.getenv('INGEST_SYMBOLS_REFRESH_INTERVAL', 900)),
+
+    # Пропуски в потоке: разрыв ts, тишина символа; дозапись снимком /v5/market/tickers не чаще интервала
+    'gap_threshold_ms': int(os.getenv('INGEST_GAP_THRESHOLD_MS', 30000)),
+    'gap_watchdog_seconds': int(os.getenv('INGEST_GAP_WATCHDOG_SECONDS', 120)),
+    'backfill_interval': int(os.getenv('INGEST_BACKFILL_INTERVAL', 30)),
+
+    # Запись сырых WebSocket кадров для benchmarks/replay.py (пустая строка - отключена)
+    'record_dir': os.getenv('INGEST_RECORD_DIR', ''),
+    'record_file_mb': int(os.getenv('INGEST_RECORD_FILE_MB', 256)),
+    'record_file_seconds': int(os.getenv('INGEST_RECORD_FILE_SECONDS', 3600)),
+    # zstd (пакет zstandard) или gzip
+    'record_compression': os.getenv('INGEST_RECORD_COMPRESSION', 'zstd'),
+
+    # Свечи market_data по linear тикерам (пустая строка - отключены)
+    'candle_timeframes': [t.strip() for t in os.getenv('INGEST_CANDLE_TIMEFRAMES', '1m,5m,15m,1h,1d').split(',')
+                          if t.strip()],
+
+    # HTTP endpoint метрик шарда: 127.0.0.1:<metrics_port + смещение категории + шард> (0 - отключен)
+    'metrics_port': int(os.getenv('METRICS_PORT', 9100)),
+    'metrics_port_offsets': {'linear': 0, 'spot': 100},
+
+    # Период вывода счетчиков очереди (сек)
+    'stats_interval': int(os.getenv('INGEST_STATS_INTERVAL', 60)),
+}
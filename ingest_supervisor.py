@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Супервизор стриминга тикеров.
+
+Делит символы linear и spot на шарды и запускает по процессу на шард:
+у каждого процесса свое WebSocket соединение, свой GIL и свой BatchWriter.
+Супервизор перезапускает упавшие процессы и печатает скорость сообщений
+по шардам.
+"""
+
+import sys
+import os
+import signal
+import zlib
+import multiprocessing as mp
+from time import sleep, monotonic
+
+# Добавляем корневую директорию в путь Python
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from config.ingest_config import INGEST_CONFIG
+
+try:
+    from bot import bot
+
+    BOT_AVAILABLE = True
+except Exception as e:
+    print(f"⚠️ Telegram Bot not available: {e}")
+    BOT_AVAILABLE = False
+
+
+def partition_symbols(symbols, shards):
+    """
+    Распределение символов по шардам
+
+    Используется стабильный хеш, поэтому символ попадает в тот же шард
+    при любом порядке списка и после перезапуска. Тем же хешем
+    SymbolRegistry шарда отбирает новые листинги.
+    """
+    partitions = [[] for _ in range(shards)]
+    for symbol in symbols:
+        partitions[zlib.crc32(symbol.encode()) % shards].append(symbol)
+    return partitions
+
+
+def get_symbols(category):
+    """Список символов категории"""
+    if category == 'linear':
+        from tickers_linear_streamer import LinearTickerStreamer
+        return LinearTickerStreamer.get_linear_symbols()
+    if category == 'spot':
+        from tickers_spot_streamer import SpotTickerStreamer
+        return SpotTickerStreamer.get_spot_symbols()
+    raise ValueError(f"Unknown category: {category}")
+
+
+def run_worker(category, shard_id, shards, symbols, message_counter):
+    """Точка входа процесса-шарда"""
+    print(f"🚀 [{category}#{shard_id}] Starting worker for {len(symbols)} symbols (pid {os.getpid()})")
+
+    if category == 'linear':
+        from tickers_linear_streamer import LinearTickerStreamer
+        streamer = LinearTickerStreamer(symbols=symbols, message_counter=message_counter,
+                                        shard_id=shard_id, shards=shards)
+    else:
+        from tickers_spot_streamer import SpotTickerStreamer
+        streamer = SpotTickerStreamer(symbols=symbols, message_counter=message_counter,
+                                      shard_id=shard_id, shards=shards)
+
+    streamer.start_streaming()
+
+
+class Shard:
+    """Процесс-шард и его счетчики"""
+
+    def __init__(self, category, shard_id, shards, symbols, ctx):
+        self.category = category
+        self.shard_id = shard_id
+        self.shards = shards
+        self.symbols = symbols
+        self.ctx = ctx
+        # Пишет только процесс-шард, поэтому блокировка не нужна
+        self.message_counter = ctx.RawValue('Q', 0)
+        self.process = None
+        self.restarts = 0
+        self.started_at = 0.0
+        self.last_count = 0
+
+    @property
+    def name(self):
+        return f"{self.category}#{self.shard_id}"
+
+    def start(self):
+        self.process = self.ctx.Process(
+            target=run_worker,
+            args=(self.category, self.shard_id, self.shards, self.symbols, self.message_counter),
+            name=f"ticker-{self.category}-{self.shard_id}"
+        )
+        self.process.start()
+        self.started_at = monotonic()
+
+    def is_alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    def stop(self, timeout=30):
+        if not self.is_alive():
+            return
+
+        # При Ctrl+C в терминале SIGINT уже получила вся группа процессов
+        self.process.join(1)
+        if self.process.is_alive():
+            # SIGINT -> KeyboardInterrupt в стримере -> сброс BatchWriter
+            try:
+                os.kill(self.process.pid, signal.SIGINT)
+            except ProcessLookupError:
+                pass
+            self.process.join(timeout)
+        if self.process.is_alive():
+            print(f"⚠️ [{self.name}] Worker did not stop in time, terminating")
+            self.process.terminate()
+            self.process.join(5)
+
+
+class IngestSupervisor:
+    def __init__(self,
+                 categories=('linear', 'spot'),
+                 shards=2,
+                 check_interval=5,
+                 report_interval=60,
+                 restart_delay=10):
+        """
+        Args:
+            categories: Категории тикеров для стриминга
+            shards: Количество процессов на категорию
+            check_interval: Период проверки процессов (сек)
+            report_interval: Период отчета о скорости (сек)
+            restart_delay: Минимальное время жизни процесса перед перезапуском (сек)
+        """
+        self.categories = categories
+        self.shards_count = shards
+        self.check_interval = check_interval
+        self.report_interval = report_interval
+        self.restart_delay = restart_delay
+
+        # spawn: процессы не наследуют потоки и сокеты родителя
+        self.ctx = mp.get_context('spawn')
+        self.shards = []
+        self.running = False
+
+    def start(self):
+        """Запуск всех шардов"""
+        for category in self.categories:
+            symbols = get_symbols(category)
+            if not symbols:
+                print(f"❌ No {category} symbols found, category skipped")
+                continue
+
+            partitions = partition_symbols(symbols, self.shards_count)
+            for shard_id, shard_symbols in enumerate(partitions):
+                if not shard_symbols:
+                    continue
+                shard = Shard(category, shard_id, self.shards_count, shard_symbols, self.ctx)
+                shard.start()
+                self.shards.append(shard)
+
+        print(f"✅ Started {len(self.shards)} ingestion workers")
+        if BOT_AVAILABLE:
+            bot.send_alert("SYSTEM", f"Ingest supervisor started {len(self.shards)} workers")
+
+    def check_workers(self):
+        """Перезапуск упавших шардов"""
+        for shard in self.shards:
+            if shard.is_alive():
+                continue
+
+            # Не перезапускаем чаще, чем раз в restart_delay секунд
+            if monotonic() - shard.started_at < self.restart_delay:
+                continue
+
+            exit_code = shard.process.exitcode if shard.process else None
+            shard.restarts += 1
+            print(f"🔄 [{shard.name}] Worker exited with code {exit_code}, restarting (#{shard.restarts})")
+            if BOT_AVAILABLE:
+                bot.send_alert("ERROR", f"Ingest worker {shard.name} exited with code {exit_code}, restarting")
+            shard.start()
+
+    def report_rates(self, elapsed):
+        """Скорость сообщений по шардам за прошедший интервал"""
+        print(f"📊 Ingestion rates ({elapsed:.0f}s):")
+        total = 0.0
+        for shard in self.shards:
+            count = shard.message_counter.value
+            rate = (count - shard.last_count) / elapsed if elapsed > 0 else 0.0
+            shard.last_count = count
+            total += rate
+            status = "🟢" if shard.is_alive() else "🔴"
+            print(f"   {status} {shard.name:<10} {len(shard.symbols):>5} symbols  "
+                  f"{rate:>9.1f} msg/s  restarts: {shard.restarts}")
+        print(f"   Total: {total:.1f} msg/s")
+
+    def stop(self):
+        """Остановка всех шардов"""
+        self.running = False
+        for shard in self.shards:
+            shard.stop()
+        print("⏹️ All ingestion workers stopped")
+
+    def run(self):
+        """Запуск и наблюдение за шардами до Ctrl+C"""
+        self.start()
+        self.running = True
+        last_report = monotonic()
+
+        try:
+            while self.running:
+                sleep(self.check_interval)
+                self.check_workers()
+
+                now = monotonic()
+                if now - last_report >= self.report_interval:
+                    self.report_rates(now - last_report)
+                    last_report = now
+        except KeyboardInterrupt:
+            print("⏹️ Stopping ingest supervisor...")
+        finally:
+            self.stop()
+            if BOT_AVAILABLE:
+                bot.send_alert("SYSTEM", "Ingest supervisor stopped")
+
+
+def main():
+    supervisor = IngestSupervisor(categories=INGEST_CONFIG['categories'], shards=INGEST_CONFIG['shards'])
+    supervisor.run()
+
+
+if __name__ == '__main__':
+    main()
@@ -16,8 +16,10 @@ def main():
     print("1. Test ClickHouse connection")
     print("2. Create trading tables")
     print("3. Insert test trading data")
-    print("4. Run trading bot")
+    print("4. Run ticker ingestion (supervisor)")
     print("5. Analyze trading data")
+    print("6. Migrate table schemas")
+    print("7. Update strategy metrics")
     print("0. Exit")
 
     choice = input("\nSelect option: ").strip()
@@ -32,14 +34,18 @@ def main():
         from scripts.test_trading_data import test_trading_data
         test_trading_data()
     elif choice == "4":
-        print("🚀 Starting trading bot...")
-        # Здесь будет запуск вашего основного бота
-        # from bot.main import main as bot_main
-        # bot_main()
-        print("Trading bot started (not implemented yet)")
+        print("🚀 Starting ticker ingestion...")
+        from ingest_supervisor import main as supervisor_main
+        supervisor_main()
     elif choice == "5":
         from scripts.analyze_data import analyze_trading_data
         analyze_trading_data()
+    elif choice == "6":
+        from scripts.migrate_schema import migrate_schema
+        migrate_schema()
+    elif choice == "7":
+        from scripts.update_strategy_metrics import update_strategy_metrics
+        update_strategy_metrics()
     elif choice == "0":
         print("👋 Goodbye!")
         return
@@ -7,8 +7,13 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils.clickhouse_client import ClickHouseClient
 
 
-def analyze_trading_data():
-    ch = ClickHouseClient()
+def analyze_trading_data(ch=None):
+    """
+    Args:
+        ch: Клиент ClickHouse (по умолчанию - новый ClickHouseClient())
+    """
+    if ch is None:
+        ch = ClickHouseClient()
 
     print("📊 TRADING DATA ANALYSIS")
     print("=" * 50)
@@ -21,25 +26,33 @@ def analyze_trading_data():
     print(f"Total orders: {total_orders}")
 
     if total_trades > 0:
-        # Статистика по стратегиям
+        # Метрики стратегий: последние снимки из strategy_metrics (scripts/update_strategy_metrics.py)
         print("\n📈 Strategy Performance:")
         strategy_stats = ch.execute("""
-            SELECT 
+            SELECT
                 strategy,
-                COUNT(*) as trade_count,
-                SUM(CASE WHEN side = 'buy' THEN quantity * price ELSE 0 END) as buy_volume,
-                SUM(CASE WHEN side = 'sell' THEN quantity * price ELSE 0 END) as sell_volume,
-                AVG(price) as avg_price
-            FROM trades 
+                argMax(pnl, timestamp),
+                argMax(drawdown, timestamp),
+                argMax(sharpe_ratio, timestamp),
+                argMax(total_trades, timestamp),
+                argMax(winning_trades, timestamp),
+                max(timestamp)
+            FROM strategy_metrics
             GROUP BY strategy
+            ORDER BY strategy
         """)
 
-        for strategy, count, buy_vol, sell_vol, avg_price in strategy_stats:
+        if not strategy_stats:
+            print("  No strategy metrics yet. Run scripts/update_strategy_metrics.py first.")
+
+        for strategy, pnl, drawdown, sharpe, total, winning, updated in strategy_stats:
+            win_rate = winning / total * 100 if total else 0.0
             print(f"  {strategy}:")
-            print(f"    Trades: {count}")
-            print(f"    Buy Volume: ${buy_vol:.2f}")
-            print(f"    Sell Volume: ${sell_vol:.2f}")
-            print(f"    Avg Price: ${avg_price:.2f}")
+            print(f"    PnL: ${pnl:.2f}")
+            print(f"    Max Drawdown: ${drawdown:.2f}")
+            print(f"    Sharpe Ratio: {sharpe:.2f}")
+            print(f"    Closed Trades: {total} (win rate {win_rate:.1f}%)")
+            print(f"    Updated: {updated}")
 
         # Последние сделки
         print("\n🕒 Recent Trades:")
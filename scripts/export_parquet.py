@@ -0,0 +1,80 @@
+"""
+Выгрузка таблиц ClickHouse в Parquet для исследований.
+
+Таблица выгружается за интервал по партициям символ/день в
+<out>/<table>/symbol=.../date=.../data.parquet; повторный запуск
+пропускает уже выгруженные партиции. С --query результат произвольного
+SELECT пишется в один файл --output.
+
+    python -m scripts.export_parquet bybit_tickers_linear --start 2026-01-05 --end 2026-01-06 [--symbols BTCUSDT ETHUSDT]
+    python -m scripts.export_parquet --query "SELECT ..." --output candles.parquet
+"""
+import sys
+import os
+import argparse
+import logging
+from datetime import datetime, timedelta
+
+# Добавляем корневую директорию в путь Python
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from utils.clickhouse_client import ClickHouseClient
+from utils.parquet_export import ParquetExporter
+
+EXPORT_DIR = os.path.join('data', 'export')
+
+
+def export_parquet(table=None, start=None, end=None, symbols=None, out=EXPORT_DIR, workers=4,
+                   block_rows=131072, compression='zstd', query=None, output=None):
+    ch = ClickHouseClient(pool_size=workers)
+    exporter = ParquetExporter(ch, out, workers=workers, max_block_size=block_rows, compression=compression)
+
+    if query:
+        rows = exporter.export_query(query, output)
+        print(f"✅ Exported {rows} rows to {output}")
+        return True
+
+    result = exporter.export_table(table, start, end, keys=symbols)
+    print(f"✅ {table}: {result['exported_rows']} rows in {result['exported_files']} files, "
+          f"{result['skipped_files']} up to date, {result['failed_files']} failed "
+          f"({result['seconds']:.1f}s)")
+    return result['failed_files'] == 0
+
+
+def parse_time(value):
+    return datetime.fromisoformat(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export ClickHouse tables to Parquet")
+    parser.add_argument('table', nargs='?', help="Table to export by symbol/day partitions")
+    parser.add_argument('--start', type=parse_time, help="Interval start (ISO date/time)")
+    parser.add_argument('--end', type=parse_time, help="Interval end, exclusive (default: start + 1 day)")
+    parser.add_argument('--symbols', nargs='*', help="Only these symbols")
+    parser.add_argument('--out', default=EXPORT_DIR, help="Output directory for table export")
+    parser.add_argument('--workers', type=int, default=4, help="Partitions exported in parallel")
+    parser.add_argument('--block-rows', type=int, default=131072, help="Rows per ClickHouse block / Parquet row group")
+    parser.add_argument('--compression', default='zstd', help="Parquet compression codec")
+    parser.add_argument('--query', help="Export the result of this SELECT instead of a table")
+    parser.add_argument('--output', help="Output file for --query")
+    args = parser.parse_args()
+
+    if args.query:
+        if not args.output:
+            parser.error("--output is required with --query")
+    elif not args.table or not args.start:
+        parser.error("table and --start are required")
+
+    logging.basicConfig(level=logging.INFO)
+    ok = export_parquet(args.table, args.start, args.end or (args.start and args.start + timedelta(days=1)),
+                        args.symbols, args.out, args.workers, args.block_rows, args.compression,
+                        args.query, args.output)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""
+Миграция таблиц на схему из utils/schema.py.
+
+Для каждой таблицы, у которой ключ сортировки, партиционирование или типы
+колонок отличаются от описания:
+    1. создается таблица <имя>__migrate с новой схемой
+    2. данные до начала текущего часа (по часам сервера) копируются
+       INSERT ... SELECT кусками по времени
+    3. почасовые количества строк сверяются с исходной таблицей, часы,
+       дописанные во время копирования (досылка, бэкфилл), копируются заново
+    4. таблицы меняются местами через EXCHANGE TABLES
+    5. строки после границы копирования, записанные в старую таблицу, докопируются
+    6. старая таблица остается как <имя>__backup_<время> (или удаляется с --drop-old)
+
+Несуществующие таблицы просто создаются. Если в таблице только не хватает
+новых колонок или отличаются SETTINGS, они добавляются через
+ALTER TABLE ... ADD COLUMN / MODIFY SETTING без копирования.
+
+    python -m scripts.migrate_schema [--tables trades orders] [--chunk-hours 24] [--drop-old] [--dry-run]
+"""
+import sys
+import os
+import argparse
+import re
+from datetime import datetime, timedelta
+
+# Добавляем корневую директорию в путь Python
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from utils.clickhouse_client import ClickHouseClient
+from utils.schema import TABLES
+
+# Повторных копирований часов, дописанных во время копирования, до отказа
+VERIFY_ROUNDS = 3
+
+
+def normalize(expression):
+    return (expression or '').replace(' ', '')
+
+
+def table_layout(ch, table_name):
+    """Текущие ключи и типы колонок таблицы или None, если таблицы нет"""
+    rows = ch.execute(
+        "SELECT sorting_key, partition_key, engine, engine_full FROM system.tables "
+        "WHERE database = currentDatabase() AND name = %(name)s",
+        {'name': table_name}
+    )
+    if not rows:
+        return None
+
+    columns = ch.execute(
+        "SELECT name, type FROM system.columns "
+        "WHERE database = currentDatabase() AND table = %(name)s ORDER BY position",
+        {'name': table_name}
+    )
+    settings = re.search(r"\bSETTINGS\s+(.*)$", rows[0][3])
+    return {
+        'sorting_key': rows[0][0],
+        'partition_key': rows[0][1],
+        'engine': rows[0][2],
+        'settings': dict(re.findall(r"(\w+)\s*=\s*'?([^,']*)'?", settings.group(1))) if settings else {},
+        'columns': dict(columns),
+    }
+
+
+def layout_changes(table, layout):
+    """Отличия текущей таблицы от описания"""
+    changes = []
+    if normalize(layout['sorting_key']) != normalize(table.sorting_key):
+        changes.append(f"ORDER BY ({layout['sorting_key'] or 'tuple()'}) -> ({table.sorting_key})")
+    if normalize(layout['partition_key']) != normalize(table.partition_by):
+        changes.append(f"PARTITION BY {layout['partition_key'] or '-'} -> {table.partition_by or '-'}")
+    engine = table.engine.split('(')[0]
+    if layout['engine'] != engine:
+        changes.append(f"ENGINE {layout['engine']} -> {engine}")
+    for c in table.columns:
+        current = layout['columns'].get(c.name)
+        if current is not None and current != c.type:
+            changes.append(f"{c.name}: {current} -> {c.type}")
+    return changes
+
+
+def missing_columns(table, layout):
+    """ADD COLUMN для колонок описания, которых нет в текущей таблице (на своих местах)"""
+    statements = []
+    previous = None
+    for c in table.columns:
+        if c.name not in layout['columns']:
+            position = f" AFTER {previous}" if previous else " FIRST"
+            statements.append(f"ADD COLUMN IF NOT EXISTS {table.column_ddl(c)}{position}")
+        previous = c.name
+    return statements
+
+
+def settings_changes(table, layout):
+    """SETTINGS таблицы, отличающиеся от описания: {имя: значение}"""
+    return {k: v for k, v in table.settings.items() if layout['settings'].get(k) != str(v)}
+
+
+def time_chunks(start, end, hours):
+    """Интервалы [from, to) по hours часов, выровненные по началу часа"""
+    step = timedelta(hours=hours)
+    current = start.replace(minute=0, second=0, microsecond=0)
+    while current <= end:
+        yield current, current + step
+        current += step
+
+
+def copy_rows(ch, source, target, columns, time_column, start, end):
+    column_list = ', '.join(columns)
+    ch.execute(
+        f"INSERT INTO {target} ({column_list}) "
+        f"SELECT {column_list} FROM {source} "
+        f"WHERE {time_column} >= %(start)s AND {time_column} < %(end)s",
+        {'start': start, 'end': end}
+    )
+
+
+def hourly_counts(ch, table_name, time_column, end):
+    """Количество строк по часам до end: {начало часа: строк}"""
+    return dict(ch.execute(
+        f"SELECT toStartOfHour({time_column}) AS hour, count() FROM {table_name} "
+        f"WHERE {time_column} < %(end)s GROUP BY hour",
+        {'end': end}
+    ))
+
+
+def stale_hours(source_counts, target_counts):
+    """Часы, в которых копия расходится с исходной таблицей"""
+    return sorted(h for h in set(source_counts) | set(target_counts)
+                  if source_counts.get(h) != target_counts.get(h))
+
+
+def recopy_hours(ch, source, target, columns, time_column, hours):
+    """Повторное копирование часов: строки часа в target удаляются и копируются заново"""
+    for hour in hours:
+        params = {'start': hour, 'end': hour + timedelta(hours=1)}
+        ch.execute(
+            f"ALTER TABLE {target} DELETE WHERE {time_column} >= %(start)s AND {time_column} < %(end)s",
+            params, settings={'mutations_sync': 2}
+        )
+        copy_rows(ch, source, target, columns, time_column, params['start'], params['end'])
+
+
+def migrate_table(ch, table, chunk_hours=24, drop_old=False, dry_run=False):
+    """Миграция одной таблицы"""
+    layout = table_layout(ch, table.name)
+    if layout is None:
+        print(f"🆕 {table.name}: table does not exist, creating")
+        if dry_run:
+            print(table.ddl())
+        else:
+            ch.create_table(table.name, table)
+        return True
+
+    changes = layout_changes(table, layout)
+    if not changes:
+        # Новые колонки и SETTINGS меняются без копирования данных
+        alterations = missing_columns(table, layout)
+        settings = settings_changes(table, layout)
+        if settings:
+            alterations.append("MODIFY SETTING " + ', '.join(f"{k} = {v}" for k, v in settings.items()))
+        if not alterations:
+            print(f"✅ {table.name}: schema is up to date")
+            return True
+
+        for alteration in alterations:
+            print(f"🔧 {table.name}: {alteration}")
+            if not dry_run:
+                ch.execute(f"ALTER TABLE {table.name} {alteration}")
+        return True
+
+    print(f"🔄 {table.name}: migration required")
+    for change in changes:
+        print(f"   {change}")
+
+    new_name = f"{table.name}__migrate"
+    columns = [c for c in table.column_names if c in layout['columns']]
+    time_column = table.time_column
+
+    if dry_run:
+        print(table.ddl(new_name))
+        print(f"   Columns copied: {', '.join(columns)}")
+        return True
+
+    # Остатки прерванной миграции не переиспользуются: копирование начинается заново
+    ch.execute(f"DROP TABLE IF EXISTS {new_name}")
+    ch.create_table(new_name, table)
+
+    # Копируем все, что записано до начала текущего часа; остальное - после EXCHANGE.
+    # Граница берется с сервера: с ней сравниваются DateTime в часовом поясе сервера
+    copy_until = ch.execute("SELECT toStartOfHour(now())")[0][0]
+    first, total = ch.execute(
+        f"SELECT min({time_column}), count() FROM {table.name} WHERE {time_column} < %(end)s",
+        {'end': copy_until}
+    )[0]
+
+    verified = {}
+    if total:
+        chunks = [(a, min(b, copy_until)) for a, b in time_chunks(first, copy_until, chunk_hours) if a < copy_until]
+        print(f"📦 Copying {total} rows in {len(chunks)} chunks of {chunk_hours}h")
+        for n, (start, end) in enumerate(chunks, 1):
+            copy_rows(ch, table.name, new_name, columns, time_column, start, end)
+            print(f"   [{n}/{len(chunks)}] {start:%Y-%m-%d %H:%M} - {end:%Y-%m-%d %H:%M}")
+
+        # Строки до границы, записанные после копирования своего куска, копируются заново по часам
+        for attempt in range(VERIFY_ROUNDS + 1):
+            verified = hourly_counts(ch, table.name, time_column, copy_until)
+            stale = stale_hours(verified, hourly_counts(ch, new_name, time_column, copy_until))
+            if not stale:
+                break
+            if attempt == VERIFY_ROUNDS:
+                print(f"❌ {table.name}: {len(stale)} hours still differ after {VERIFY_ROUNDS} re-copies, "
+                      f"{new_name} left for inspection")
+                return False
+            print(f"🔁 Re-copying {len(stale)} hours written during copy")
+            recopy_hours(ch, table.name, new_name, columns, time_column, stale)
+
+    ch.execute(f"EXCHANGE TABLES {table.name} AND {new_name}")
+    # После обмена в new_name лежит старая таблица: докопируем строки, пришедшие во время копирования
+    copy_rows(ch, new_name, table.name, columns, time_column, copy_until, datetime(2106, 1, 1))
+    # Строки до границы, записанные между последней сверкой и EXCHANGE, в новую таблицу не попали
+    late = stale_hours(verified, hourly_counts(ch, new_name, time_column, copy_until))
+    if late:
+        print(f"⚠️ {table.name}: {len(late)} hours got rows before EXCHANGE and were not copied: "
+              f"{', '.join(f'{h:%Y-%m-%d %H:%M}' for h in late)}")
+
+    if drop_old:
+        ch.execute(f"DROP TABLE {new_name}")
+        print(f"🗑️ Old {table.name} dropped")
+    else:
+        backup_name = f"{table.name}__backup_{datetime.now():%Y%m%d_%H%M}"
+        ch.execute(f"RENAME TABLE {new_name} TO {backup_name}")
+        print(f"💾 Old {table.name} kept as {backup_name}")
+
+    print(f"✅ {table.name}: migrated")
+    return True
+
+
+def migrate_schema(tables=None, chunk_hours=24, drop_old=False, dry_run=False):
+    ch = ClickHouseClient()
+
+    names = tables or list(TABLES)
+    unknown = [name for name in names if name not in TABLES]
+    if unknown:
+        print(f"❌ Unknown tables: {', '.join(unknown)}")
+        return False
+
+    ok = True
+    for name in names:
+        try:
+            ok = migrate_table(ch, TABLES[name], chunk_hours, drop_old, dry_run) and ok
+        except Exception as e:
+            print(f"❌ {name}: migration failed: {e}")
+            ok = False
+
+    print("✅ Schema migration finished" if ok else "⚠️ Schema migration finished with errors")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate ClickHouse tables to utils/schema.py layout")
+    parser.add_argument('--tables', nargs='*', help="Tables to migrate (default: all)")
+    parser.add_argument('--chunk-hours', type=int, default=24, help="Time range copied by one INSERT")
+    parser.add_argument('--drop-old', action='store_true', help="Drop the old table instead of keeping a backup")
+    parser.add_argument('--dry-run', action='store_true', help="Only print planned changes")
+    args = parser.parse_args()
+
+    ok = migrate_schema(args.tables, args.chunk_hours, args.drop_old, args.dry_run)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
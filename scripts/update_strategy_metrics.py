@@ -0,0 +1,69 @@
+"""
+Обновление strategy_metrics по новым сделкам из trades.
+
+Обрабатываются только сделки после водяного знака из файла состояния
+(ANALYTICS_CONFIG['state_path']); с --loop обновление повторяется каждые
+--interval секунд. --reset удаляет состояние: история trades будет
+обработана заново (старые строки strategy_metrics при этом не удаляются).
+
+    python -m scripts.update_strategy_metrics [--loop] [--interval 300] [--reset]
+"""
+import sys
+import os
+import argparse
+import logging
+
+# Добавляем корневую директорию в путь Python
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from config.analytics_config import ANALYTICS_CONFIG
+from utils.clickhouse_client import ClickHouseClient
+from utils.strategy_analytics import StrategyAnalytics
+
+
+def update_strategy_metrics(loop=False, interval=None, reset=False):
+    state_path = ANALYTICS_CONFIG['state_path']
+    if reset and os.path.exists(state_path):
+        os.remove(state_path)
+        print(f"🗑️ Analytics state removed: {state_path}")
+
+    analytics = StrategyAnalytics(
+        ClickHouseClient(),
+        state_path,
+        period_seconds=ANALYTICS_CONFIG['period_seconds'],
+        settle_seconds=ANALYTICS_CONFIG['settle_seconds'],
+        batch_rows=ANALYTICS_CONFIG['batch_rows'],
+    )
+
+    if loop:
+        print(f"🔄 Updating strategy metrics every {interval or ANALYTICS_CONFIG['interval']}s (Ctrl+C to stop)")
+        try:
+            analytics.run_forever(interval or ANALYTICS_CONFIG['interval'])
+        except KeyboardInterrupt:
+            analytics.stop()
+        return
+
+    processed = analytics.run_once()
+    print(f"✅ Processed {processed} new trades, watermark: {analytics.watermark[0]}")
+    for name, state in sorted(analytics.strategies.items()):
+        print(f"  {name}: PnL ${state.equity:.2f}, drawdown ${state.max_drawdown:.2f}, "
+              f"trades {state.winning_trades}/{state.total_trades}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Update strategy_metrics from new trades")
+    parser.add_argument('--loop', action='store_true', help="Keep updating periodically")
+    parser.add_argument('--interval', type=int, help="Update period in seconds for --loop")
+    parser.add_argument('--reset', action='store_true', help="Drop saved state and reprocess all trades")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    update_strategy_metrics(args.loop, args.interval, args.reset)
+
+
+if __name__ == "__main__":
+    main()
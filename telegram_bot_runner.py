@@ -1,8 +1,8 @@
 #!/usr/bin/env python3
 import os
-import asyncio
 import logging
-from telegram import TelegramBot, create_and_initialize_bot
+from datetime import datetime, timezone
+from utils.telegram_client import TelegramBot
 from dotenv import load_dotenv
 
 # Загрузка переменных окружения
@@ -15,7 +15,7 @@ class BotRunner:
         self.admin_chat_ids = [int(x) for x in os.getenv('ADMIN_CHAT_IDS', '').split(',') if x]
         self.bot = None
 
-    async def setup(self):
+    def setup(self):
         """Настройка бота"""
         if not self.token:
             raise ValueError("TELEGRAM_BOT_TOKEN not found in environment variables")
@@ -23,9 +23,12 @@ class BotRunner:
         if not self.admin_chat_ids:
             raise ValueError("ADMIN_CHAT_IDS not found in environment variables")
 
-        self.bot = await create_and_initialize_bot(self.token, self.admin_chat_ids)
+        self.bot = TelegramBot(self.token, self.admin_chat_ids)
+        # Сообщение о запуске отправляется из post_init, в event loop polling
+        if not self.bot.build_application(post_init=self.send_startup_message):
+            raise Exception("Failed to initialize Telegram bot")
 
-    async def send_startup_message(self):
+    async def send_startup_message(self, application=None):
         """Отправка сообщения о запуске"""
         startup_msg = """
 🚀 <b>Бот успешно запущен!</b>
@@ -33,14 +36,14 @@ class BotRunner:
 <b>Время запуска:</b> {time}
 
 ✅ Все системы работают нормально
-        """.format(time=asyncio.get_event_loop().time())
+        """.format(time=datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC'))
 
         await self.bot.send_message_to_admins(startup_msg)
 
     def run(self):
         """Запуск бота"""
         try:
-            # Запуск в режиме polling
+            # Запуск в режиме polling (блокирующий вызов, собственный event loop)
             self.bot.run_polling()
         except KeyboardInterrupt:
             logging.info("Bot stopped by user")
@@ -48,12 +51,11 @@ class BotRunner:
             logging.error(f"Bot error: {e}")
 
 
-async def main():
+def main():
     runner = BotRunner()
-    await runner.setup()
-    await runner.send_startup_message()
+    runner.setup()
     runner.run()
 
 
 if __name__ == '__main__':
-    asyncio.run(main())
\ No newline at end of file
+    main()
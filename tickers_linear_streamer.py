@@ -1,9 +1,8 @@
 import sys
 import os
-from datetime import datetime
-from time import sleep
-import requests
-from pybit.unified_trading import WebSocket
+import threading
+from datetime import datetime, timezone
+from time import sleep, time
 
 # Добавляем корневую директорию в путь Python
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -12,7 +11,22 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-from utils.clickhouse_client import ClickHouseClient
+from config.alert_config import ALERT_CONFIG
+from config.alert_rules import ALERT_RULES, OPEN_INTEREST_WINDOW, RULES_INTERVAL
+from config.ingest_config import INGEST_CONFIG
+from utils.alert_aggregator import AlertAggregator
+from utils.candles import CandleAggregator
+from utils.clickhouse_client import ClickHouseClient, BatchWriter
+from utils.column_buffer import ColumnBuffer
+from utils.frame_recorder import FrameRecorder
+from utils.gap_tracker import GapTracker, TickerBackfill
+from utils.metrics import MetricsRegistry, instrument_websocket
+from utils.rules_engine import RulesEngine
+from utils.spill_log import SpillLog
+from utils.subscription_planner import SubscriptionPlanner
+from utils.symbol_registry import SymbolRegistry
+from utils.ticker_decoder import install_fast_handler
+from utils.ticker_state import TickerStateTable
 
 # 🔥 ИМПОРТИРУЕМ БОТА
 
@@ -29,21 +43,170 @@ except Exception as e:
     BOT_AVAILABLE = False
 
 
+# Поля Bybit -> колонки bybit_tickers_linear
+LINEAR_FLOAT_FIELDS = [
+    ('lastPrice', 'last_price'),
+    ('prevPrice24h', 'prev_price_24h'),
+    ('price24hPcnt', 'price_24h_pcnt'),
+    ('highPrice24h', 'high_price_24h'),
+    ('lowPrice24h', 'low_price_24h'),
+    ('prevPrice1h', 'prev_price_1h'),
+    ('markPrice', 'mark_price'),
+    ('indexPrice', 'index_price'),
+    ('openInterest', 'open_interest'),
+    ('openInterestValue', 'open_interest_value'),
+    ('turnover24h', 'turnover_24h'),
+    ('volume24h', 'volume_24h'),
+    ('fundingRate', 'funding_rate'),
+    ('bid1Price', 'bid1_price'),
+    ('bid1Size', 'bid1_size'),
+    ('ask1Price', 'ask1_price'),
+    ('ask1Size', 'ask1_size'),
+]
+LINEAR_STATE_TIME_FIELDS = [('nextFundingTime', 'next_funding_time')]
+LINEAR_TEXT_FIELDS = [('tickDirection', 'tick_direction')]
+
+# Колонки в порядке значений, которые собирает handle_linear_ticker
+LINEAR_TIME_COLUMNS = ['event_time', 'receive_time'] + [c for _, c in LINEAR_STATE_TIME_FIELDS]
+LINEAR_TEXT_COLUMNS = [c for _, c in LINEAR_TEXT_FIELDS]
+LINEAR_FLOAT_COLUMNS = [c for _, c in LINEAR_FLOAT_FIELDS]
+
+# Поля состояния для свечей market_data
+LAST_PRICE_INDEX = LINEAR_FLOAT_COLUMNS.index('last_price')
+VOLUME_24H_INDEX = LINEAR_FLOAT_COLUMNS.index('volume_24h')
+
+
 class LinearTickerStreamer:
-    def __init__(self):
-        self.ch_client = ClickHouseClient()
-        self.ws = None
+    def __init__(self, symbols=None, message_counter=None, shard_id=0, shards=1, ch_client=None):
+        """
+        Args:
+            symbols: Символы для подписки (по умолчанию - все linear пары USDT)
+            message_counter: Общий счетчик сообщений (multiprocessing.Value) для супервизора
+            shard_id: Номер шарда (отдельный журнал недозаписанных пакетов на шард)
+            shards: Количество шардов категории (новые символы добавляются только своего шарда)
+            ch_client: Клиент ClickHouse (по умолчанию - ClickHouseClient(); replay передает заглушку)
+        """
+        self.symbols = symbols
+        # Список символов: кэш на диске и периодическая проверка новых листингов и делистингов
+        self.registry = self.create_symbol_registry(shard_id, shards)
+        if symbols is not None:
+            self.registry.symbols = list(symbols)
+        self.message_counter = message_counter
+        self.ch_client = ch_client if ch_client is not None else ClickHouseClient()
+        # Метрики шарда: скорость сообщений по символам, задержка биржа -> прием, вставки, переподключения
+        self.metrics = MetricsRegistry('bybit_ingest', {'category': 'linear', 'shard': shard_id})
+        self.metrics_port = None
+        if INGEST_CONFIG['metrics_port']:
+            self.metrics_port = (INGEST_CONFIG['metrics_port'] + INGEST_CONFIG['metrics_port_offsets']['linear']
+                                 + shard_id)
+        self.m_messages = self.metrics.counter('messages_total', 'Ticker messages received', ['symbol'])
+        self.m_lag = self.metrics.histogram('lag_seconds', 'Exchange event time to receive time',
+                                            lowest=1e-3, highest=3600)
+        self.m_reconnects = self.metrics.counter('ws_reconnects_total', 'WebSocket reconnects')
+        self.m_first_message = self.metrics.histogram('first_message_seconds',
+                                                      'Time from subscription start to the first ticker',
+                                                      lowest=1e-3, highest=3600)
+        # Обработчик тикеров вызывается из потоков всех WebSocket соединений шарда,
+        # поэтому общие метрики и счетчик супервизора обновляются под блокировкой
+        self.metrics_lock = threading.Lock()
+        # Последнее состояние по символам: delta сообщения накладываются на snapshot
+        self.state = TickerStateTable(
+            float_fields=[k for k, _ in LINEAR_FLOAT_FIELDS],
+            time_fields=[k for k, _ in LINEAR_STATE_TIME_FIELDS],
+            text_fields=[k for k, _ in LINEAR_TEXT_FIELDS]
+        )
+        # Пакетная запись: одна вставка на много сообщений вместо INSERT на каждое
+        self.writer = BatchWriter(
+            self.ch_client,
+            max_rows=INGEST_CONFIG['batch_rows'],
+            max_delay=INGEST_CONFIG['batch_delay'],
+            queue_size=INGEST_CONFIG['queue_size'],
+            overflow_policy=INGEST_CONFIG['overflow_policy'],
+            spill_log=SpillLog(
+                os.path.join(INGEST_CONFIG['spill_dir'], f"linear-{shard_id}"),
+                max_segment_bytes=INGEST_CONFIG['spill_segment_mb'] * 1024 * 1024
+            ),
+            replay_interval=INGEST_CONFIG['spill_replay_interval'],
+            metrics=self.metrics
+        )
+        self.writer.use_columns("bybit_tickers_linear", ColumnBuffer(
+            time_columns=LINEAR_TIME_COLUMNS,
+            symbol_column='symbol',
+            text_columns=LINEAR_TEXT_COLUMNS,
+            float_columns=LINEAR_FLOAT_COLUMNS,
+            flag_columns=['is_backfill'],
+            nullable_time_columns=['next_funding_time'],
+            capacity=self.writer.max_rows
+        ))
+        # Свечи по lastPrice и приросту volume24h, закрытые свечи пишутся в market_data
+        self.candles = None
+        if INGEST_CONFIG['candle_timeframes']:
+            self.candles = CandleAggregator(INGEST_CONFIG['candle_timeframes'])
+        # Ошибки обработки группируются в сводки вместо алерта на каждое сообщение
+        self.source = f"linear#{shard_id}"
+        # Запись сырых кадров для воспроизведения нагрузки (benchmarks/replay.py)
+        self.recorder = None
+        if INGEST_CONFIG['record_dir']:
+            self.recorder = FrameRecorder(
+                INGEST_CONFIG['record_dir'],
+                prefix=f"linear-{shard_id}",
+                max_bytes=INGEST_CONFIG['record_file_mb'] * 1024 * 1024,
+                max_seconds=INGEST_CONFIG['record_file_seconds'],
+                compression=INGEST_CONFIG['record_compression']
+            )
+            self.metrics.gauge('recorded_frames', 'WebSocket frames written to the recording',
+                               func=lambda: self.recorder.frames)
+            self.metrics.gauge('recorder_dropped_frames', 'Frames dropped on recorder queue overflow',
+                               func=lambda: self.recorder.dropped)
+        self.alerts = AlertAggregator(self.send_alert, **ALERT_CONFIG)
+        self.metrics.gauge('alerts_reported', 'Events reported to the alert aggregator',
+                           func=lambda: self.alerts.reported)
+        # Ценовые алерты: правила проверяются по всем символам сразу, а не в обработчике сообщений
+        self.rules = RulesEngine(self.state, ALERT_RULES, self.on_rule_trigger, oi_window=OPEN_INTEREST_WINDOW)
+        self.metrics.gauge('rules_eval_seconds', 'Last alert rules evaluation time',
+                           func=lambda: self.rules.last_duration)
+        # Символы раскладываются по нескольким соединениям, подписка подтверждается ответом сервера
+        self.planner = SubscriptionPlanner(
+            'linear',
+            self.handle_linear_ticker,
+            topics_per_connection=INGEST_CONFIG['ws_topics_per_connection'],
+            on_connection=self.prepare_connection,
+            on_first_message=self.observe_first_message
+        )
+        self.first_message_reported = False
+        # Пропуски по символам (разрывы ts/cs, тишина, переподключения) дозаписываются снимком REST
+        self.gaps = GapTracker(
+            gap_ms=INGEST_CONFIG['gap_threshold_ms'],
+            watchdog_seconds=INGEST_CONFIG['gap_watchdog_seconds'],
+            backfill_interval=INGEST_CONFIG['backfill_interval']
+        )
+        self.backfill = TickerBackfill(
+            'linear',
+            float_fields=LINEAR_FLOAT_FIELDS,
+            time_fields=LINEAR_STATE_TIME_FIELDS,
+            text_fields=LINEAR_TEXT_FIELDS
+        )
+        self.backfill_thread = None
+        for name in ('gaps', 'sequence_resets', 'watchdog_gaps'):
+            self.metrics.gauge(f"stream_{name}", f"Ticker stream {name.replace('_', ' ')}",
+                               func=lambda name=name: getattr(self.gaps, name))
+        self.metrics.gauge('backfill_rows', 'Rows written from REST ticker snapshots',
+                           func=lambda: self.backfill.rows)
+
+        # Под супервизором (ingest_supervisor.py) о запуске и остановке сообщает он сам,
+        # а не каждый шард при каждом (пере)запуске
+        self.notify_lifecycle = message_counter is None
 
         # 🔥 ОТПРАВЛЯЕМ СООБЩЕНИЕ О ЗАПУСКЕ (БЕЗ ВЫЗОВА start()!)
-        if BOT_AVAILABLE:
+        if not BOT_AVAILABLE:
+            print("⚠️ Telegram Bot not available")
+        elif self.notify_lifecycle:
             print("✅ Sending startup message...")
             success = bot.send_alert("SYSTEM", "Linear ticker streamer started successfully")
             if success:
                 print("✅ Startup message sent to Telegram")
             else:
                 print("❌ Failed to send startup message")
-        else:
-            print("⚠️ Telegram Bot not available")
 
 
     def safe_float(self, value, default=0.0):
@@ -55,175 +218,277 @@ class LinearTickerStreamer:
         except (ValueError, TypeError):
             return default
 
-    def safe_timestamp(self, ts_value):
-        """Безопасное преобразование timestamp"""
+    def safe_timestamp(self, ts_value, default=None):
+        """Безопасное преобразование timestamp в epoch-ms (по умолчанию - текущее время)"""
         if not ts_value:
-            return datetime.now()
-        try:
-            return datetime.fromtimestamp(int(ts_value) / 1000)
-        except (ValueError, TypeError):
-            return datetime.now()
-
-    def safe_datetime(self, dt_value):
-        """Безопасное преобразование datetime с обработкой None"""
-        if not dt_value or dt_value == '':
-            return None
+            return int(time() * 1000) if default is None else default
         try:
-            return datetime.fromtimestamp(int(dt_value) / 1000)
+            return int(ts_value)
         except (ValueError, TypeError):
-            return None
+            return int(time() * 1000) if default is None else default
 
     def handle_linear_ticker(self, message):
         """Обработчик linear тикеров"""
+        if self.message_counter is not None:
+            with self.metrics_lock:
+                self.message_counter.value += 1
+
+        data = message.get('data', {})
         try:
-            data = message.get('data', {})
             if not data:
                 return
 
-            # Временные метки
-            event_time = self.safe_timestamp(data.get('ts'))
-            receive_time = datetime.now()
-
-            # Обработка next_funding_time - безопасная обработка None
-            next_funding_time = self.safe_datetime(data.get('nextFundingTime'))
-
-            # Подготовка данных для вставки - 22 значения для 22 колонок
-            record = (
-                event_time,  # event_time
-                receive_time,  # receive_time
-                data.get('symbol', ''),  # symbol
-                data.get('tickDirection', ''),  # tick_direction
-                self.safe_float(data.get('lastPrice')),  # last_price
-                self.safe_float(data.get('prevPrice24h')),  # prev_price_24h
-                self.safe_float(data.get('price24hPcnt')),  # price_24h_pcnt
-                self.safe_float(data.get('highPrice24h')),  # high_price_24h
-                self.safe_float(data.get('lowPrice24h')),  # low_price_24h
-                self.safe_float(data.get('prevPrice1h')),  # prev_price_1h
-                self.safe_float(data.get('markPrice')),  # mark_price
-                self.safe_float(data.get('indexPrice')),  # index_price
-                self.safe_float(data.get('openInterest')),  # open_interest
-                self.safe_float(data.get('openInterestValue')),  # open_interest_value
-                self.safe_float(data.get('turnover24h')),  # turnover_24h
-                self.safe_float(data.get('volume24h')),  # volume_24h
-                self.safe_float(data.get('fundingRate')),  # funding_rate
-                next_funding_time,  # next_funding_time (может быть None)
-                self.safe_float(data.get('bid1Price')),  # bid1_price
-                self.safe_float(data.get('bid1Size')),  # bid1_size
-                self.safe_float(data.get('ask1Price')),  # ask1_price
-                self.safe_float(data.get('ask1Size'))  # ask1_size
-            )
-
-            # Проверяем длину записи
-            if len(record) != 22:
-                print(f"⚠️ Warning: Record length is {len(record)}, expected 22")
+            # Время события Bybit передает в корне сообщения
+            event_time = self.safe_timestamp(message.get('ts') or data.get('ts'))
+            receive_time = int(time() * 1000)
+            with self.metrics_lock:
+                self.m_messages.labels(data.get('symbol', '')).inc()
+                # Часы биржи могут опережать локальные: отрицательная задержка считается нулевой
+                self.m_lag.observe(max(0, receive_time - event_time) / 1000)
+            self.gaps.observe(data.get('symbol'), event_time, message.get('cs'))
+
+            # Delta содержит только изменившиеся поля - дополняем из состояния
+            row = self.state.apply(data, event_time, snapshot=message.get('type') == 'snapshot')
+            if row is None:
                 return
 
-            # Вставка в ClickHouse без указания колонок
-            self.ch_client.insert_data("bybit_tickers_linear", [record])
-
-            # symbol = data.get('symbol', '')
-            # last_price = self.safe_float(data.get('lastPrice'))
-            # print(f"📊 Linear: {symbol} - {last_price}")
-
-            # 🔥 ОТПРАВКА АЛЕРТА В ТЕЛЕГРАМ ДЛЯ ОСНОВНЫХ СИМВОЛОВ
-            # if BOT_AVAILABLE and symbol:
-                # Отправляем алерт только для основных криптовалют
-                # major_symbols = ['BTC', 'ETH', 'SOL', 'BNB', 'XRP', 'ADA', 'DOT']
-                # if any(major in symbol for major in major_symbols):
-                #     price_change = self.safe_float(data.get('price24hPcnt', 0)) * 100
-                    # Отправляем сообщение для теста (убрать условие с 5% после теста)
-                    # if True:  # abs(price_change) > 5:  # Пока отправляем все для теста
-                    #     success = bot.send_alert("PRICE_ALERT",
-                    #                              f"{symbol}: {last_price}\n"
-                    #                              f"Изменение за 24ч: {price_change:+.2f}%")
-                    #     if success:
-                    #         print(f"✅ Telegram alert sent for {symbol}")
+            symbol, state_times, texts, floats = self.state.record(row)
+            # next_funding_time: 0 записывается как NULL
+            times = (event_time, receive_time) + state_times
+
+            # Постановка в очередь на колоночную вставку в ClickHouse
+            # При переполнении очереди строка символа заменяет его же ожидающую строку
+            self.writer.add("bybit_tickers_linear", (times, symbol, texts, floats), key=symbol)
+
+            if self.candles is not None:
+                closed = self.candles.update(symbol, event_time,
+                                             float(floats[LAST_PRICE_INDEX]), float(floats[VOLUME_24H_INDEX]))
+                for bar in closed:
+                    self.writer.add("market_data", bar)
 
         except Exception as e:
-            print(f"❌ Error processing linear ticker: {e}")
-            # 🔥 ОТПРАВКА ОШИБКИ В ТЕЛЕГРАМ
+            symbol = data.get('symbol') if isinstance(data, dict) else None
+            self.alerts.report(type(e).__name__, self.source, f"{symbol}: {e}", severity='warning', key=symbol)
+
+    def check_rules(self):
+        """Проверка правил алертов по текущему состоянию всех символов"""
+        try:
+            self.rules.evaluate()
+        except Exception as e:
+            self.alerts.report(type(e).__name__, f"{self.source} rules", str(e), severity='error')
+
+    def on_rule_trigger(self, rule, symbol, value, price):
+        """Срабатывание правила алерта"""
+        if rule.get('signal'):
             if BOT_AVAILABLE:
-                bot.send_alert("ERROR", f"Ошибка обработки тикера: {e}")
+                bot.send_signal(symbol, rule['signal'], price)
+            return
+
+        # Напрямую, без группировки ошибок: частоту уже ограничивает debounce правила по символу,
+        # а кулдаун сводок задержал бы алерт другого символа по тому же правилу
+        shown = f"{value:+.2%}" if rule['metric'] != 'last_price' else f"{value}"
+        self.send_alert("PRICE_ALERT", f"{rule['name']}: {symbol}: {shown} (цена {price})",
+                        rule.get('severity', 'info'))
+
+    def send_alert(self, alert_type, message, severity):
+        """Отправка алерта (сводки ошибок или ценового алерта)"""
+        print(f"❌ [{severity}] {alert_type}: {message}")
+        # История алертов для команды /alerts бота
+        self.writer.add("alerts_log", (datetime.now(timezone.utc), self.source, alert_type, severity, message))
+        # 🔥 ОТПРАВКА ОШИБКИ В ТЕЛЕГРАМ
+        if BOT_AVAILABLE:
+            bot.send_alert(alert_type, message, severity)
+
+    @staticmethod
+    def create_symbol_registry(shard_id=0, shards=1):
+        return SymbolRegistry(
+            'linear',
+            cache_dir=INGEST_CONFIG['symbols_cache_dir'],
+            cache_ttl=INGEST_CONFIG['symbols_cache_ttl'],
+            refresh_interval=INGEST_CONFIG['symbols_refresh_interval'],
+            shard_id=shard_id,
+            shards=shards
+        )
 
-    def get_linear_symbols(self):
+    @classmethod
+    def get_linear_symbols(cls):
         """Получение списка всех linear пар USDT"""
-        url = "https://api.bybit.com/v5/market/instruments-info"
         try:
-            response = requests.get(url, params={'category': 'linear'})
-            data = response.json().get('result', {}).get('list', [])
-            symbols = [s['symbol'] for s in data
-                       if s.get('quoteCoin') == 'USDT'
-                       and s.get('status') == 'Trading']
+            symbols = cls.create_symbol_registry().load()
             print(f"✅ Found {len(symbols)} linear trading pairs")
             return symbols
         except Exception as e:
             print(f"❌ Error fetching linear symbols: {e}")
             return []
 
+    def on_symbols_changed(self, added, removed):
+        """Подписка на новые и отписка от снятых с торгов символов без переподключения"""
+        if removed:
+            self.planner.unsubscribe(removed)
+            print(f"➖ Unsubscribed from {len(removed)} delisted linear symbols: {removed}")
+        if added:
+            print(f"➕ New linear symbols: {added}")
+            self.subscribe_new_symbols(added)
+        self.symbols = list(self.registry.symbols)
+        self.alerts.report("SYMBOLS", self.source, f"+{len(added)} {added}, -{len(removed)} {removed}",
+                           severity='info')
+
+    def subscribe_new_symbols(self, symbols):
+        failed = self.planner.subscribe(symbols)
+        if failed:
+            print(f"❌ Linear subscription not confirmed: {failed}")
+
     def subscribe_all_linear(self):
-        """Подписка на все linear пары с учетом лимита длины строки"""
-        symbols = self.get_linear_symbols()
-        if not symbols:
+        """Подписка на все linear пары"""
+        if self.symbols is None:
+            self.symbols = self.get_linear_symbols()
+            self.registry.symbols = list(self.symbols)
+        if not self.symbols:
             print("❌ No symbols found for subscription")
             return
 
-        # Группировка символов с учетом лимита длины строки (21000 символов)
-        max_length = 21000
-        current_group = []
-        current_length = 0
-
-        for symbol in symbols:
-            symbol_length = len(symbol) + 1  # +1 для запятой
-
-            if current_length + symbol_length > max_length and current_group:
-                # Подписываемся на текущую группу
-                self.subscribe_to_group(current_group)
-                current_group = []
-                current_length = 0
-
-            current_group.append(symbol)
-            current_length += symbol_length
+        report = self.planner.start(self.symbols)
+        connections = report['connections']
+        print(f"✅ Subscribed to {len(self.symbols) - len(report['failed'])} linear symbols "
+              f"over {len(connections)} connections "
+              f"({', '.join(str(c['symbols']) for c in connections)} symbols, "
+              f"slowest connect {max((c['connect_seconds'] for c in connections), default=0):.1f}s)")
+        if report['failed']:
+            print(f"❌ Linear subscription not confirmed: {report['failed']}")
+
+    def prepare_connection(self, ws):
+        """Настройка нового WebSocket соединения до подписки"""
+        # Быстрый JSON и тикеры без copy.deepcopy на каждое сообщение
+        install_fast_handler(ws)
+        instrument_websocket(ws, self.m_reconnects, on_reconnect=self.gaps.on_reconnect,
+                             lock=self.metrics_lock)
+        if self.recorder is not None:
+            self.recorder.attach(ws)
+
+    def observe_first_message(self, symbol, seconds):
+        """Время до первого сообщения символа (из потока его соединения)"""
+        with self.metrics_lock:
+            self.m_first_message.observe(seconds)
+
+    def report_first_messages(self, timeout=60):
+        """Однократный отчет о времени до первого сообщения по символам"""
+        if self.first_message_reported or self.planner.started_at is None:
+            return
+        report = self.planner.report()
+        elapsed = time() - self.subscribe_started
+        if report['waiting'] and elapsed < timeout:
+            return
 
-        # Подписываемся на оставшиеся символы
-        if current_group:
-            self.subscribe_to_group(current_group)
+        self.first_message_reported = True
+        if report['received']:
+            print(f"⏱️ Linear first message: {report['received']} symbols, "
+                  f"p50 {report['first_message_p50']:.2f}s, p95 {report['first_message_p95']:.2f}s, "
+                  f"max {report['first_message_max']:.2f}s")
+        if report['waiting']:
+            print(f"⚠️ Linear no messages after {timeout}s for {len(report['waiting'])} symbols: "
+                  f"{report['waiting'][:20]}")
+
+    def print_writer_stats(self):
+        """Вывод счетчиков очереди и записи"""
+        stats = self.writer.stats()
+        print(f"📦 Linear queue: depth {stats['depth']}/{stats['maxsize']}, "
+              f"high water {stats['high_water']}, dropped {stats['dropped']}, "
+              f"conflated {stats['conflated']}, flushed {stats['flushed_rows']}, failed {stats['failed_rows']}, "
+              f"spilled {stats['spilled_rows']} ({stats['spill_segments']} segments pending)")
+        lag = self.m_lag.quantiles((0.5, 0.99))
+        print(f"📈 Linear lag p50 {lag[0.5] * 1000:.0f}ms, p99 {lag[0.99] * 1000:.0f}ms, "
+              f"reconnects {self.m_reconnects.value}")
+
+    def close_due_candles(self):
+        """Запись свечей символов, по которым не было тикеров после конца интервала"""
+        if self.candles is None:
+            return
+        for bar in self.candles.close_due(int(time() * 1000)):
+            self.writer.add("market_data", bar)
 
-    def subscribe_to_group(self, symbols):
-        """Подписка на группу символов"""
+    def check_gaps(self):
+        """Запуск дозаписи символов с пропусками (один REST запрос в фоне)"""
+        if self.backfill_thread is not None and self.backfill_thread.is_alive():
+            return
+        symbols = self.gaps.due()
+        if symbols:
+            self.backfill_thread = threading.Thread(target=self.backfill_gaps, args=(symbols,),
+                                                    name="linear-backfill", daemon=True)
+            self.backfill_thread.start()
+
+    def backfill_gaps(self, symbols):
+        """Снимок тикеров символов с пропусками в ту же таблицу с is_backfill = 1"""
         try:
-            self.ws.ticker_stream(
-                symbol=symbols,
-                callback=self.handle_linear_ticker
-            )
-            print(f"✅ Subscribed to {len(symbols)} linear symbols")
-            sleep(0.3)  # Задержка между подписками
+            event_time, rows = self.backfill.fetch(symbols)
         except Exception as e:
-            print(f"❌ Error subscribing to linear group: {e}")
+            self.alerts.report("BACKFILL", self.source, f"Ticker snapshot failed: {e}", severity='error')
+            return
+
+        receive_time = int(time() * 1000)
+        for symbol, floats, times, texts in rows:
+            # Без ключа conflate: снимок не должен заменять живую строку символа в очереди
+            self.writer.add("bybit_tickers_linear", ((event_time, receive_time) + tuple(times), symbol, texts, floats, (1,)))
+        print(f"🩹 Linear backfill: {len(rows)} of {len(symbols)} symbols with gaps")
+        self.alerts.report("BACKFILL", self.source, f"Backfilled {len(rows)} symbols after stream gaps",
+                           severity='info')
+
+    def start_metrics_server(self):
+        """HTTP endpoint метрик (Prometheus и JSON для /status бота)"""
+        if not self.metrics_port:
+            return
+        try:
+            self.metrics.start_server(self.metrics_port)
+            print(f"📈 Linear metrics: http://127.0.0.1:{self.metrics_port}/metrics")
+        except OSError as e:
+            print(f"⚠️ Metrics endpoint on port {self.metrics_port} not started: {e}")
 
     def start_streaming(self):
         """Запуск стриминга linear тикеров"""
         print("🚀 Starting linear ticker streamer...")
 
-        self.ws = WebSocket(
-            testnet=False,
-            channel_type="linear"
-        )
+        # Поток записи запускаем до подписки, чтобы не терять первые сообщения
+        self.writer.start()
+        self.alerts.start()
+        self.start_metrics_server()
+        if self.recorder is not None:
+            self.recorder.start()
 
-        # Подписка на все пары
+        self.subscribe_started = time()
+        # Подписка на все пары (соединения открываются параллельно)
         self.subscribe_all_linear()
+        self.registry.start(self.on_symbols_changed)
 
         # Бесконечный цикл для поддержания соединения
         try:
+            last_stats = last_rules = time()
             while True:
                 sleep(1)
+                self.report_first_messages()
+                self.check_gaps()
+                self.close_due_candles()
+                if time() - last_rules >= RULES_INTERVAL:
+                    self.check_rules()
+                    last_rules = time()
+                if time() - last_stats >= INGEST_CONFIG['stats_interval']:
+                    self.print_writer_stats()
+                    last_stats = time()
         except KeyboardInterrupt:
             print("⏹️ Stopping linear ticker streamer...")
-            if BOT_AVAILABLE:
+            if BOT_AVAILABLE and self.notify_lifecycle:
                 bot.send_alert("SYSTEM", "Linear ticker streamer stopped")
         except Exception as e:
             print(f"❌ Linear streamer error: {e}")
             if BOT_AVAILABLE:
                 bot.send_alert("ERROR", f"Linear streamer error: {e}")
+        finally:
+            # Сначала сводки алертов (они пишутся в alerts_log), затем накопленные строки
+            self.alerts.stop()
+            self.writer.stop()
+            self.registry.stop()
+            self.planner.exit()
+            if self.recorder is not None:
+                self.recorder.stop()
+            self.metrics.stop_server()
 
 
 def main():
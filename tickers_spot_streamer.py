@@ -1,9 +1,8 @@
 import sys
 import os
-from datetime import datetime
-from time import sleep
-import requests
-from pybit.unified_trading import WebSocket
+import threading
+from datetime import datetime, timezone
+from time import sleep, time
 
 # Добавляем корневую директорию в путь Python
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -12,13 +11,152 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-from utils.clickhouse_client import ClickHouseClient
+from config.alert_config import ALERT_CONFIG
+from config.ingest_config import INGEST_CONFIG
+from utils.alert_aggregator import AlertAggregator
+from utils.clickhouse_client import ClickHouseClient, BatchWriter
+from utils.column_buffer import ColumnBuffer
+from utils.frame_recorder import FrameRecorder
+from utils.gap_tracker import GapTracker, TickerBackfill
+from utils.metrics import MetricsRegistry, instrument_websocket
+from utils.spill_log import SpillLog
+from utils.subscription_planner import SubscriptionPlanner
+from utils.symbol_registry import SymbolRegistry
+from utils.ticker_decoder import install_fast_handler
+from utils.ticker_state import TickerStateTable
+
+
+# Поля Bybit -> колонки bybit_tickers_spot
+SPOT_FLOAT_FIELDS = [
+    ('lastPrice', 'last_price'),
+    ('prevPrice24h', 'prev_price_24h'),
+    ('price24hPcnt', 'price_24h_pcnt'),
+    ('highPrice24h', 'high_price_24h'),
+    ('lowPrice24h', 'low_price_24h'),
+    ('prevPrice1h', 'prev_price_1h'),
+    ('markPrice', 'mark_price'),
+    ('indexPrice', 'index_price'),
+    ('turnover24h', 'turnover_24h'),
+    ('volume24h', 'volume_24h'),
+    ('bid1Price', 'bid1_price'),
+    ('bid1Size', 'bid1_size'),
+    ('ask1Price', 'ask1_price'),
+    ('ask1Size', 'ask1_size'),
+]
+SPOT_TEXT_FIELDS = [('tickDirection', 'tick_direction')]
+
+# Колонки в порядке значений, которые собирает handle_spot_ticker
+# (insert_time имеет DEFAULT now64() и не передается)
+SPOT_TIME_COLUMNS = ['event_time', 'receive_time']
+SPOT_TEXT_COLUMNS = [c for _, c in SPOT_TEXT_FIELDS]
+SPOT_FLOAT_COLUMNS = [c for _, c in SPOT_FLOAT_FIELDS]
 
 
 class SpotTickerStreamer:
-    def __init__(self):
-        self.ch_client = ClickHouseClient()
-        self.ws = None
+    def __init__(self, symbols=None, message_counter=None, shard_id=0, shards=1, ch_client=None):
+        """
+        Args:
+            symbols: Символы для подписки (по умолчанию - все spot пары USDT)
+            message_counter: Общий счетчик сообщений (multiprocessing.Value) для супервизора
+            shard_id: Номер шарда (отдельный журнал недозаписанных пакетов на шард)
+            shards: Количество шардов категории (новые символы добавляются только своего шарда)
+            ch_client: Клиент ClickHouse (по умолчанию - ClickHouseClient(); replay передает заглушку)
+        """
+        self.symbols = symbols
+        # Список символов: кэш на диске и периодическая проверка новых листингов и делистингов
+        self.registry = self.create_symbol_registry(shard_id, shards)
+        if symbols is not None:
+            self.registry.symbols = list(symbols)
+        self.message_counter = message_counter
+        self.ch_client = ch_client if ch_client is not None else ClickHouseClient()
+        # Метрики шарда: скорость сообщений по символам, задержка биржа -> прием, вставки, переподключения
+        self.metrics = MetricsRegistry('bybit_ingest', {'category': 'spot', 'shard': shard_id})
+        self.metrics_port = None
+        if INGEST_CONFIG['metrics_port']:
+            self.metrics_port = (INGEST_CONFIG['metrics_port'] + INGEST_CONFIG['metrics_port_offsets']['spot']
+                                 + shard_id)
+        self.m_messages = self.metrics.counter('messages_total', 'Ticker messages received', ['symbol'])
+        self.m_lag = self.metrics.histogram('lag_seconds', 'Exchange event time to receive time',
+                                            lowest=1e-3, highest=3600)
+        self.m_reconnects = self.metrics.counter('ws_reconnects_total', 'WebSocket reconnects')
+        self.m_first_message = self.metrics.histogram('first_message_seconds',
+                                                      'Time from subscription start to the first ticker',
+                                                      lowest=1e-3, highest=3600)
+        # Обработчик тикеров вызывается из потоков всех WebSocket соединений шарда,
+        # поэтому общие метрики и счетчик супервизора обновляются под блокировкой
+        self.metrics_lock = threading.Lock()
+        # Последнее состояние по символам (доступно другим компонентам для чтения)
+        self.state = TickerStateTable(
+            float_fields=[k for k, _ in SPOT_FLOAT_FIELDS],
+            text_fields=[k for k, _ in SPOT_TEXT_FIELDS]
+        )
+        # Пакетная запись: одна вставка на много сообщений вместо INSERT на каждое
+        self.writer = BatchWriter(
+            self.ch_client,
+            max_rows=INGEST_CONFIG['batch_rows'],
+            max_delay=INGEST_CONFIG['batch_delay'],
+            queue_size=INGEST_CONFIG['queue_size'],
+            overflow_policy=INGEST_CONFIG['overflow_policy'],
+            spill_log=SpillLog(
+                os.path.join(INGEST_CONFIG['spill_dir'], f"spot-{shard_id}"),
+                max_segment_bytes=INGEST_CONFIG['spill_segment_mb'] * 1024 * 1024
+            ),
+            replay_interval=INGEST_CONFIG['spill_replay_interval'],
+            metrics=self.metrics
+        )
+        self.writer.use_columns("bybit_tickers_spot", ColumnBuffer(
+            time_columns=SPOT_TIME_COLUMNS,
+            symbol_column='symbol',
+            text_columns=SPOT_TEXT_COLUMNS,
+            float_columns=SPOT_FLOAT_COLUMNS,
+            flag_columns=['is_backfill'],
+            capacity=self.writer.max_rows
+        ))
+        # Ошибки обработки группируются в сводки вместо вывода на каждое сообщение
+        self.source = f"spot#{shard_id}"
+        # Запись сырых кадров для воспроизведения нагрузки (benchmarks/replay.py)
+        self.recorder = None
+        if INGEST_CONFIG['record_dir']:
+            self.recorder = FrameRecorder(
+                INGEST_CONFIG['record_dir'],
+                prefix=f"spot-{shard_id}",
+                max_bytes=INGEST_CONFIG['record_file_mb'] * 1024 * 1024,
+                max_seconds=INGEST_CONFIG['record_file_seconds'],
+                compression=INGEST_CONFIG['record_compression']
+            )
+            self.metrics.gauge('recorded_frames', 'WebSocket frames written to the recording',
+                               func=lambda: self.recorder.frames)
+            self.metrics.gauge('recorder_dropped_frames', 'Frames dropped on recorder queue overflow',
+                               func=lambda: self.recorder.dropped)
+        self.alerts = AlertAggregator(self.send_alert, **ALERT_CONFIG)
+        self.metrics.gauge('alerts_reported', 'Events reported to the alert aggregator',
+                           func=lambda: self.alerts.reported)
+        # Символы раскладываются по нескольким соединениям, подписка подтверждается ответом сервера
+        self.planner = SubscriptionPlanner(
+            'spot',
+            self.handle_spot_ticker,
+            topics_per_connection=INGEST_CONFIG['ws_topics_per_connection'],
+            on_connection=self.prepare_connection,
+            on_first_message=self.observe_first_message
+        )
+        self.first_message_reported = False
+        # Пропуски по символам (разрывы ts/cs, тишина, переподключения) дозаписываются снимком REST
+        self.gaps = GapTracker(
+            gap_ms=INGEST_CONFIG['gap_threshold_ms'],
+            watchdog_seconds=INGEST_CONFIG['gap_watchdog_seconds'],
+            backfill_interval=INGEST_CONFIG['backfill_interval']
+        )
+        self.backfill = TickerBackfill(
+            'spot',
+            float_fields=SPOT_FLOAT_FIELDS,
+            text_fields=SPOT_TEXT_FIELDS
+        )
+        self.backfill_thread = None
+        for name in ('gaps', 'sequence_resets', 'watchdog_gaps'):
+            self.metrics.gauge(f"stream_{name}", f"Ticker stream {name.replace('_', ' ')}",
+                               func=lambda name=name: getattr(self.gaps, name))
+        self.metrics.gauge('backfill_rows', 'Rows written from REST ticker snapshots',
+                           func=lambda: self.backfill.rows)
 
 
     def safe_float(self, value, default=0.0):
@@ -30,110 +168,231 @@ class SpotTickerStreamer:
         except (ValueError, TypeError):
             return default
 
-    def safe_timestamp(self, ts_value):
-        """Безопасное преобразование timestamp"""
+    def safe_timestamp(self, ts_value, default=None):
+        """Безопасное преобразование timestamp в epoch-ms (по умолчанию - текущее время)"""
         if not ts_value:
-            return datetime.now()
+            return int(time() * 1000) if default is None else default
         try:
-            return datetime.fromtimestamp(int(ts_value) / 1000)
+            return int(ts_value)
         except (ValueError, TypeError):
-            return datetime.now()
+            return int(time() * 1000) if default is None else default
 
     def handle_spot_ticker(self, message):
         """Обработчик spot тикеров"""
+        if self.message_counter is not None:
+            with self.metrics_lock:
+                self.message_counter.value += 1
+
+        data = message.get('data', {})
         try:
-            data = message.get('data', {})
             if not data:
                 return
 
-            # Временные метки
-            event_time = self.safe_timestamp(data.get('ts'))
-            receive_time = datetime.now()
-
-            # Подготовка данных для вставки - теперь 18 значений для 18 колонок (insert_time имеет DEFAULT)
-            record = (
-                event_time,  # event_time
-                receive_time,  # receive_time
-                data.get('symbol', ''),  # symbol
-                data.get('tickDirection', ''),  # tick_direction
-                self.safe_float(data.get('lastPrice')),  # last_price
-                self.safe_float(data.get('prevPrice24h')),  # prev_price_24h
-                self.safe_float(data.get('price24hPcnt')),  # price_24h_pcnt
-                self.safe_float(data.get('highPrice24h')),  # high_price_24h
-                self.safe_float(data.get('lowPrice24h')),  # low_price_24h
-                self.safe_float(data.get('prevPrice1h')),  # prev_price_1h
-                self.safe_float(data.get('markPrice')),  # mark_price
-                self.safe_float(data.get('indexPrice')),  # index_price
-                self.safe_float(data.get('turnover24h')),  # turnover_24h
-                self.safe_float(data.get('volume24h')),  # volume_24h
-                self.safe_float(data.get('bid1Price')),  # bid1_price
-                self.safe_float(data.get('bid1Size')),  # bid1_size
-                self.safe_float(data.get('ask1Price')),  # ask1_price
-                self.safe_float(data.get('ask1Size'))  # ask1_size
-                # insert_time пропускаем - будет DEFAULT now64()
-            )
+            # Время события Bybit передает в корне сообщения
+            event_time = self.safe_timestamp(message.get('ts') or data.get('ts'))
+            receive_time = int(time() * 1000)
+            with self.metrics_lock:
+                self.m_messages.labels(data.get('symbol', '')).inc()
+                # Часы биржи могут опережать локальные: отрицательная задержка считается нулевой
+                self.m_lag.observe(max(0, receive_time - event_time) / 1000)
+            self.gaps.observe(data.get('symbol'), event_time, message.get('cs'))
+
+            row = self.state.apply(data, event_time, snapshot=message.get('type') == 'snapshot')
+            if row is None:
+                return
 
-            # Вставка в ClickHouse
-            self.ch_client.insert_data("bybit_tickers_spot", [record])
+            symbol, _, texts, floats = self.state.record(row)
+            times = (event_time, receive_time)
+
+            # Постановка в очередь на колоночную вставку в ClickHouse
+            # При переполнении очереди строка символа заменяет его же ожидающую строку
+            self.writer.add("bybit_tickers_spot", (times, symbol, texts, floats), key=symbol)
             # print(f"📊 Spot: {data.get('symbol')} - {data.get('lastPrice')}")
 
         except Exception as e:
-            print(f"❌ Error processing spot ticker: {e}")
-            print(f"   Data: {data}")
+            symbol = data.get('symbol') if isinstance(data, dict) else None
+            self.alerts.report(type(e).__name__, self.source, f"{symbol}: {e} (data: {data})",
+                               severity='warning', key=symbol)
+
+    def send_alert(self, alert_type, message, severity):
+        """Вывод сводки алертов"""
+        print(f"❌ [{severity}] {alert_type}: {message}")
+        # История алертов для команды /alerts бота
+        self.writer.add("alerts_log", (datetime.now(timezone.utc), self.source, alert_type, severity, message))
 
-    def get_spot_symbols(self):
+    @staticmethod
+    def create_symbol_registry(shard_id=0, shards=1):
+        return SymbolRegistry(
+            'spot',
+            cache_dir=INGEST_CONFIG['symbols_cache_dir'],
+            cache_ttl=INGEST_CONFIG['symbols_cache_ttl'],
+            refresh_interval=INGEST_CONFIG['symbols_refresh_interval'],
+            shard_id=shard_id,
+            shards=shards
+        )
+
+    @classmethod
+    def get_spot_symbols(cls):
         """Получение списка всех spot пар USDT"""
-        url = "https://api.bybit.com/v5/market/instruments-info"
         try:
-            response = requests.get(url, params={'category': 'spot'})
-            data = response.json().get('result', {}).get('list', [])
-            symbols = [s['symbol'] for s in data
-                       if s.get('quoteCoin') == 'USDT'
-                       and s.get('status') == 'Trading']
+            symbols = cls.create_symbol_registry().load()
             print(f"✅ Found {len(symbols)} spot trading pairs")
             return symbols
         except Exception as e:
             print(f"❌ Error fetching spot symbols: {e}")
             return []
 
+    def on_symbols_changed(self, added, removed):
+        """Подписка на новые и отписка от снятых с торгов символов без переподключения"""
+        if removed:
+            self.planner.unsubscribe(removed)
+            print(f"➖ Unsubscribed from {len(removed)} delisted spot symbols: {removed}")
+        if added:
+            print(f"➕ New spot symbols: {added}")
+            self.subscribe_new_symbols(added)
+        self.symbols = list(self.registry.symbols)
+        self.alerts.report("SYMBOLS", self.source, f"+{len(added)} {added}, -{len(removed)} {removed}",
+                           severity='info')
+
+    def subscribe_new_symbols(self, symbols):
+        failed = self.planner.subscribe(symbols)
+        if failed:
+            print(f"❌ Spot subscription not confirmed: {failed}")
+
     def subscribe_all_spot(self):
-        """Подписка на все spot пары с лимитом 10 символов за раз"""
-        symbols = self.get_spot_symbols()
-        if not symbols:
+        """Подписка на все spot пары"""
+        if self.symbols is None:
+            self.symbols = self.get_spot_symbols()
+            self.registry.symbols = list(self.symbols)
+        if not self.symbols:
             print("❌ No symbols found for subscription")
             return
 
-        args_limit = 10
-        for i in range(0, len(symbols), args_limit):
-            chunk = symbols[i:i + args_limit]
-            try:
-                self.ws.ticker_stream(
-                    symbol=chunk,
-                    callback=self.handle_spot_ticker
-                )
-                print(f"✅ Subscribed to {len(chunk)} spot symbols: {chunk}")
-                sleep(0.5)
-            except Exception as e:
-                print(f"❌ Error subscribing to {chunk}: {e}")
+        report = self.planner.start(self.symbols)
+        connections = report['connections']
+        print(f"✅ Subscribed to {len(self.symbols) - len(report['failed'])} spot symbols "
+              f"over {len(connections)} connections "
+              f"({', '.join(str(c['symbols']) for c in connections)} symbols, "
+              f"slowest connect {max((c['connect_seconds'] for c in connections), default=0):.1f}s)")
+        if report['failed']:
+            print(f"❌ Spot subscription not confirmed: {report['failed']}")
+
+    def prepare_connection(self, ws):
+        """Настройка нового WebSocket соединения до подписки"""
+        # Быстрый JSON и тикеры без copy.deepcopy на каждое сообщение
+        install_fast_handler(ws)
+        instrument_websocket(ws, self.m_reconnects, on_reconnect=self.gaps.on_reconnect,
+                             lock=self.metrics_lock)
+        if self.recorder is not None:
+            self.recorder.attach(ws)
+
+    def observe_first_message(self, symbol, seconds):
+        """Время до первого сообщения символа (из потока его соединения)"""
+        with self.metrics_lock:
+            self.m_first_message.observe(seconds)
+
+    def report_first_messages(self, timeout=60):
+        """Однократный отчет о времени до первого сообщения по символам"""
+        if self.first_message_reported or self.planner.started_at is None:
+            return
+        report = self.planner.report()
+        elapsed = time() - self.subscribe_started
+        if report['waiting'] and elapsed < timeout:
+            return
+
+        self.first_message_reported = True
+        if report['received']:
+            print(f"⏱️ Spot first message: {report['received']} symbols, "
+                  f"p50 {report['first_message_p50']:.2f}s, p95 {report['first_message_p95']:.2f}s, "
+                  f"max {report['first_message_max']:.2f}s")
+        if report['waiting']:
+            print(f"⚠️ Spot no messages after {timeout}s for {len(report['waiting'])} symbols: "
+                  f"{report['waiting'][:20]}")
+
+    def print_writer_stats(self):
+        """Вывод счетчиков очереди и записи"""
+        stats = self.writer.stats()
+        print(f"📦 Spot queue: depth {stats['depth']}/{stats['maxsize']}, "
+              f"high water {stats['high_water']}, dropped {stats['dropped']}, "
+              f"conflated {stats['conflated']}, flushed {stats['flushed_rows']}, failed {stats['failed_rows']}, "
+              f"spilled {stats['spilled_rows']} ({stats['spill_segments']} segments pending)")
+        lag = self.m_lag.quantiles((0.5, 0.99))
+        print(f"📈 Spot lag p50 {lag[0.5] * 1000:.0f}ms, p99 {lag[0.99] * 1000:.0f}ms, "
+              f"reconnects {self.m_reconnects.value}")
+
+    def check_gaps(self):
+        """Запуск дозаписи символов с пропусками (один REST запрос в фоне)"""
+        if self.backfill_thread is not None and self.backfill_thread.is_alive():
+            return
+        symbols = self.gaps.due()
+        if symbols:
+            self.backfill_thread = threading.Thread(target=self.backfill_gaps, args=(symbols,),
+                                                    name="spot-backfill", daemon=True)
+            self.backfill_thread.start()
+
+    def backfill_gaps(self, symbols):
+        """Снимок тикеров символов с пропусками в ту же таблицу с is_backfill = 1"""
+        try:
+            event_time, rows = self.backfill.fetch(symbols)
+        except Exception as e:
+            self.alerts.report("BACKFILL", self.source, f"Ticker snapshot failed: {e}", severity='error')
+            return
+
+        receive_time = int(time() * 1000)
+        for symbol, floats, times, texts in rows:
+            # Без ключа conflate: снимок не должен заменять живую строку символа в очереди
+            self.writer.add("bybit_tickers_spot", ((event_time, receive_time), symbol, texts, floats, (1,)))
+        print(f"🩹 Spot backfill: {len(rows)} of {len(symbols)} symbols with gaps")
+        self.alerts.report("BACKFILL", self.source, f"Backfilled {len(rows)} symbols after stream gaps",
+                           severity='info')
+
+    def start_metrics_server(self):
+        """HTTP endpoint метрик (Prometheus и JSON для /status бота)"""
+        if not self.metrics_port:
+            return
+        try:
+            self.metrics.start_server(self.metrics_port)
+            print(f"📈 Spot metrics: http://127.0.0.1:{self.metrics_port}/metrics")
+        except OSError as e:
+            print(f"⚠️ Metrics endpoint on port {self.metrics_port} not started: {e}")
 
     def start_streaming(self):
         """Запуск стриминга spot тикеров"""
         print("🚀 Starting spot ticker streamer...")
 
-        self.ws = WebSocket(
-            testnet=False,
-            channel_type="spot"
-        )
+        # Поток записи запускаем до подписки, чтобы не терять первые сообщения
+        self.writer.start()
+        self.alerts.start()
+        self.start_metrics_server()
+        if self.recorder is not None:
+            self.recorder.start()
 
+        self.subscribe_started = time()
         self.subscribe_all_spot()
+        self.registry.start(self.on_symbols_changed)
 
         try:
+            last_stats = time()
             while True:
                 sleep(1)
+                self.report_first_messages()
+                self.check_gaps()
+                if time() - last_stats >= INGEST_CONFIG['stats_interval']:
+                    self.print_writer_stats()
+                    last_stats = time()
         except KeyboardInterrupt:
             print("⏹️ Stopping spot ticker streamer...")
         except Exception as e:
             print(f"❌ Spot streamer error: {e}")
+        finally:
+            # Сначала сводки алертов (они пишутся в alerts_log), затем накопленные строки
+            self.alerts.stop()
+            self.writer.stop()
+            self.registry.stop()
+            self.planner.exit()
+            if self.recorder is not None:
+                self.recorder.stop()
+            self.metrics.stop_server()
 
 
 def main():
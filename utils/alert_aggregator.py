@@ -0,0 +1,217 @@
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Уровни важности в порядке возрастания (как в utils/telegram_client.send_alert)
+SEVERITIES = ('info', 'warning', 'error', 'critical')
+
+SEVERITY_ICONS = {
+    "info": "ℹ️",
+    "warning": "⚠️",
+    "error": "❌",
+    "critical": "🚨"
+}
+
+
+class AlertGroup:
+    """События одного типа из одного источника"""
+
+    def __init__(self, alert_type, source, window):
+        self.alert_type = alert_type
+        self.source = source
+        # Счетчики по секундам за последние window секунд
+        self.buckets = deque()
+        self.window = window
+
+        # Еще не отправленные события
+        self.pending = 0
+        self.pending_since = 0.0
+        self.keys = set()
+        self.samples = []
+        self.severity = 'info'
+
+        self.total = 0
+        self.last_sent = 0.0
+        self.last_severity = None
+
+    def add(self, now, severity, key, message, max_samples, max_keys):
+        second = int(now)
+        if self.buckets and self.buckets[-1][0] == second:
+            self.buckets[-1][1] += 1
+        else:
+            self.buckets.append([second, 1])
+
+        if not self.pending:
+            self.pending_since = now
+            self.severity = severity
+        elif SEVERITIES.index(severity) > SEVERITIES.index(self.severity):
+            self.severity = severity
+
+        self.pending += 1
+        self.total += 1
+        if key is not None and len(self.keys) < max_keys:
+            self.keys.add(key)
+        if len(self.samples) < max_samples:
+            self.samples.append(message)
+
+    def rate(self, now):
+        """Количество событий в скользящем окне"""
+        edge = int(now) - self.window
+        while self.buckets and self.buckets[0][0] <= edge:
+            self.buckets.popleft()
+        return sum(count for _, count in self.buckets)
+
+    def reset_pending(self):
+        self.pending = 0
+        self.keys = set()
+        self.samples = []
+
+
+class AlertAggregator:
+    """
+    Группировка и подавление потока однотипных алертов.
+
+    report() только увеличивает счетчики группы (тип + источник) и не
+    ждет отправки. Первое событие группы после затишья отправляется
+    сразу, дальше события копятся и уходят одним сообщением-сводкой не
+    чаще cooldown своего уровня важности:
+
+        3,412 decode errors on 487 symbols in the last 60s, sample: ...
+
+    Уровень сводки повышается, если число событий группы в скользящем
+    окне достигает порога escalation.
+    """
+
+    def __init__(self, send, window=60, cooldowns=None, escalation=None,
+                 max_samples=3, max_keys=10000, flush_interval=1.0):
+        """
+        Args:
+            send: Функция отправки send(alert_type, message, severity)
+            window: Окно подсчета событий (сек)
+            cooldowns: Минимальный интервал между сообщениями группы по уровню {severity: сек}
+            escalation: Пороги повышения уровня {severity: событий в окне}
+            max_samples: Количество примеров сообщений в сводке
+            max_keys: Максимум различных ключей (символов), которые считаются в сводке
+            flush_interval: Период проверки групп (сек)
+        """
+        self.send = send
+        self.window = window
+        self.cooldowns = {'info': 600, 'warning': 300, 'error': 60, 'critical': 10}
+        self.cooldowns.update(cooldowns or {})
+        self.escalation = {'error': 100, 'critical': 1000}
+        self.escalation.update(escalation or {})
+        self.max_samples = max_samples
+        self.max_keys = max_keys
+        self.flush_interval = flush_interval
+
+        self.groups = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.thread = None
+
+        self.reported = 0
+        self.sent = 0
+
+    def report(self, alert_type, source, message, severity='error', key=None):
+        """
+        Учет события (не блокирует)
+
+        Args:
+            alert_type: Тип события (например, имя исключения)
+            source: Источник (например, linear#0)
+            message: Текст события (попадает в примеры сводки)
+            severity: Уровень важности из SEVERITIES
+            key: Объект события для подсчета различных (например, символ)
+        """
+        if severity not in SEVERITIES:
+            severity = 'error'
+        now = time.time()
+        with self._lock:
+            group = self.groups.get((alert_type, source))
+            if group is None:
+                group = self.groups[(alert_type, source)] = AlertGroup(alert_type, source, self.window)
+            group.add(now, severity, key, message, self.max_samples, self.max_keys)
+            self.reported += 1
+
+    def start(self):
+        """Запуск фоновой отправки сводок"""
+        if self.thread and self.thread.is_alive():
+            return
+        self._stop.clear()
+        self.thread = threading.Thread(target=self._run, name="alert-aggregator", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Остановка с отправкой накопленных сводок без учета cooldown"""
+        self._stop.set()
+        if self.thread:
+            self.thread.join(5)
+        self.flush(force=True)
+
+    def flush(self, now=None, force=False):
+        """Отправка сводок групп, для которых прошел cooldown"""
+        now = now or time.time()
+        digests = []
+        with self._lock:
+            for group in self.groups.values():
+                if not group.pending:
+                    continue
+
+                severity = self._severity(group, now)
+                cooldown = self.cooldowns.get(severity, self.window)
+                # Повышение уровня отправляется без ожидания cooldown прежнего уровня
+                escalated = (group.last_severity is not None and
+                             SEVERITIES.index(severity) > SEVERITIES.index(group.last_severity))
+                if not force and not escalated and now - group.last_sent < cooldown:
+                    continue
+
+                digests.append((group.alert_type, self._digest(group, now), severity))
+                group.last_sent = now
+                group.last_severity = severity
+                group.reset_pending()
+
+        for alert_type, text, severity in digests:
+            try:
+                self.send(alert_type, text, severity)
+                self.sent += 1
+            except Exception as e:
+                logger.error(f"❌ Error sending alert digest: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'groups': len(self.groups),
+                'pending': sum(g.pending for g in self.groups.values()),
+                'reported': self.reported,
+                'sent': self.sent,
+            }
+
+    def _severity(self, group, now):
+        """Уровень сводки с учетом частоты событий"""
+        severity = group.severity
+        rate = group.rate(now)
+        for level, threshold in self.escalation.items():
+            if rate >= threshold and SEVERITIES.index(level) > SEVERITIES.index(severity):
+                severity = level
+        return severity
+
+    def _digest(self, group, now):
+        if group.pending == 1:
+            text = f"{group.source}: {group.samples[0]}" if group.samples else f"{group.source}: 1 event"
+        else:
+            seconds = max(1, int(now - group.pending_since))
+            text = f"{group.source}: {group.pending:,} {group.alert_type} events"
+            if group.keys:
+                more = '+' if len(group.keys) >= self.max_keys else ''
+                text += f" on {len(group.keys):,}{more} symbols"
+            text += f" in the last {seconds}s"
+            if group.samples:
+                text += ", sample:\n" + '\n'.join(f"• {s}" for s in group.samples)
+        return text
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
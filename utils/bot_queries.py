@@ -0,0 +1,278 @@
+import asyncio
+import json
+import logging
+import os
+import resource
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import urlopen
+
+from config.ingest_config import INGEST_CONFIG
+from utils.clickhouse_client import ClickHouseClient
+
+logger = logging.getLogger(__name__)
+
+TICKER_TABLES = {
+    'linear': 'bybit_tickers_linear',
+    'spot': 'bybit_tickers_spot',
+}
+
+
+class CacheEntry:
+    """Результат именованного запроса"""
+
+    def __init__(self, func, ttl, uses_clickhouse=True):
+        self.func = func
+        self.ttl = ttl
+        self.uses_clickhouse = uses_clickhouse
+        self.value = None
+        self.error = None
+        self.updated_at = 0.0
+        self.duration = 0.0
+        self.refreshing = None
+
+
+class CachedQueries:
+    """
+    Кэш результатов запросов для команд Telegram бота.
+
+    Запросы clickhouse_driver блокирующие, поэтому выполняются в пуле
+    потоков, а не в event loop бота. Фоновая задача обновляет каждый
+    результат раз в ttl секунд; команды читают готовое значение из кэша,
+    и время ответа не зависит от количества запросов пользователей.
+    Одновременные обновления одного запроса объединяются в одно.
+    """
+
+    def __init__(self, max_workers=4, refresh_interval=1.0):
+        """
+        Args:
+            max_workers: Потоков для запросов
+            refresh_interval: Период проверки устаревших записей (сек)
+        """
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bot-query")
+        self.refresh_interval = refresh_interval
+        self.entries = {}
+        self._ch = None
+        self._ch_lock = threading.Lock()
+        self._task = None
+
+    def register(self, name, func, ttl=60, uses_clickhouse=True):
+        """
+        Регистрация запроса
+
+        Args:
+            name: Имя запроса
+            func: Функция func(ch_client) -> результат (выполняется в пуле потоков)
+            ttl: Время жизни результата (сек)
+            uses_clickhouse: False - func() вызывается без клиента и работает при недоступном ClickHouse
+        """
+        self.entries[name] = CacheEntry(func, ttl, uses_clickhouse)
+
+    async def get(self, name):
+        """
+        Результат запроса из кэша (при первом обращении ждет выполнения)
+
+        Returns:
+            CacheEntry
+        """
+        entry = self.entries[name]
+        if not entry.updated_at:
+            await self.refresh(name)
+        return entry
+
+    async def refresh(self, name):
+        """Обновление результата запроса"""
+        entry = self.entries[name]
+        if entry.refreshing is None:
+            entry.refreshing = asyncio.get_running_loop().run_in_executor(self.executor, self._execute, entry)
+        future = entry.refreshing
+        try:
+            await future
+        finally:
+            if entry.refreshing is future:
+                entry.refreshing = None
+
+    async def run(self):
+        """Фоновое обновление устаревших результатов"""
+        while True:
+            now = time.time()
+            for name, entry in self.entries.items():
+                if entry.refreshing is None and now - entry.updated_at >= entry.ttl:
+                    asyncio.create_task(self.refresh(name))
+            await asyncio.sleep(self.refresh_interval)
+
+    async def start(self, application=None):
+        """Запуск фонового обновления (подходит как post_init для PTB Application)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self, application=None):
+        """Остановка фонового обновления (подходит как post_shutdown)"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _client(self):
+        with self._ch_lock:
+            if self._ch is None:
+                self._ch = ClickHouseClient()
+            return self._ch
+
+    def _execute(self, entry):
+        started = time.monotonic()
+        try:
+            entry.value = entry.func(self._client()) if entry.uses_clickhouse else entry.func()
+            entry.error = None
+        except Exception as e:
+            logger.error(f"❌ Bot query failed: {e}")
+            entry.error = str(e)
+        entry.duration = time.monotonic() - started
+        entry.updated_at = time.time()
+
+
+def query_stats(ch):
+    """Торговая статистика из trades и strategy_metrics"""
+    total_trades, total_symbols = ch.execute("SELECT count(), uniqExact(symbol) FROM trades")[0]
+    day_trades, day_volume, day_symbols = ch.execute(
+        "SELECT count(), sum(price * quantity), uniqExact(symbol) FROM trades "
+        "WHERE timestamp >= now() - INTERVAL 1 DAY"
+    )[0]
+    top_symbols = ch.execute(
+        "SELECT symbol, sum(price * quantity) AS volume FROM trades "
+        "WHERE timestamp >= now() - INTERVAL 1 DAY "
+        "GROUP BY symbol ORDER BY volume DESC LIMIT 3"
+    )
+    # Последние метрики каждой стратегии
+    strategies = ch.execute(
+        "SELECT strategy, argMax(pnl, timestamp), argMax(total_trades, timestamp), "
+        "argMax(winning_trades, timestamp) FROM strategy_metrics GROUP BY strategy ORDER BY strategy"
+    )
+    return {
+        'total_trades': total_trades,
+        'total_symbols': total_symbols,
+        'day_trades': day_trades,
+        'day_volume': day_volume or 0.0,
+        'day_symbols': day_symbols,
+        'top_symbols': top_symbols,
+        'strategies': strategies,
+    }
+
+
+def query_status(ch):
+    """Свежесть данных стриминга и состояние подключения к ClickHouse"""
+    streams = {}
+    for category, table in TICKER_TABLES.items():
+        # Только последние сутки: запрос читает свежие партиции, а не всю историю таблицы
+        rows, last_event, lag, rows_5m, symbols_5m = ch.execute(
+            f"SELECT count(), max(event_time), dateDiff('second', max(event_time), now64(3)), "
+            f"countIf(event_time >= now() - INTERVAL 5 MINUTE), "
+            f"uniqExactIf(symbol, event_time >= now() - INTERVAL 5 MINUTE) FROM {table} "
+            f"WHERE event_time >= now() - INTERVAL 1 DAY"
+        )[0]
+        # Нет строк за сутки - нет данных (max по пустому набору вернул бы 1970-01-01)
+        streams[category] = {
+            'last_event': last_event if rows else None,
+            'lag_seconds': lag if rows else None,
+            'rows_5m': rows_5m,
+            'symbols_5m': symbols_5m,
+        }
+    return {
+        'streams': streams,
+        'server_time': ch.execute("SELECT now()")[0][0],
+        'pool': ch.pool_stats(),
+    }
+
+
+def query_alerts(ch, limit=10):
+    """Последние алерты из alerts_log"""
+    return ch.execute(
+        "SELECT timestamp, source, alert_type, severity, message FROM alerts_log "
+        "ORDER BY timestamp DESC LIMIT %(limit)s",
+        {'limit': limit}
+    )
+
+
+def metrics_endpoints():
+    """Адреса JSON метрик шардов стриминга (см. INGEST_CONFIG['metrics_port'])"""
+    base = INGEST_CONFIG['metrics_port']
+    if not base:
+        return {}
+    offsets = INGEST_CONFIG['metrics_port_offsets']
+    return {
+        f"{category}#{shard}": f"http://127.0.0.1:{base + offsets[category] + shard}/metrics.json"
+        for category in INGEST_CONFIG['categories'] if category in offsets
+        for shard in range(INGEST_CONFIG['shards'])
+    }
+
+
+def query_ingest(timeout=1.0):
+    """
+    Метрики работающих шардов стриминга
+
+    Returns:
+        {шард: сводка} для ответивших шардов
+    """
+    shards = {}
+    for name, url in metrics_endpoints().items():
+        try:
+            with urlopen(url, timeout=timeout) as response:
+                snapshot = json.load(response)
+        except (OSError, ValueError):
+            # Шард не запущен или еще не открыл порт
+            continue
+
+        metrics = snapshot['metrics']
+        messages = metrics.get('bybit_ingest_messages_total', {}).get('values', {})
+        lag = metrics.get('bybit_ingest_lag_seconds', {}).get('values', {}).get('', {})
+        inserts = metrics.get('bybit_ingest_insert_seconds', {}).get('values', {})
+        gauges = {key: metric['values'].get('') for key, metric in metrics.items() if metric['type'] == 'gauge'}
+        reconnects = metrics.get('bybit_ingest_ws_reconnects_total', {}).get('values', {}).get('', {})
+        shards[name] = {
+            'uptime': snapshot['uptime'],
+            'rate': sum(v['rate'] for v in messages.values()),
+            'symbols': len(messages),
+            'lag_p50': lag.get('p50', 0.0),
+            'lag_p99': lag.get('p99', 0.0),
+            'insert_p99': max((v.get('p99', 0.0) for v in inserts.values()), default=0.0),
+            'queue_depth': gauges.get('bybit_ingest_queue_depth'),
+            'dropped': gauges.get('bybit_ingest_queue_dropped_rows'),
+            'reconnects': reconnects.get('value', 0),
+        }
+    return shards
+
+
+def query_balance():
+    """Баланс единого торгового аккаунта Bybit (нужны BYBIT_API_KEY и BYBIT_API_SECRET)"""
+    api_key = os.getenv('BYBIT_API_KEY')
+    api_secret = os.getenv('BYBIT_API_SECRET')
+    if not api_key or not api_secret:
+        return None
+
+    from pybit.unified_trading import HTTP
+
+    session = HTTP(testnet=False, api_key=api_key, api_secret=api_secret)
+    accounts = session.get_wallet_balance(accountType="UNIFIED").get('result', {}).get('list', [])
+    return accounts[0] if accounts else {}
+
+
+def process_stats():
+    """Ресурсы текущего процесса бота"""
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return {
+        'cpu_seconds': usage.ru_utime + usage.ru_stime,
+        # ru_maxrss в Linux - килобайты
+        'max_rss_mb': usage.ru_maxrss / 1024,
+    }
+
+
+def create_bot_queries(max_workers=4):
+    """Кэш с запросами команд /stats, /status, /alerts, /balance"""
+    queries = CachedQueries(max_workers=max_workers)
+    queries.register('stats', query_stats, ttl=60)
+    queries.register('status', query_status, ttl=15)
+    queries.register('alerts', query_alerts, ttl=30)
+    queries.register('balance', query_balance, ttl=60, uses_clickhouse=False)
+    queries.register('ingest', query_ingest, ttl=10, uses_clickhouse=False)
+    return queries
@@ -0,0 +1,209 @@
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+
+# Таймфрейм -> длительность в мс
+TIMEFRAMES = {
+    '1m': 60_000,
+    '5m': 300_000,
+    '15m': 900_000,
+    '1h': 3_600_000,
+    '1d': 86_400_000,
+}
+
+OPEN, HIGH, LOW, CLOSE = range(4)
+
+
+class CandleAggregator:
+    """
+    OHLCV свечи по тикерам для всех символов и таймфреймов.
+
+    Состояние хранится в массивах [символы x таймфреймы]: время начала
+    текущей свечи, OHLC и объем. Цена - lastPrice, объем - прирост
+    volume24h между соседними тикерами (уменьшение скользящего 24h объема
+    считается нулевым приростом, поэтому объем приближенный).
+
+    Закрытая свеча возвращается из update(), когда тикер символа попадает
+    в следующий интервал, или из close_due(), если по символу давно не было
+    тикеров. Первая свеча каждого таймфрейма после запуска неполная и не
+    возвращается.
+
+    Строки закрытых свечей совпадают с колонками market_data:
+    (timestamp, symbol, open, high, low, close, volume, timeframe)
+    """
+
+    def __init__(self, timeframes=tuple(TIMEFRAMES), capacity=1024, grace_ms=2000):
+        """
+        Args:
+            timeframes: Таймфреймы из TIMEFRAMES
+            capacity: Начальное количество символов (растет автоматически)
+            grace_ms: Задержка закрытия свечи в close_due() для опоздавших тикеров (мс)
+        """
+        unknown = [tf for tf in timeframes if tf not in TIMEFRAMES]
+        if unknown:
+            raise ValueError(f"Unknown timeframes: {unknown}")
+
+        self.timeframes = list(timeframes)
+        self.periods = np.array([TIMEFRAMES[tf] for tf in self.timeframes], dtype=np.int64)
+        self.grace_ms = grace_ms
+        self.capacity = capacity
+
+        self.symbols = []
+        self.index = {}
+        # Конец самой короткой текущей свечи символа: до него тикер только обновляет OHLCV
+        self._next_roll = []
+        # [high, low, close, volume] с последней смены свечей символа
+        self._pending = []
+        self._last_volume24h = []
+
+        n = len(self.timeframes)
+        self.start = np.zeros((capacity, n), dtype=np.int64)
+        self.ohlc = np.zeros((capacity, n, 4), dtype=np.float64)
+        self.volume = np.zeros((capacity, n), dtype=np.float64)
+        self.active = np.zeros((capacity, n), dtype=bool)
+        self.partial = np.ones((capacity, n), dtype=bool)
+
+        self._lock = threading.Lock()
+
+    def update(self, symbol, ts, price, volume24h):
+        """
+        Учет тикера
+
+        Args:
+            symbol: Символ
+            ts: Время тикера в epoch-ms
+            price: lastPrice
+            volume24h: volume24h
+
+        Returns:
+            Список закрытых свечей (обычно пустой)
+        """
+        if not price or price != price:
+            return []
+
+        with self._lock:
+            i = self._row_index(symbol)
+
+            previous = self._last_volume24h[i]
+            volume = volume24h - previous if previous is not None and volume24h > previous else 0.0
+            self._last_volume24h[i] = volume24h
+
+            closed = []
+            if ts >= self._next_roll[i]:
+                closed = self._roll(i, ts, price)
+
+            # Между сменами свечей тикер попадает во все текущие свечи символа:
+            # копим high/low/close/объем в скалярах и переносим в массивы при смене
+            pending = self._pending[i]
+            if pending is None:
+                self._pending[i] = [price, price, price, volume]
+            else:
+                if price > pending[0]:
+                    pending[0] = price
+                elif price < pending[1]:
+                    pending[1] = price
+                pending[2] = price
+                pending[3] += volume
+            return closed
+
+    def close_due(self, now_ms):
+        """
+        Закрытие свечей, интервал которых закончился, а тикеров после него не было
+
+        Returns:
+            Список закрытых свечей
+        """
+        with self._lock:
+            n = len(self.symbols)
+            due = self.active[:n] & (self.start[:n] + self.periods + self.grace_ms <= now_ms)
+            if not due.any():
+                return []
+
+            rows, tfs = np.nonzero(due)
+            for i in np.unique(rows).tolist():
+                self._apply_pending(i)
+            closed = self._bars(rows, tfs)
+            self.active[rows, tfs] = False
+            for i in np.unique(rows).tolist():
+                # Следующий тикер символа откроет новые свечи
+                self._next_roll[i] = 0
+            return closed
+
+    def _roll(self, i, ts, price):
+        """Открытие новых свечей символа с закрытием предыдущих"""
+        self._apply_pending(i)
+        buckets = ts - ts % self.periods
+        rolled = np.flatnonzero(~self.active[i] | (buckets != self.start[i]))
+
+        closed_tfs = rolled[self.active[i, rolled]]
+        closed = self._bars(np.full(len(closed_tfs), i), closed_tfs)
+
+        # Свеча неполная, если до нее по символу не было закрытой свечи этого таймфрейма
+        # и она открыта не с начала интервала
+        self.partial[i, rolled] = ~self.active[i, rolled] & self.partial[i, rolled]
+        self.start[i, rolled] = buckets[rolled]
+        self.ohlc[i, rolled] = price
+        self.volume[i, rolled] = 0.0
+        self.active[i, rolled] = True
+
+        self._next_roll[i] = int((self.start[i] + self.periods).min())
+        return closed
+
+    def _apply_pending(self, i):
+        """Перенос накопленных с последней смены значений в свечи символа"""
+        pending = self._pending[i]
+        if pending is None:
+            return
+        high, low, close, volume = pending
+        active = self.active[i]
+        ohlc = self.ohlc[i]
+        ohlc[active, HIGH] = np.maximum(ohlc[active, HIGH], high)
+        ohlc[active, LOW] = np.minimum(ohlc[active, LOW], low)
+        ohlc[active, CLOSE] = close
+        self.volume[i, active] += volume
+        self._pending[i] = None
+
+    def _bars(self, rows, tfs):
+        """Строки market_data для свечей (rows[k], tfs[k]), кроме неполных"""
+        bars = []
+        for i, j in zip(rows.tolist(), tfs.tolist()):
+            if self.partial[i, j]:
+                # Следующая свеча начнется с начала интервала
+                self.partial[i, j] = False
+                continue
+            o, h, l, c = self.ohlc[i, j].tolist()
+            bars.append((
+                datetime.fromtimestamp(int(self.start[i, j]) / 1000, tz=timezone.utc),
+                self.symbols[i], o, h, l, c, float(self.volume[i, j]), self.timeframes[j]
+            ))
+        return bars
+
+    def _row_index(self, symbol):
+        i = self.index.get(symbol)
+        if i is None:
+            i = len(self.symbols)
+            if i >= self.capacity:
+                self._grow()
+            self.symbols.append(symbol)
+            self.index[symbol] = i
+            self._next_roll.append(0)
+            self._pending.append(None)
+            self._last_volume24h.append(None)
+        return i
+
+    def _grow(self):
+        """Удвоение емкости"""
+        new_capacity = self.capacity * 2
+
+        def grow(array, fill):
+            grown = np.full((new_capacity,) + array.shape[1:], fill, dtype=array.dtype)
+            grown[:self.capacity] = array
+            return grown
+
+        self.start = grow(self.start, 0)
+        self.ohlc = grow(self.ohlc, 0.0)
+        self.volume = grow(self.volume, 0.0)
+        self.active = grow(self.active, False)
+        self.partial = grow(self.partial, True)
+        self.capacity = new_capacity
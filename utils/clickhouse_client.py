@@ -1,51 +1,714 @@
 from clickhouse_driver import Client
-from config.clickhouse_config import CLICKHOUSE_CONFIG, CLICKHOUSE_CONFIG_ALT
+from clickhouse_driver import errors as ch_errors
+from config.clickhouse_config import (CLICKHOUSE_CONFIG, CLICKHOUSE_CONFIG_ALT, CLICKHOUSE_INSERT_CONFIG,
+                                      CLICKHOUSE_POOL_CONFIG, CLICKHOUSE_RESULT_CACHE_CONFIG)
+from utils.ingest_queue import IngestQueue
+from utils.result_cache import ResultCache, cache_key, read_tables, written_table
+from utils.schema import TableSchema
+from contextlib import contextmanager
+import hashlib
 import logging
+import queue
+import threading
+import time
+
+import numpy as np
+import pandas as pd
 
 logger = logging.getLogger(__name__)
 
+# Ошибки соединения: после них соединение проверяется перед повторным использованием
+NETWORK_ERRORS = (
+    ch_errors.NetworkError,
+    ch_errors.SocketTimeoutError,
+    ch_errors.UnexpectedPacketFromServerError,
+    EOFError,
+    OSError,
+)
+
+
+# Ошибки сервера, после которых вставку можно повторить: TIMEOUT_EXCEEDED, TOO_MANY_SIMULTANEOUS_QUERIES,
+# SOCKET_TIMEOUT, NETWORK_ERROR, TOO_MANY_PARTS, KEEPER_EXCEPTION
+RETRYABLE_SERVER_CODES = {159, 202, 209, 210, 252, 999}
+
+
+class PoolTimeoutError(Exception):
+    """Не удалось получить соединение из пула за checkout_timeout"""
+
+
+def is_retryable(error):
+    if isinstance(error, (PoolTimeoutError,) + NETWORK_ERRORS):
+        return True
+    return isinstance(error, ch_errors.ServerException) and error.code in RETRYABLE_SERVER_CODES
+
+
+def batch_token(table, column_names, data):
+    """
+    Токен дедупликации пакета - хеш таблицы, колонок и значений
+
+    Одинаков во всех повторах вставки и при досылке пакета из SpillLog,
+    поэтому ClickHouse игнорирует пакет, уже записанный попыткой, ответ
+    на которую не дошел. Пакеты с одинаковым содержимым считаются
+    дубликатами.
+
+    Args:
+        table: Имя таблицы
+        column_names: Имена колонок или None для строк
+        data: Список колонок (ndarray/DatetimeIndex/последовательности) или список кортежей
+    """
+    digest = hashlib.sha1()
+    digest.update(f"{table}|{','.join(column_names or ())}|".encode())
+    if column_names is None:
+        digest.update(repr(data).encode())
+        return digest.hexdigest()
+
+    for column in data:
+        if isinstance(column, pd.DatetimeIndex):
+            digest.update(np.ascontiguousarray(column.asi8))
+        elif isinstance(column, np.ndarray) and column.dtype != object:
+            digest.update(np.ascontiguousarray(column))
+        else:
+            try:
+                text = '\x1f'.join(column)
+            except TypeError:
+                text = '\x1f'.join(map(str, column))
+            digest.update(text.encode())
+        digest.update(b'\x1e')
+    return digest.hexdigest()
+
+
+class ClickHouseConnectionPool:
+    """
+    Потокобезопасный пул соединений clickhouse_driver.Client.
+
+    Один Client нельзя использовать из нескольких потоков одновременно,
+    поэтому каждый поток берет соединение из пула на время запроса.
+    Простаивающие соединения проверяются SELECT 1 перед выдачей, а при
+    недоступности сервера новые подключения выполняются с экспоненциальной
+    задержкой, чтобы не перегружать сервер попытками.
+    """
+
+    def __init__(self, config, size=4, checkout_timeout=10, health_check_interval=30,
+                 min_backoff=0.5, max_backoff=30):
+        """
+        Args:
+            config: Параметры clickhouse_driver.Client
+            size: Максимальное количество соединений
+            checkout_timeout: Максимальное ожидание свободного соединения (сек)
+            health_check_interval: Простой, после которого соединение проверяется (сек)
+            min_backoff: Начальная задержка переподключения (сек)
+            max_backoff: Максимальная задержка переподключения (сек)
+        """
+        self.config = config
+        self.size = size
+        self.checkout_timeout = checkout_timeout
+        self.health_check_interval = health_check_interval
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._backoff = 0.0
+        self._retry_at = 0.0
+        self._last_error = None
+
+        # Счетчики
+        self.created = 0
+        self.in_use = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.reconnects = 0
+        self.health_check_failures = 0
+
+    @contextmanager
+    def connection(self):
+        """Соединение на время блока with"""
+        client = self.checkout()
+        healthy = True
+        try:
+            yield client
+        except NETWORK_ERRORS:
+            healthy = False
+            raise
+        finally:
+            self.checkin(client, healthy)
+
+    def checkout(self):
+        """Получение соединения из пула"""
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            with self._lock:
+                self.timeouts += 1
+            raise PoolTimeoutError(f"No free ClickHouse connection in {self.checkout_timeout}s (pool size {self.size})")
+
+        try:
+            client = self._take_idle() or self._create()
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self.in_use += 1
+            self.checkouts += 1
+            self.wait_seconds += time.monotonic() - started
+        return client
+
+    def checkin(self, client, healthy=True):
+        """Возврат соединения в пул"""
+        if not healthy:
+            # Соединение переподключится само, но перед выдачей его нужно проверить
+            client.disconnect()
+            client._pool_last_used = 0.0
+        else:
+            client._pool_last_used = time.monotonic()
+
+        self._idle.put(client)
+        with self._lock:
+            self.in_use -= 1
+        self._slots.release()
+
+    def _take_idle(self):
+        while True:
+            try:
+                client = self._idle.get_nowait()
+            except queue.Empty:
+                return None
+
+            if time.monotonic() - client._pool_last_used < self.health_check_interval:
+                return client
+
+            if self._ping(client):
+                return client
+
+            with self._lock:
+                self.health_check_failures += 1
+                self.created -= 1
+            client.disconnect()
+
+    def _create(self):
+        now = time.monotonic()
+        with self._lock:
+            if now < self._retry_at:
+                raise ConnectionError(
+                    f"ClickHouse unavailable, next reconnect in {self._retry_at - now:.1f}s: {self._last_error}"
+                )
+
+        client = Client(**self.config)
+        try:
+            client.execute('SELECT 1')
+        except Exception as e:
+            client.disconnect()
+            with self._lock:
+                self._backoff = min(self.max_backoff, max(self.min_backoff, self._backoff * 2))
+                self._retry_at = time.monotonic() + self._backoff
+                self._last_error = e
+            logger.error(f"❌ ClickHouse connection failed, retry in {self._backoff:.1f}s: {e}")
+            raise
+
+        with self._lock:
+            if self._backoff:
+                self.reconnects += 1
+                logger.info("✅ ClickHouse connection restored")
+            self._backoff = 0.0
+            self._retry_at = 0.0
+            self._last_error = None
+            self.created += 1
+
+        client._pool_last_used = time.monotonic()
+        return client
+
+    def _ping(self, client):
+        try:
+            client.execute('SELECT 1')
+            return True
+        except Exception as e:
+            logger.warning(f"⚠️ Idle ClickHouse connection failed health check: {e}")
+            return False
+
+    def stats(self):
+        """Загрузка пула"""
+        with self._lock:
+            return {
+                'size': self.size,
+                'created': self.created,
+                'in_use': self.in_use,
+                'idle': self._idle.qsize(),
+                'utilization': round(self.in_use / self.size, 3) if self.size else 0.0,
+                'checkouts': self.checkouts,
+                'avg_wait_ms': round(self.wait_seconds / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                'timeouts': self.timeouts,
+                'reconnects': self.reconnects,
+                'health_check_failures': self.health_check_failures,
+                'backoff_seconds': self._backoff,
+            }
+
+    def close(self):
+        """Закрытие простаивающих соединений"""
+        while True:
+            try:
+                client = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            client.disconnect()
+            with self._lock:
+                self.created -= 1
+
 
 class ClickHouseClient:
-    def __init__(self, use_alt_config=False):
-        self.client = None
+    def __init__(self, use_alt_config=False, pool_size=None, config=None, result_cache=None, insert_config=None):
+        """
+        Args:
+            use_alt_config: Использовать CLICKHOUSE_CONFIG_ALT (без проверки SSL сертификата)
+            pool_size: Размер пула соединений (по умолчанию из CLICKHOUSE_POOL_CONFIG)
+            config: Параметры clickhouse_driver.Client вместо конфигурации из окружения
+                (бенчмарки с локальным сервером)
+            result_cache: ResultCache для execute(..., cache_ttl=...)
+                (по умолчанию свой, из CLICKHOUSE_RESULT_CACHE_CONFIG)
+            insert_config: Повторы вставок (по умолчанию CLICKHOUSE_INSERT_CONFIG)
+        """
         self.use_alt_config = use_alt_config
+        if config is None:
+            config = CLICKHOUSE_CONFIG_ALT if use_alt_config else CLICKHOUSE_CONFIG
+
+        pool_config = dict(CLICKHOUSE_POOL_CONFIG)
+        if pool_size:
+            pool_config['size'] = pool_size
+        self.pool = ClickHouseConnectionPool(config, **pool_config)
+        self.result_cache = result_cache if result_cache is not None else ResultCache(**CLICKHOUSE_RESULT_CACHE_CONFIG)
+
+        insert_config = {**CLICKHOUSE_INSERT_CONFIG, **(insert_config or {})}
+        self.insert_retries = insert_config['retries']
+        self.insert_min_backoff = insert_config['min_backoff']
+        self.insert_max_backoff = insert_config['max_backoff']
+
+        # Счетчики повторов вставок
+        self._insert_lock = threading.Lock()
+        self.insert_attempts = 0
+        self.retried_inserts = 0
+        self.retry_seconds = 0.0
+        self.failed_inserts = 0
+
         self.connect()
 
     def connect(self):
-        config = CLICKHOUSE_CONFIG_ALT if self.use_alt_config else CLICKHOUSE_CONFIG
-
+        """Проверка подключения"""
         try:
             logger.info(f"Connecting to ClickHouse (alt config: {self.use_alt_config})")
-            self.client = Client(**config)
-
-            # Проверяем подключение
-            self.client.execute('SELECT 1')
+            with self.pool.connection() as client:
+                client.execute('SELECT 1')
             logger.info("✅ Successfully connected to ClickHouse")
 
         except Exception as e:
-            logger.error(f"❌ Primary connection failed: {e}")
+            # Альтернативная конфигурация отключает проверку сертификата,
+            # поэтому включается только явно: ClickHouseClient(use_alt_config=True)
+            logger.error(f"❌ Connection failed (alt config: {self.use_alt_config}): {e}")
+            raise
 
-            # Пробуем альтернативную конфигурацию
-            if not self.use_alt_config:
-                logger.info("🔄 Trying alternative configuration...")
-                self.use_alt_config = True
-                self.connect()
-            else:
-                raise
+    def execute(self, query, params=None, cache_ttl=None, **kwargs):
+        """
+        Args:
+            query: Текст запроса
+            params: Параметры запроса
+            cache_ttl: Время жизни результата в кэше (сек); None - без кэша
+            **kwargs: Аргументы clickhouse_driver.Client.execute
+        """
+        if cache_ttl:
+            return self.result_cache.get(cache_key(query, params, kwargs), cache_ttl,
+                                         lambda: self._execute(query, params, **kwargs), read_tables(query))
 
-    def execute(self, query, params=None):
+        result = self._execute(query, params, **kwargs)
+        if self.result_cache.invalidate_on_write:
+            table = written_table(query)
+            if table:
+                self.result_cache.invalidate(table)
+        return result
+
+    def _execute(self, query, params=None, **kwargs):
         try:
-            return self.client.execute(query, params)
+            with self.pool.connection() as client:
+                return client.execute(query, params, **kwargs)
         except Exception as e:
             logger.error(f"Query failed: {e}")
             raise
 
-    def insert_data(self, table, data):
+    def pool_stats(self):
+        return self.pool.stats()
+
+    def cache_stats(self):
+        return self.result_cache.stats()
+
+    def _written(self, table):
+        if self.result_cache.invalidate_on_write:
+            self.result_cache.invalidate(table.split('.')[-1])
+
+    def insert_stats(self):
+        with self._insert_lock:
+            return {
+                'insert_attempts': self.insert_attempts,
+                'retried_inserts': self.retried_inserts,
+                'retry_seconds': self.retry_seconds,
+                'failed_inserts': self.failed_inserts,
+            }
+
+    def insert_data(self, table, data, dedup_token=None):
+        """
+        Вставка строк
+
+        Args:
+            table: Имя таблицы
+            data: Список кортежей в порядке колонок таблицы
+            dedup_token: insert_deduplication_token (по умолчанию batch_token содержимого)
+        """
         if not data:
             return
-        self.client.execute(f"INSERT INTO {table} VALUES", data)
+        token = dedup_token or batch_token(table, None, data)
+        self._insert(table, f"INSERT INTO {table} VALUES", data, {'insert_deduplication_token': token})
         logger.info(f"Inserted {len(data)} rows into {table}")
 
-    def create_table(self, table_name, schema):
-        self.client.execute(f"CREATE TABLE IF NOT EXISTS {table_name} ({schema}) ENGINE = MergeTree() ORDER BY tuple()")
-        logger.info(f"Table {table_name} created or already exists")
\ No newline at end of file
+    def insert_columns(self, table, column_names, columns, dedup_token=None):
+        """
+        Колоночная вставка NumPy массивов
+
+        Args:
+            table: Имя таблицы
+            column_names: Имена колонок в порядке массивов
+            columns: Список массивов одинаковой длины (ndarray/DatetimeIndex)
+            dedup_token: insert_deduplication_token (по умолчанию batch_token содержимого)
+        """
+        if not columns or not len(columns[0]):
+            return
+        query = f"INSERT INTO {table} ({', '.join(column_names)}) VALUES"
+        # use_numpy включаем только для этого запроса: SELECT по-прежнему возвращают кортежи
+        settings = {
+            'use_numpy': True,
+            'insert_deduplication_token': dedup_token or batch_token(table, column_names, columns),
+        }
+        self._insert(table, query, columns, settings, columnar=True)
+        logger.info(f"Inserted {len(columns[0])} rows into {table} (columnar)")
+
+    def _insert(self, table, query, data, settings, columnar=False):
+        """
+        Вставка с повторами при сетевых ошибках и перегрузке сервера
+
+        Все попытки отправляют один и тот же insert_deduplication_token, поэтому
+        попытка, записавшая данные без ответа клиенту, не приводит к дублям.
+        """
+        attempt = 0
+        backoff = self.insert_min_backoff
+        while True:
+            attempt += 1
+            with self._insert_lock:
+                self.insert_attempts += 1
+            try:
+                with self.pool.connection() as client:
+                    client.execute(query, data, settings=settings, columnar=columnar)
+                break
+            except Exception as e:
+                if attempt > self.insert_retries or not is_retryable(e):
+                    with self._insert_lock:
+                        self.failed_inserts += 1
+                    raise
+                with self._insert_lock:
+                    self.retried_inserts += 1
+                    self.retry_seconds += backoff
+                logger.warning(f"⚠️ Insert into {table} failed (attempt {attempt}/{self.insert_retries + 1}), "
+                               f"retry in {backoff:.1f}s: {e}")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, self.insert_max_backoff)
+        self._written(table)
+
+    def create_table(self, table_name, schema, order_by='tuple()', partition_by=None, settings=None):
+        """
+        Создание таблицы MergeTree
+
+        Args:
+            table_name: Имя таблицы
+            schema: Колонки - строка DDL или utils.schema.TableSchema (остальные аргументы берутся из нее)
+            order_by: Ключ сортировки
+            partition_by: Выражение партиционирования
+            settings: SETTINGS таблицы
+        """
+        if isinstance(schema, TableSchema):
+            query = schema.ddl(table_name)
+        else:
+            query = f"CREATE TABLE IF NOT EXISTS {table_name} ({schema}) ENGINE = MergeTree()"
+            if partition_by:
+                query += f" PARTITION BY {partition_by}"
+            query += f" ORDER BY {order_by}"
+            if settings:
+                query += " SETTINGS " + ', '.join(f"{k} = {v}" for k, v in settings.items())
+
+        with self.pool.connection() as client:
+            client.execute(query)
+        logger.info(f"Table {table_name} created or already exists")
+
+
+class BatchWriter:
+    """
+    Буферизованная запись в ClickHouse.
+
+    Строки копятся по таблицам и сбрасываются одним INSERT, когда буфер
+    таблицы достигает max_rows строк или самая старая строка в нём ждёт
+    дольше max_delay секунд. Вставки выполняются в отдельном потоке,
+    поэтому add() не блокирует поток обработки WebSocket сообщений.
+
+    Для таблиц, зарегистрированных через use_columns(), строки копятся в
+    ColumnBuffer и отправляются колоночной вставкой.
+
+    Между add() и потоком записи стоит ограниченная IngestQueue: при
+    медленном ClickHouse очередь не растет бесконечно, а действует
+    выбранная политика переполнения (block, drop_oldest, conflate).
+    """
+
+    def __init__(self, ch_client, max_rows=10000, max_delay=0.5,
+                 queue_size=100000, overflow_policy='block', put_timeout=None,
+                 spill_log=None, replay_interval=10, metrics=None):
+        """
+        Args:
+            ch_client: ClickHouseClient
+            max_rows: Размер пакета вставки
+            max_delay: Максимальное время ожидания строки в буфере (сек)
+            queue_size: Емкость очереди перед потоком записи
+            overflow_policy: Политика переполнения очереди (block, drop_oldest, conflate)
+            put_timeout: Максимальное ожидание add() в политике block (сек)
+            spill_log: SpillLog для пакетов, которые не удалось записать
+            replay_interval: Пауза между попытками досылки журнала (сек)
+            metrics: MetricsRegistry для задержки вставок, размеров пакетов и глубины очереди
+        """
+        self.ch_client = ch_client
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+
+        self._queue = IngestQueue(queue_size, overflow_policy, put_timeout)
+        self._buffers = {}
+        self._column_buffers = {}
+        self._first_row_time = {}
+        self._thread = None
+        self._stopping = threading.Event()
+
+        self.spill_log = spill_log
+        self.replay_interval = replay_interval
+        self._next_replay = 0.0
+
+        # Счетчики для мониторинга
+        self.flushed_rows = 0
+        self.failed_rows = 0
+        self.spilled_rows = 0
+
+        self._insert_seconds = None
+        self._flush_rows = None
+        if metrics is not None:
+            self._register_metrics(metrics)
+
+    def _register_metrics(self, metrics):
+        # Пишет только поток записи, поэтому счетчики гистограмм без блокировок
+        self._insert_seconds = metrics.histogram('insert_seconds', 'ClickHouse insert latency', ['table'],
+                                                 lowest=1e-4, highest=600)
+        self._flush_rows = metrics.histogram('flush_rows', 'Rows per ClickHouse insert', ['table'],
+                                             lowest=1, highest=10 ** 7, sub_buckets=8)
+        metrics.gauge('queue_depth', 'Rows waiting in the writer queue', func=lambda: len(self._queue))
+        metrics.gauge('queue_dropped_rows', 'Rows dropped on queue overflow', func=lambda: self._queue.dropped)
+        metrics.gauge('queue_conflated_rows', 'Rows replaced by a newer row of the same symbol',
+                      func=lambda: self._queue.conflated)
+        metrics.gauge('flushed_rows', 'Rows inserted into ClickHouse', func=lambda: self.flushed_rows)
+        metrics.gauge('failed_rows', 'Rows lost after failed inserts', func=lambda: self.failed_rows)
+        metrics.gauge('spilled_rows', 'Rows written to the spill log', func=lambda: self.spilled_rows)
+        pool = self.ch_client.pool
+        metrics.gauge('pool_in_use', 'ClickHouse connections in use', func=lambda: pool.in_use)
+        metrics.gauge('pool_reconnects', 'ClickHouse reconnects', func=lambda: pool.reconnects)
+        ch = self.ch_client
+        metrics.gauge('insert_attempts', 'ClickHouse insert attempts, including retries',
+                      func=lambda: ch.insert_attempts)
+        metrics.gauge('insert_retries', 'ClickHouse insert attempts repeated after an error',
+                      func=lambda: ch.retried_inserts)
+        metrics.gauge('insert_retry_seconds', 'Time spent waiting before insert retries',
+                      func=lambda: ch.retry_seconds)
+        metrics.gauge('insert_failures', 'ClickHouse inserts failed after all retries',
+                      func=lambda: ch.failed_inserts)
+
+    def _observe_insert(self, table, rows, started):
+        if self._insert_seconds is not None:
+            self._insert_seconds.labels(table).observe(time.perf_counter() - started)
+            self._flush_rows.labels(table).observe(rows)
+
+    def start(self):
+        """Запуск потока записи"""
+        if self._thread and self._thread.is_alive():
+            return
+
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="clickhouse-writer", daemon=True)
+        self._thread.start()
+        logger.info(f"BatchWriter started (max_rows={self.max_rows}, max_delay={self.max_delay}s)")
+
+    def use_columns(self, table, column_buffer):
+        """
+        Колоночный режим для таблицы
+
+        После регистрации add() для этой таблицы принимает кортеж
+        (times, symbol, texts, floats) в формате ColumnBuffer.append().
+        """
+        column_buffer.capacity = min(column_buffer.capacity, self.max_rows)
+        self._column_buffers[table] = column_buffer
+
+    def add(self, table, row, key=None):
+        """
+        Добавление строки в очередь на запись (потокобезопасно)
+
+        Args:
+            table: Имя таблицы
+            row: Строка (кортеж или формат ColumnBuffer.append())
+            key: Ключ для политики conflate, обычно символ
+
+        Returns:
+            bool: False, если строка отброшена из-за переполнения
+        """
+        return self._queue.put((table, row), key=(table, key) if key is not None else None)
+
+    def stats(self):
+        """Счетчики очереди и записи"""
+        stats = self._queue.stats()
+        stats.update({
+            'flushed_rows': self.flushed_rows,
+            'failed_rows': self.failed_rows,
+            'spilled_rows': self.spilled_rows,
+            'spill_segments': self.spill_log.pending_segments() if self.spill_log else 0,
+        })
+        return stats
+
+    def stop(self, timeout=30):
+        """Остановка потока записи со сбросом всех накопленных строк"""
+        if not self._thread:
+            return
+
+        self._stopping.set()
+        self._queue.wake()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.error("❌ BatchWriter did not stop in time, some rows may be lost")
+        self._thread = None
+        logger.info(f"BatchWriter stopped (flushed: {self.flushed_rows}, failed: {self.failed_rows})")
+
+    def _run(self):
+        while True:
+            items = self._queue.get_batch(self.max_rows, timeout=self._time_to_next_flush())
+            for table, row in items:
+                self._append(table, row)
+
+            self._flush_due()
+            self._replay_spill()
+
+            # Перед выходом дочитываем очередь до конца
+            if self._stopping.is_set() and not len(self._queue):
+                break
+
+        self._flush_all()
+
+    def _append(self, table, row):
+        if table not in self._first_row_time:
+            self._first_row_time[table] = time.monotonic()
+
+        column_buffer = self._column_buffers.get(table)
+        if column_buffer is not None:
+            column_buffer.append(*row)
+            if column_buffer.is_full():
+                self._flush(table)
+            return
+
+        buffer = self._buffers.get(table)
+        if buffer is None:
+            buffer = self._buffers[table] = []
+
+        buffer.append(row)
+        if len(buffer) >= self.max_rows:
+            self._flush(table)
+
+    def _time_to_next_flush(self):
+        if not self._first_row_time:
+            return self.max_delay
+
+        oldest = min(self._first_row_time.values())
+        return max(0.0, oldest + self.max_delay - time.monotonic())
+
+    def _flush_due(self):
+        now = time.monotonic()
+        for table, first_row_time in list(self._first_row_time.items()):
+            if now - first_row_time >= self.max_delay:
+                self._flush(table)
+
+    def _flush_all(self):
+        for table in list(self._first_row_time):
+            self._flush(table)
+
+    def _flush(self, table):
+        self._first_row_time.pop(table, None)
+
+        column_buffer = self._column_buffers.get(table)
+        if column_buffer is not None:
+            self._flush_columns(table, column_buffer)
+            return
+
+        rows = self._buffers.pop(table, None)
+        if not rows:
+            return
+
+        # Токен вычисляется один раз: с ним же пакет уходит в журнал и досылается
+        token = batch_token(table, None, rows)
+        try:
+            started = time.perf_counter()
+            self.ch_client.insert_data(table, rows, dedup_token=token)
+            self._observe_insert(table, len(rows), started)
+            self.flushed_rows += len(rows)
+        except Exception as e:
+            logger.error(f"❌ Failed to flush {len(rows)} rows into {table}: {e}")
+            self._spill(table, None, rows, len(rows), token)
+
+    def _flush_columns(self, table, column_buffer):
+        count = len(column_buffer)
+        if not count:
+            return
+
+        columns = column_buffer.columns()
+        token = batch_token(table, column_buffer.column_names, columns)
+        try:
+            started = time.perf_counter()
+            self.ch_client.insert_columns(table, column_buffer.column_names, columns, dedup_token=token)
+            self._observe_insert(table, count, started)
+            self.flushed_rows += count
+        except Exception as e:
+            logger.error(f"❌ Failed to flush {count} rows into {table}: {e}")
+            self._spill(table, column_buffer.column_names, columns, count, token)
+        finally:
+            column_buffer.clear()
+
+    def _spill(self, table, column_names, data, count, token=None):
+        """Сохранение неудавшегося пакета в журнал"""
+        if self.spill_log is None:
+            self.failed_rows += count
+            return
+
+        try:
+            self.spill_log.append(table, column_names, data, token=token)
+            self.spilled_rows += count
+        except Exception as e:
+            self.failed_rows += count
+            logger.error(f"❌ Failed to spill {count} rows for {table}: {e}")
+            return
+
+        # Досылаем не раньше, чем через replay_interval
+        self._next_replay = time.monotonic() + self.replay_interval
+
+    def _replay_spill(self):
+        """Досылка журнала, когда ClickHouse снова доступен"""
+        if self.spill_log is None or time.monotonic() < self._next_replay:
+            return
+
+        if not self.spill_log.has_pending():
+            self._next_replay = time.monotonic() + self.replay_interval
+            return
+
+        # Ограничиваем объем за итерацию, чтобы очередь не переполнялась во время досылки
+        if not self.spill_log.replay(self.ch_client, max_rows=self.max_rows * 10):
+            self._next_replay = time.monotonic() + self.replay_interval
@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+
+
+class ColumnBuffer:
+    """
+    Предвыделенные колоночные массивы для пакетной вставки в ClickHouse.
+
+    Вместо кортежа Python объектов на каждую строку значения пишутся прямо
+    в NumPy массивы: float64 колонки, временные метки в epoch-ms (int64),
+    символы как int32 коды в словаре, флаги (UInt8) как uint8. Массивы
+    выделяются один раз и переиспользуются после каждого сброса.
+    """
+
+    def __init__(self,
+                 time_columns,
+                 symbol_column,
+                 text_columns,
+                 float_columns,
+                 nullable_time_columns=(),
+                 flag_columns=(),
+                 capacity=10000):
+        """
+        Args:
+            time_columns: Колонки времени (значения передаются в epoch-ms)
+            symbol_column: Колонка символа (кодируется словарем)
+            text_columns: Прочие строковые колонки
+            float_columns: Колонки Float64
+            nullable_time_columns: Колонки времени, где 0 означает NULL
+            flag_columns: Колонки UInt8 (по умолчанию 0)
+            capacity: Максимальное количество строк в буфере
+        """
+        self.time_columns = list(time_columns)
+        self.symbol_column = symbol_column
+        self.text_columns = list(text_columns)
+        self.float_columns = list(float_columns)
+        self.nullable_time_columns = set(nullable_time_columns)
+        self.flag_columns = list(flag_columns)
+        self.capacity = capacity
+
+        # Fortran-порядок: каждая колонка лежит в памяти непрерывно,
+        # поэтому срез [:size, j] отправляется без копирования
+        self._times = np.zeros((capacity, len(self.time_columns)), dtype=np.int64, order='F')
+        self._symbol_codes = np.zeros(capacity, dtype=np.int32)
+        self._texts = np.empty((capacity, len(self.text_columns)), dtype=object, order='F')
+        self._floats = np.zeros((capacity, len(self.float_columns)), dtype=np.float64, order='F')
+        self._flags = np.zeros((capacity, len(self.flag_columns)), dtype=np.uint8, order='F')
+
+        self._symbols = []
+        self._symbol_index = {}
+        self.size = 0
+
+    @property
+    def column_names(self):
+        """Имена колонок в порядке, в котором их возвращает columns()"""
+        return self.time_columns + [self.symbol_column] + self.text_columns + self.float_columns + self.flag_columns
+
+    def __len__(self):
+        return self.size
+
+    def is_full(self):
+        return self.size >= self.capacity
+
+    def symbol_code(self, symbol):
+        """Код символа в словаре буфера"""
+        code = self._symbol_index.get(symbol)
+        if code is None:
+            code = self._symbol_index[symbol] = len(self._symbols)
+            self._symbols.append(symbol)
+        return code
+
+    def append(self, times, symbol, texts, floats, flags=None):
+        """
+        Добавление строки
+
+        Args:
+            times: Временные метки в epoch-ms в порядке time_columns
+            symbol: Символ
+            texts: Значения строковых колонок в порядке text_columns
+            floats: Значения float колонок в порядке float_columns
+            flags: Значения flag колонок в порядке flag_columns (None - нули)
+        """
+        n = self.size
+        self._times[n] = times
+        self._symbol_codes[n] = self.symbol_code(symbol)
+        self._texts[n] = texts
+        self._floats[n] = floats
+        if self.flag_columns:
+            self._flags[n] = flags if flags is not None else 0
+        self.size = n + 1
+
+    def columns(self):
+        """Колонки для вставки с columnar=True и use_numpy=True"""
+        n = self.size
+        columns = []
+
+        for j, name in enumerate(self.time_columns):
+            ms = self._times[:n, j]
+            if name in self.nullable_time_columns:
+                ms = np.where(ms > 0, ms, np.nan)
+            # Время с явной зоной UTC корректно пишется и в DateTime, и в DateTime64
+            columns.append(pd.to_datetime(ms, unit='ms', utc=True))
+
+        symbols = np.array(self._symbols, dtype=object)
+        columns.append(symbols[self._symbol_codes[:n]])
+
+        for j in range(len(self.text_columns)):
+            columns.append(self._texts[:n, j])
+
+        for j in range(len(self.float_columns)):
+            columns.append(self._floats[:n, j])
+
+        for j in range(len(self.flag_columns)):
+            columns.append(self._flags[:n, j])
+
+        return columns
+
+    def clear(self):
+        """Сброс буфера без освобождения памяти"""
+        self.size = 0
@@ -0,0 +1,217 @@
+"""
+Запись сырых WebSocket кадров для воспроизведения нагрузки.
+
+Каждый кадр пишется строкой NDJSON вместе со временем приема:
+
+    {"t":1700000000123456,"f":{"topic":"tickers.BTCUSDT",...}}
+
+t - время приема в микросекундах epoch, f - кадр без изменений (текст
+кадра вставляется как есть, без повторной сериализации). Файлы сжимаются
+zstd (пакет zstandard; gzip - только явно, compression='gzip') и
+ротируются по объему и времени. Пока файл пишется, у него суффикс .part - читатели видят только
+закрытые файлы.
+
+Поток WebSocket только кладет кадр в очередь, сжатие и запись выполняются
+отдельным потоком. При переполнении очереди кадры отбрасываются (счетчик
+dropped), обработка тикеров не замедляется.
+"""
+import gzip
+import io
+import logging
+import os
+import queue
+import threading
+import time
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+SUFFIXES = {'zstd': '.ndjson.zst', 'gzip': '.ndjson.gz'}
+
+
+class FrameRecorder:
+    """Запись кадров в ротируемые сжатые NDJSON файлы"""
+
+    def __init__(self, directory, prefix='frames', max_bytes=256 * 1024 * 1024, max_seconds=3600,
+                 queue_size=100000, level=3, compression='zstd'):
+        """
+        Args:
+            directory: Каталог записей
+            prefix: Префикс имен файлов (категория и шард)
+            max_bytes: Объем несжатых кадров в одном файле
+            max_seconds: Максимальная длительность одного файла (сек)
+            queue_size: Кадров в очереди записи
+            level: Уровень сжатия
+            compression: 'zstd' или 'gzip'
+        """
+        self.directory = directory
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.level = level
+        if compression not in SUFFIXES:
+            raise ValueError(f"Unknown recording compression {compression}, expected one of {', '.join(SUFFIXES)}")
+        if compression == 'zstd' and zstandard is None:
+            raise RuntimeError("Frame recording requires zstandard (pip install zstandard) "
+                               "or compression='gzip'")
+        self.compression = compression
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._file = None
+        self._raw = None
+        self._path = None
+        self._opened_at = 0.0
+        self._bytes = 0
+        self._sequence = 0
+
+        self.frames = 0
+        self.dropped = 0
+        self.files = []
+
+    def attach(self, ws):
+        """
+        Запись всех кадров соединения pybit
+
+        Вызывается после install_fast_handler: оборачивает уже подмененный
+        _on_message, поэтому время приема берется до разбора JSON.
+        """
+        on_message = ws._on_message
+        put = self._queue.put_nowait
+        time_ns = time.time_ns
+
+        def _on_message(raw):
+            try:
+                put((time_ns() // 1000, raw))
+            except queue.Full:
+                self.dropped += 1
+            on_message(raw)
+
+        ws._on_message = _on_message
+        return ws
+
+    def record(self, raw, received_us=None):
+        """Запись одного кадра (для кадров не из pybit)"""
+        try:
+            self._queue.put_nowait((received_us or time.time_ns() // 1000, raw))
+        except queue.Full:
+            self.dropped += 1
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name=f"recorder-{self.prefix}", daemon=True)
+        self._thread.start()
+        logger.info(f"🎙️ Recording WebSocket frames to {self.directory} ({self.compression})")
+
+    def stop(self, timeout=30):
+        """Запись оставшихся кадров и закрытие файла"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def stats(self):
+        return {
+            'frames': self.frames,
+            'dropped': self.dropped,
+            'pending': self._queue.qsize(),
+            'files': len(self.files),
+            'current': self._path,
+        }
+
+    def _run(self):
+        get = self._queue.get
+        while True:
+            try:
+                item = get(timeout=1.0)
+            except queue.Empty:
+                if self._file is not None and time.monotonic() - self._opened_at >= self.max_seconds:
+                    self._close()
+                continue
+            if item is None:
+                break
+            try:
+                self._write(*item)
+            except Exception as e:
+                logger.error(f"❌ Frame recorder write failed: {e}")
+                self._close()
+        self._close()
+
+    def _write(self, received_us, raw):
+        if self._file is None:
+            self._open()
+        if isinstance(raw, str):
+            raw = raw.encode()
+        line = b'{"t":%d,"f":%s}\n' % (received_us, raw)
+        self._file.write(line)
+        self.frames += 1
+        self._bytes += len(line)
+        if self._bytes >= self.max_bytes or time.monotonic() - self._opened_at >= self.max_seconds:
+            self._close()
+
+    def _open(self):
+        self._sequence += 1
+        name = f"{self.prefix}-{time.strftime('%Y%m%d-%H%M%S')}-{self._sequence:04d}{SUFFIXES[self.compression]}"
+        self._path = os.path.join(self.directory, name)
+        self._raw = open(f"{self._path}.part", 'wb')
+        if self.compression == 'zstd':
+            self._file = zstandard.ZstdCompressor(level=self.level).stream_writer(self._raw)
+        else:
+            self._file = gzip.GzipFile(fileobj=self._raw, mode='wb', compresslevel=self.level)
+        self._opened_at = time.monotonic()
+        self._bytes = 0
+
+    def _close(self):
+        if self._file is None:
+            return
+        try:
+            self._file.close()
+        finally:
+            if not self._raw.closed:
+                self._raw.close()
+            os.replace(f"{self._path}.part", self._path)
+            self.files.append(self._path)
+            logger.info(f"🎙️ Recording closed: {self._path}")
+            self._file = self._raw = self._path = None
+
+
+def open_recording(path):
+    """Бинарный поток строк файла записи (.zst, .gz или несжатый)"""
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError(f"{path}: reading zstd recordings requires the zstandard package")
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(path, 'rb')))
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def read_frames(paths):
+    """
+    Кадры из файлов записи по порядку
+
+    Yields:
+        (received_us, raw): время приема (мкс epoch) и текст кадра (bytes)
+    """
+    if isinstance(paths, str):
+        paths = [paths]
+    for path in paths:
+        with open_recording(path) as f:
+            for line in f:
+                # Строка: {"t":<мкс>,"f":<кадр>}\n - кадр вырезается без разбора JSON
+                comma = line.index(b',"f":')
+                yield int(line[5:comma]), line[comma + 5:line.rindex(b'}')]
+
+
+def recording_files(directory, prefix=''):
+    """Закрытые файлы записи каталога в порядке создания"""
+    names = sorted(n for n in os.listdir(directory)
+                   if n.startswith(prefix) and n.endswith(tuple(SUFFIXES.values())))
+    return [os.path.join(directory, n) for n in names]
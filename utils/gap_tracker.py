@@ -0,0 +1,178 @@
+import logging
+import threading
+import time
+
+import requests
+
+from utils.ticker_decoder import TickerDecoder, field_specs
+
+logger = logging.getLogger(__name__)
+
+TICKERS_URL = "https://api.bybit.com/v5/market/tickers"
+
+
+class GapTracker:
+    """
+    Поиск пропусков в потоке тикеров по символам.
+
+    Пропуском считается:
+      - разрыв ts между соседними сообщениями символа больше gap_ms;
+      - уменьшение cs (cross sequence) - сообщения пришли не по порядку
+        или биржа перезапустила последовательность;
+      - отсутствие сообщений символа дольше watchdog_seconds;
+      - переподключение WebSocket (все символы соединения).
+
+    observe() вызывается на каждое сообщение из потоков всех WebSocket
+    соединений шарда, due() - из основного цикла: он возвращает символы
+    с пропусками не чаще backfill_interval секунд, чтобы их дозаписать
+    одним REST запросом. Счетчики и множество символов с пропусками
+    меняются под блокировкой.
+    """
+
+    def __init__(self, gap_ms=30000, watchdog_seconds=120, backfill_interval=30):
+        """
+        Args:
+            gap_ms: Разрыв ts между сообщениями символа, считающийся пропуском (мс)
+            watchdog_seconds: Тишина символа, считающаяся пропуском (сек)
+            backfill_interval: Минимальный интервал между дозаписями (сек)
+        """
+        self.gap_ms = gap_ms
+        self.watchdog_seconds = watchdog_seconds
+        self.backfill_interval = backfill_interval
+
+        # символ -> [ts, cs, время приема (monotonic)]
+        self._last = {}
+        self._silent = set()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._last_backfill = 0.0
+
+        self.gaps = 0
+        self.sequence_resets = 0
+        self.watchdog_gaps = 0
+        self.reconnects = 0
+
+    def observe(self, symbol, ts, cs=None):
+        """Учет сообщения символа (потоки WebSocket)"""
+        now = time.monotonic()
+        last = self._last.get(symbol)
+        if last is None:
+            self._last[symbol] = [ts, cs or 0, now]
+            return
+
+        # Символ живет на одном соединении, поэтому last пишет один поток;
+        # общие счетчики и _pending (его подменяет due()) - только под блокировкой
+        gap = ts - last[0] > self.gap_ms
+        reset = bool(cs) and cs < last[1]
+        if gap or reset:
+            with self._lock:
+                self.gaps += gap
+                self.sequence_resets += reset
+                self._pending.add(symbol)
+        if cs:
+            last[1] = cs
+        if ts > last[0]:
+            last[0] = ts
+        last[2] = now
+
+        if self._silent and symbol in self._silent:
+            self._silent.discard(symbol)
+
+    def on_reconnect(self):
+        """Переподключение: пропуск возможен по всем символам"""
+        with self._lock:
+            self.reconnects += 1
+            self._pending.update(self._last)
+
+    def check(self):
+        """Символы, молчащие дольше watchdog_seconds (каждый отмечается один раз за период тишины)"""
+        edge = time.monotonic() - self.watchdog_seconds
+        silent = [symbol for symbol, last in list(self._last.items())
+                  if last[2] < edge and symbol not in self._silent]
+        if silent:
+            self._silent.update(silent)
+            with self._lock:
+                self.watchdog_gaps += len(silent)
+                self._pending.update(silent)
+        return silent
+
+    def due(self):
+        """
+        Символы для дозаписи, если прошел backfill_interval
+
+        Returns:
+            set: Символы с пропусками (пустой, если дозапись пока не нужна)
+        """
+        self.check()
+        now = time.monotonic()
+        if not self._pending or now - self._last_backfill < self.backfill_interval:
+            return set()
+        with self._lock:
+            pending, self._pending = self._pending, set()
+        self._last_backfill = now
+        return pending
+
+    def stats(self):
+        return {
+            'symbols': len(self._last),
+            'gaps': self.gaps,
+            'sequence_resets': self.sequence_resets,
+            'watchdog_gaps': self.watchdog_gaps,
+            'reconnects': self.reconnects,
+            'pending': len(self._pending),
+            'silent': len(self._silent),
+        }
+
+
+class TickerBackfill:
+    """
+    Снимок тикеров всех символов категории одним запросом /v5/market/tickers
+
+    Поля разбираются той же таблицей полей, что и WebSocket тикеры,
+    поэтому строки совпадают по формату со строками обработчика.
+    """
+
+    def __init__(self, category, float_fields, time_fields=(), text_fields=(), timeout=10):
+        """
+        Args:
+            category: Категория Bybit (linear, spot)
+            float_fields, time_fields, text_fields: Пары (JSON ключ, колонка), как у стримера
+            timeout: Таймаут запроса (сек)
+        """
+        self.category = category
+        self.timeout = timeout
+        self.session = requests.Session()
+        self._decode = TickerDecoder(field_specs(
+            float_fields=float_fields,
+            time_fields=time_fields,
+            text_fields=text_fields
+        )).decode
+
+        self.requests = 0
+        self.rows = 0
+
+    def fetch(self, symbols=None):
+        """
+        Args:
+            symbols: Нужные символы (None - все)
+
+        Returns:
+            (event_time, [(symbol, floats, times, texts)]): время ответа биржи в epoch-ms и строки
+        """
+        response = self.session.get(TICKERS_URL, params={'category': self.category}, timeout=self.timeout)
+        response.raise_for_status()
+        body = response.json()
+        if body.get('retCode') != 0:
+            raise RuntimeError(f"tickers error {body.get('retCode')}: {body.get('retMsg')}")
+        self.requests += 1
+
+        event_time = int(body.get('time') or time.time() * 1000)
+        rows = []
+        for item in body.get('result', {}).get('list', []):
+            symbol = item.get('symbol')
+            if not symbol or (symbols is not None and symbol not in symbols):
+                continue
+            floats, times, texts = self._decode(item)
+            rows.append((symbol, floats, times, texts))
+        self.rows += len(rows)
+        return event_time, rows
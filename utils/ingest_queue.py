@@ -0,0 +1,141 @@
+import threading
+import time
+from collections import deque
+
+
+class IngestQueue:
+    """
+    Ограниченная очередь между разбором сообщений и записью в ClickHouse.
+
+    Политики переполнения:
+        block       - put() ждет освобождения места (не дольше put_timeout)
+        drop_oldest - вытесняется самый старый элемент
+        conflate    - новая строка заменяет ожидающую строку того же ключа
+                      (символа); если такой нет, вытесняется самый старый
+    """
+
+    POLICIES = ('block', 'drop_oldest', 'conflate')
+
+    def __init__(self, maxsize=100000, policy='block', put_timeout=None):
+        """
+        Args:
+            maxsize: Максимальное количество элементов
+            policy: Политика переполнения (block, drop_oldest, conflate)
+            put_timeout: Максимальное ожидание put() в политике block (сек), None - без ограничения
+        """
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown overflow policy: {policy}")
+
+        self.maxsize = maxsize
+        self.policy = policy
+        self.put_timeout = put_timeout
+
+        # Элементы хранятся как [key, item], чтобы conflate мог заменить item на месте
+        self._entries = deque()
+        self._latest = {}
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+
+        # Счетчики перегрузки
+        self.put_count = 0
+        self.get_count = 0
+        self.dropped = 0
+        self.conflated = 0
+        self.blocked_seconds = 0.0
+        self.high_water = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def put(self, item, key=None):
+        """
+        Добавление элемента
+
+        Args:
+            item: Элемент очереди
+            key: Ключ для политики conflate (например, символ)
+
+        Returns:
+            bool: False, если элемент отброшен
+        """
+        with self._lock:
+            if len(self._entries) >= self.maxsize:
+                if self.policy == 'block':
+                    started = time.monotonic()
+                    has_room = self._not_full.wait_for(
+                        lambda: len(self._entries) < self.maxsize, timeout=self.put_timeout
+                    )
+                    self.blocked_seconds += time.monotonic() - started
+                    if not has_room:
+                        self.dropped += 1
+                        return False
+
+                elif self.policy == 'conflate' and key is not None and key in self._latest:
+                    self._latest[key][1] = item
+                    self.conflated += 1
+                    return True
+
+                else:
+                    self._forget(self._entries.popleft())
+                    self.dropped += 1
+
+            entry = [key, item]
+            self._entries.append(entry)
+            if key is not None and self.policy == 'conflate':
+                self._latest[key] = entry
+
+            self.put_count += 1
+            depth = len(self._entries)
+            if depth > self.high_water:
+                self.high_water = depth
+
+            self._not_empty.notify()
+            return True
+
+    def get_batch(self, max_items, timeout=None):
+        """
+        Извлечение до max_items элементов
+
+        Ждет первый элемент не дольше timeout секунд, остальные забирает
+        без ожидания. Возвращает пустой список по таймауту.
+        """
+        with self._lock:
+            if not self._entries:
+                self._not_empty.wait(timeout)
+                if not self._entries:
+                    return []
+
+            items = []
+            while self._entries and len(items) < max_items:
+                entry = self._entries.popleft()
+                self._forget(entry)
+                items.append(entry[1])
+
+            self.get_count += len(items)
+            self._not_full.notify_all()
+            return items
+
+    def wake(self):
+        """Пробуждение потока, ожидающего в get_batch()"""
+        with self._lock:
+            self._not_empty.notify_all()
+
+    def stats(self):
+        """Счетчики очереди"""
+        return {
+            'depth': len(self._entries),
+            'maxsize': self.maxsize,
+            'policy': self.policy,
+            'high_water': self.high_water,
+            'put': self.put_count,
+            'get': self.get_count,
+            'dropped': self.dropped,
+            'conflated': self.conflated,
+            'blocked_seconds': round(self.blocked_seconds, 3),
+        }
+
+    def _forget(self, entry):
+        key = entry[0]
+        if key is not None and self._latest.get(key) is entry:
+            del self._latest[key]
@@ -0,0 +1,354 @@
+"""
+Метрики процесса стриминга.
+
+Счетчики и гистограммы не блокируются сами: запись метрики в горячем
+пути - это сложение int и обращение к списку, а операции чтения (HTTP
+сервер, /status бота) видят значения с задержкой не более одной
+операции. Без блокировки можно писать метрику только из одного потока
+(поток записи ClickHouse). Если пишут несколько потоков - например,
+обработчик тикеров вызывается из потоков всех WebSocket соединений
+шарда (utils/subscription_planner.py), - обновления защищает общей
+блокировкой вызывающий код, иначе `+= 1` из разных потоков теряет
+приращения.
+
+Гистограммы - логарифмически-линейные, как в HdrHistogram: каждый
+диапазон [2^k, 2^(k+1)) делится на sub_buckets равных корзин, и
+перцентили считаются с относительной точностью 1/sub_buckets при
+фиксированном объеме памяти.
+
+Метрики отдаются локальным HTTP сервером:
+    /metrics       - текстовый формат Prometheus
+    /metrics.json  - снимок для команды /status бота (со скоростями за минуту)
+"""
+import json
+import logging
+import math
+import threading
+import time
+from collections import deque
+from math import frexp
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+class Counter:
+    """Монотонный счетчик"""
+
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class Gauge:
+    """Текущее значение (задается напрямую или функцией, которая вызывается при чтении)"""
+
+    __slots__ = ('value', 'func')
+
+    def __init__(self, func=None):
+        self.value = 0.0
+        self.func = func
+
+    def set(self, value):
+        self.value = value
+
+    def get(self):
+        if self.func is None:
+            return self.value
+        try:
+            return self.func()
+        except Exception:
+            return math.nan
+
+
+class Histogram:
+    """Логарифмически-линейная гистограмма"""
+
+    __slots__ = ('lowest', 'sub_buckets', 'counts', 'count', 'sum', 'max', '_scale', '_last')
+
+    def __init__(self, lowest=1e-6, highest=3600.0, sub_buckets=16):
+        """
+        Args:
+            lowest: Минимальное различимое значение (меньшие попадают в первую корзину)
+            highest: Максимальное значение (большие попадают в последнюю корзину)
+            sub_buckets: Корзин на каждую степень двойки
+        """
+        self.lowest = lowest
+        self.sub_buckets = sub_buckets
+        self.counts = [0] * (math.ceil(math.log2(highest / lowest)) * sub_buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._scale = 1.0 / lowest
+        self._last = len(self.counts) - 1
+
+    def observe(self, value):
+        # value / lowest = mantissa * 2**exponent, mantissa в [0.5, 1); ноль и отрицательные - в первую корзину
+        mantissa, exponent = frexp(value * self._scale)
+        if exponent > 0 and mantissa > 0:
+            sub = self.sub_buckets
+            index = (exponent - 1) * sub + int((mantissa + mantissa - 1.0) * sub)
+            if index > self._last:
+                index = self._last
+        else:
+            index = 0
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def upper_bound(self, index):
+        """Верхняя граница корзины"""
+        octave, step = divmod(index, self.sub_buckets)
+        return self.lowest * 2 ** octave * (1 + (step + 1) / self.sub_buckets)
+
+    def quantiles(self, qs=QUANTILES):
+        """Значения перцентилей {q: значение} (верхняя граница корзины, не больше max)"""
+        counts = list(self.counts)
+        total = sum(counts)
+        result = {}
+        if not total:
+            return {q: 0.0 for q in qs}
+
+        targets = sorted(qs)
+        seen = 0
+        t = 0
+        for index, count in enumerate(counts):
+            seen += count
+            while t < len(targets) and seen >= targets[t] * total:
+                result[targets[t]] = min(self.upper_bound(index), self.max)
+                t += 1
+            if t == len(targets):
+                break
+        for q in targets[t:]:
+            result[q] = self.max
+        return result
+
+    def summary(self):
+        quantiles = self.quantiles()
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'max': self.max,
+            **{f"p{q * 100:g}": value for q, value in quantiles.items()},
+        }
+
+
+class MetricFamily:
+    """Метрика с метками: отдельный экземпляр на каждое сочетание значений меток"""
+
+    def __init__(self, kind, name, help, labelnames, factory):
+        self.kind = kind
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.factory = factory
+        self.children = {}
+
+    def labels(self, *values):
+        child = self.children.get(values)
+        if child is None:
+            child = self.children.setdefault(values, self.factory())
+        return child
+
+
+class MetricsRegistry:
+    """
+    Реестр метрик процесса
+
+    counter()/gauge()/histogram() без меток возвращают саму метрику,
+    с метками - MetricFamily, метрика берется через .labels(...).
+    """
+
+    def __init__(self, prefix='', const_labels=None, rate_window=60, sample_interval=5):
+        """
+        Args:
+            prefix: Префикс имен метрик
+            const_labels: Метки, общие для всех метрик процесса (категория, шард)
+            rate_window: Окно расчета скоростей счетчиков для snapshot() (сек)
+            sample_interval: Период снимков счетчиков для расчета скоростей (сек)
+        """
+        self.prefix = prefix
+        self.const_labels = dict(const_labels or {})
+        self.families = {}
+        self.started_at = time.time()
+
+        self.sample_interval = sample_interval
+        self._samples = deque(maxlen=max(2, int(rate_window / sample_interval) + 1))
+        self._stop = threading.Event()
+        self._sampler = None
+        self._server = None
+
+    def counter(self, name, help='', labelnames=()):
+        return self._register('counter', name, help, labelnames, Counter)
+
+    def gauge(self, name, help='', labelnames=(), func=None):
+        return self._register('gauge', name, help, labelnames, lambda: Gauge(func))
+
+    def histogram(self, name, help='', labelnames=(), lowest=1e-6, highest=3600.0, sub_buckets=16):
+        return self._register('histogram', name, help, labelnames,
+                              lambda: Histogram(lowest, highest, sub_buckets))
+
+    def _register(self, kind, name, help, labelnames, factory):
+        full_name = f"{self.prefix}_{name}" if self.prefix else name
+        family = self.families.get(full_name)
+        if family is None:
+            family = self.families[full_name] = MetricFamily(kind, full_name, help, labelnames, factory)
+        elif family.kind != kind:
+            raise ValueError(f"Metric {full_name} already registered as {family.kind}")
+        return family if labelnames else family.labels()
+
+    # Экспорт
+
+    def prometheus(self):
+        """Текстовый формат Prometheus (гистограммы - как summary с перцентилями)"""
+        lines = []
+        for family in list(self.families.values()):
+            kind = 'summary' if family.kind == 'histogram' else family.kind
+            lines.append(f"# HELP {family.name} {family.help}")
+            lines.append(f"# TYPE {family.name} {kind}")
+            for values, child in list(family.children.items()):
+                labels = dict(self.const_labels)
+                labels.update(zip(family.labelnames, values))
+                if family.kind == 'counter':
+                    lines.append(f"{family.name}{_labels(labels)} {child.value}")
+                elif family.kind == 'gauge':
+                    lines.append(f"{family.name}{_labels(labels)} {_number(child.get())}")
+                else:
+                    for q, value in child.quantiles().items():
+                        lines.append(f"{family.name}{_labels({**labels, 'quantile': q})} {_number(value)}")
+                    lines.append(f"{family.name}_sum{_labels(labels)} {_number(child.sum)}")
+                    lines.append(f"{family.name}_count{_labels(labels)} {child.count}")
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        """Значения всех метрик, скорости счетчиков (в секунду) и сводки гистограмм"""
+        rates = self._rates()
+        metrics = {}
+        for family in list(self.families.values()):
+            values = {}
+            for label_values, child in list(family.children.items()):
+                key = ','.join(label_values)
+                if family.kind == 'counter':
+                    values[key] = {'value': child.value, 'rate': rates.get((family.name, label_values), 0.0)}
+                elif family.kind == 'gauge':
+                    values[key] = child.get()
+                else:
+                    values[key] = child.summary()
+            metrics[family.name] = {'type': family.kind, 'labels': family.labelnames, 'values': values}
+        return {
+            'labels': self.const_labels,
+            'uptime': time.time() - self.started_at,
+            'metrics': metrics,
+        }
+
+    def sample(self):
+        """Снимок счетчиков для расчета скоростей"""
+        totals = {}
+        for family in list(self.families.values()):
+            if family.kind == 'counter':
+                for values, child in list(family.children.items()):
+                    totals[(family.name, values)] = child.value
+        self._samples.append((time.monotonic(), totals))
+
+    def _rates(self):
+        if len(self._samples) < 2:
+            return {}
+        (start, first), (end, last) = self._samples[0], self._samples[-1]
+        elapsed = end - start
+        return {key: (value - first.get(key, 0)) / elapsed for key, value in last.items()}
+
+    # HTTP сервер
+
+    def start_server(self, port, host='127.0.0.1'):
+        """Запуск HTTP сервера метрик и снимков для скоростей"""
+        if self._server is not None:
+            return self._server
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split('?', 1)[0]
+                if path == '/metrics':
+                    body, content_type = registry.prometheus().encode(), 'text/plain; version=0.0.4'
+                elif path == '/metrics.json':
+                    body, content_type = json.dumps(registry.snapshot(), default=str).encode(), 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+
+        self._stop.clear()
+        self.sample()
+        self._sampler = threading.Thread(target=self._run_sampler, name="metrics-sampler", daemon=True)
+        self._sampler.start()
+        logger.info(f"📈 Metrics endpoint: http://{host}:{port}/metrics")
+        return self._server
+
+    def stop_server(self):
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def _run_sampler(self):
+        while not self._stop.wait(self.sample_interval):
+            self.sample()
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in labels.values())
+    return '{' + ','.join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + '}'
+
+
+def _number(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return 'NaN'
+    return repr(float(value))
+
+
+def instrument_websocket(ws, reconnects, on_reconnect=None, lock=None):
+    """
+    Счетчик переподключений pybit WebSocket
+
+    pybit переподключается вызовом self._connect() из _on_error/_on_close,
+    поэтому переопределение метода у экземпляра считает все повторные
+    подключения (первое уже выполнено в конструкторе).
+
+    on_reconnect() вызывается перед каждым переподключением. lock -
+    блокировка счетчика, если его увеличивают несколько соединений.
+    """
+    connect = ws._connect
+
+    def _connect(url):
+        if lock is not None:
+            with lock:
+                reconnects.inc()
+        else:
+            reconnects.inc()
+        if on_reconnect is not None:
+            on_reconnect()
+        return connect(url)
+
+    ws._connect = _connect
@@ -0,0 +1,217 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from urllib.parse import quote
+
+from utils.schema import TABLES
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+
+def require_pyarrow():
+    if pq is None:
+        raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow)")
+
+
+class ParquetExporter:
+    """
+    Потоковая выгрузка таблиц ClickHouse в Parquet.
+
+    Результат запроса читается через query_arrow_stream clickhouse_driver:
+    каждый блок ClickHouse (до max_block_size строк) приходит отдельным
+    Arrow RecordBatch и сразу пишется row group'ой в файл, поэтому память
+    ограничена размером блока, а не объемом выгрузки.
+
+    Таблица делится на партиции по первой колонке ключа сортировки
+    (symbol, strategy, source) и дню:
+
+        <directory>/<table>/symbol=BTCUSDT/date=2026-01-05/data.parquet
+
+    Такой каталог читается как hive-партиционированный датасет
+    (pyarrow.dataset, pandas, DuckDB). Партиции выгружаются параллельно,
+    каждая через свое соединение из пула ClickHouseClient. Файл пишется
+    во временный и переименовывается после последнего блока; при
+    повторном запуске партиции, у которых в файле столько же строк,
+    сколько в таблице, пропускаются, так что прерванная выгрузка
+    продолжается с недостающих партиций, а дописанные дни выгружаются
+    заново.
+    """
+
+    def __init__(self, ch_client, directory, workers=None, max_block_size=131072, compression='zstd'):
+        """
+        Args:
+            ch_client: Клиент ClickHouse
+            directory: Корневой каталог выгрузки
+            workers: Партиций, выгружаемых одновременно (по умолчанию размер пула соединений)
+            max_block_size: Строк в блоке ClickHouse и в row group Parquet
+            compression: Сжатие Parquet (zstd, snappy, gzip, none)
+        """
+        require_pyarrow()
+        self.ch = ch_client
+        self.directory = directory
+        self.workers = workers or ch_client.pool.size
+        self.max_block_size = max_block_size
+        self.compression = compression
+
+        self._lock = threading.Lock()
+        self.exported_rows = 0
+        self.exported_files = 0
+        self.skipped_files = 0
+        self.failed_files = 0
+
+    def layout(self, table, time_column=None):
+        """(колонка партиционирования или None, колонка времени) таблицы"""
+        schema = TABLES.get(table)
+        if schema is None:
+            if time_column is None:
+                raise ValueError(f"Unknown table {table}: time_column is required")
+            return None, time_column
+        key = schema.order_by[0] if len(schema.order_by) > 1 else None
+        return key, time_column or schema.time_column
+
+    def partitions(self, table, start, end, keys=None, time_column=None):
+        """
+        Партиции таблицы за [start, end)
+
+        Returns:
+            Список (значение ключа или None, день, строк)
+        """
+        key, time_column = self.layout(table, time_column)
+        select_key = f"{key}, " if key else ''
+        query = (f"SELECT {select_key}toDate({time_column}) AS day, count() FROM {table} "
+                 f"WHERE {time_column} >= %(start)s AND {time_column} < %(end)s")
+        params = {'start': start, 'end': end}
+        if keys and key:
+            query += f" AND {key} IN %(keys)s"
+            params['keys'] = tuple(keys)
+        query += f" GROUP BY {select_key}day ORDER BY day{', ' + key if key else ''}"
+
+        rows = self.ch.execute(query, params)
+        return [tuple(r) if key else (None, *r) for r in rows]
+
+    def partition_path(self, table, key, value, day):
+        parts = [self.directory, table]
+        if key:
+            parts.append(f"{key}={quote(str(value), safe='')}")
+        parts.extend([f"date={day.isoformat()}", 'data.parquet'])
+        return os.path.join(*parts)
+
+    def export_partition(self, table, value, day, rows, start, end, time_column=None):
+        """
+        Выгрузка одной партиции (дня одного символа)
+
+        Returns:
+            Записано строк (0, если файл уже актуален)
+        """
+        key, time_column = self.layout(table, time_column)
+        path = self.partition_path(table, key, value, day)
+        if os.path.exists(path) and pq.read_metadata(path).num_rows == rows:
+            with self._lock:
+                self.skipped_files += 1
+            return 0
+
+        day_start = datetime(day.year, day.month, day.day)
+        params = {
+            'start': max(start, day_start),
+            'end': min(end, day_start + timedelta(days=1)),
+        }
+        columns = ', '.join(TABLES[table].column_names) if table in TABLES else '*'
+        query = f"SELECT {columns} FROM {table} WHERE {time_column} >= %(start)s AND {time_column} < %(end)s"
+        if key:
+            query += f" AND {key} = %(value)s"
+            params['value'] = value
+        query += f" ORDER BY {time_column}"
+
+        written = self._write(path, query, params)
+        with self._lock:
+            self.exported_rows += written
+            self.exported_files += 1
+        return written
+
+    def export_table(self, table, start, end, keys=None, time_column=None):
+        """
+        Выгрузка таблицы за [start, end) по партициям
+
+        Args:
+            table: Имя таблицы
+            start: Начало интервала (datetime)
+            end: Конец интервала, не включая (datetime)
+            keys: Только эти значения колонки партиционирования (символы)
+            time_column: Колонка времени для таблиц не из utils/schema.py
+
+        Returns:
+            Словарь со статистикой выгрузки
+        """
+        started = time.monotonic()
+        partitions = self.partitions(table, start, end, keys, time_column)
+        logger.info(f"📦 Exporting {table}: {len(partitions)} partitions, "
+                    f"{sum(p[2] for p in partitions)} rows, {self.workers} workers")
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='parquet-export') as executor:
+            futures = {
+                executor.submit(self.export_partition, table, value, day, rows, start, end, time_column): (value, day)
+                for value, day, rows in partitions
+            }
+            for future in as_completed(futures):
+                value, day = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    with self._lock:
+                        self.failed_files += 1
+                    logger.error(f"❌ Export of {table} {value or ''} {day} failed: {e}")
+
+        return {**self.stats(), 'partitions': len(partitions), 'seconds': time.monotonic() - started}
+
+    def export_query(self, query, path, params=None):
+        """
+        Выгрузка результата произвольного SELECT в один файл
+
+        Returns:
+            Записано строк
+        """
+        written = self._write(path, query, params)
+        with self._lock:
+            self.exported_rows += written
+            self.exported_files += 1
+        return written
+
+    def stats(self):
+        with self._lock:
+            return {
+                'exported_rows': self.exported_rows,
+                'exported_files': self.exported_files,
+                'skipped_files': self.skipped_files,
+                'failed_files': self.failed_files,
+            }
+
+    def _write(self, path, query, params):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+        written = 0
+        try:
+            with self.ch.pool.connection() as client:
+                reader = client.query_arrow_stream(query, params,
+                                                   settings={'max_block_size': self.max_block_size})
+                with pq.ParquetWriter(tmp_path, reader.schema, compression=self.compression) as writer:
+                    for batch in reader:
+                        if batch.num_rows:
+                            writer.write_batch(batch)
+                            written += batch.num_rows
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return written
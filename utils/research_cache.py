@@ -0,0 +1,270 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from urllib.parse import quote
+
+import numpy as np
+
+from utils.schema import TABLES
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+
+class ResearchCache:
+    """
+    Локальный кэш исследовательских запросов по дням.
+
+    Данные таблицы хранятся файлами Arrow IPC без сжатия, по одному на
+    символ и день:
+
+        <directory>/<table>/<symbol>/2026-01-05.arrow
+
+    Файлы открываются через memory map: повторный запрос читает страницы
+    с диска по мере обращения, без копирования и без запроса к серверу.
+    Из ClickHouse запрашиваются только отсутствующие дни (подряд идущие -
+    одним запросом), пустые дни тоже кэшируются.
+
+    В кэш попадают только закрытые дни - прошедшие сутки UTC, к концу
+    которых прошло settle_seconds (досылка бэкфилла). Текущий день всегда
+    читается с сервера. Если закрытый день был дописан позже (ручной
+    бэкфилл), его нужно сбросить через invalidate().
+
+    Общий размер файлов ограничен max_bytes: при превышении удаляются
+    файлы, к которым дольше всего не обращались (LRU). Время обращения
+    хранится в mtime файла, поэтому порядок вытеснения сохраняется между
+    запусками.
+    """
+
+    def __init__(self, ch_client, directory, max_bytes=20 * 1024 ** 3, settle_seconds=3600):
+        """
+        Args:
+            ch_client: Клиент ClickHouse
+            directory: Каталог кэша
+            max_bytes: Максимальный размер кэша (байт)
+            settle_seconds: Задержка после конца дня, после которой день кэшируется (сек)
+        """
+        if pa is None:
+            raise RuntimeError("Research cache requires pyarrow (pip install pyarrow)")
+        self.ch = ch_client
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.settle_seconds = settle_seconds
+
+        self._lock = threading.Lock()
+        # path -> размер, от давно не использованных к недавним
+        self._files = OrderedDict()
+        self.total_bytes = 0
+
+        # Счетчики
+        self.hits = 0
+        self.misses = 0
+        self.open_days = 0
+        self.server_queries = 0
+        self.evicted_files = 0
+
+        self._scan()
+
+    def load(self, table, symbol, start, end, columns=None):
+        """
+        Строки символа за [start, end), упорядоченные по времени
+
+        Args:
+            table: Таблица из utils/schema.py
+            symbol: Значение первой колонки ключа сортировки (символ)
+            start: Начало интервала (datetime, UTC)
+            end: Конец интервала, не включая (datetime, UTC)
+            columns: Колонки результата (по умолчанию все)
+
+        Returns:
+            pyarrow.Table
+        """
+        schema = TABLES[table]
+        time_column = schema.time_column
+        days = []
+        day = start.date()
+        while self._day_start(day) < end:
+            days.append(day)
+            day += timedelta(days=1)
+        closed_before = self._closed_before()
+
+        parts = {}
+        missing = []
+        for day in days:
+            if self._day_start(day) + timedelta(days=1) > closed_before:
+                continue
+            part = self._read(self._path(table, symbol, day))
+            if part is None:
+                missing.append(day)
+            else:
+                parts[day] = part
+
+        with self._lock:
+            self.hits += len(parts)
+            self.misses += len(missing)
+
+        for run in self._runs(missing):
+            fetched = self._fetch(table, symbol, self._day_start(run[0]), self._day_start(run[-1]) + timedelta(days=1))
+            for day, part in self._split(fetched, time_column, run):
+                self._write(self._path(table, symbol, day), part)
+                parts[day] = part
+
+        # Незакрытые дни - только с сервера
+        open_days = [d for d in days if d not in parts]
+        if open_days:
+            with self._lock:
+                self.open_days += len(open_days)
+            parts[open_days[0]] = self._fetch(table, symbol, max(start, self._day_start(open_days[0])), end)
+
+        result = pa.concat_tables([parts[d] for d in sorted(parts)]) if parts else self._fetch(table, symbol, start, end)
+        result = self._slice(result, time_column, start, end)
+        return result.select(columns) if columns else result
+
+    def invalidate(self, table, symbol=None, day=None):
+        """Удаление кэша таблицы, символа или одного дня"""
+        prefix = os.path.join(self.directory, table)
+        if symbol is not None:
+            prefix = os.path.join(prefix, quote(symbol, safe=''))
+            if day is not None:
+                prefix = os.path.join(prefix, f"{day.isoformat()}.arrow")
+        with self._lock:
+            for path in [p for p in self._files if p == prefix or p.startswith(prefix + os.sep)]:
+                self._remove(path)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'open_days': self.open_days,
+                'server_queries': self.server_queries,
+                'files': len(self._files),
+                'bytes': self.total_bytes,
+                'evicted_files': self.evicted_files,
+            }
+
+    # Сервер
+
+    def _fetch(self, table, symbol, start, end):
+        schema = TABLES[table]
+        time_column = schema.time_column
+        query = (f"SELECT {', '.join(schema.column_names)} FROM {table} "
+                 f"WHERE {schema.order_by[0]} = %(symbol)s "
+                 f"AND {time_column} >= %(start)s AND {time_column} < %(end)s "
+                 f"ORDER BY {time_column}")
+        with self._lock:
+            self.server_queries += 1
+        with self.ch.pool.connection() as client:
+            return client.query_arrow(query, {'symbol': symbol, 'start': start, 'end': end})
+
+    def _split(self, fetched, time_column, days):
+        """Разбиение результата за несколько дней на дни (строки упорядочены по времени)"""
+        times = self._times(fetched, time_column)
+        for day in days:
+            lo, hi = np.searchsorted(times, [np.datetime64(self._day_start(day)),
+                                             np.datetime64(self._day_start(day) + timedelta(days=1))])
+            yield day, fetched.slice(lo, hi - lo)
+
+    def _slice(self, table, time_column, start, end):
+        times = self._times(table, time_column)
+        lo, hi = np.searchsorted(times, [np.datetime64(start), np.datetime64(end)])
+        return table.slice(lo, hi - lo)
+
+    @staticmethod
+    def _times(table, time_column):
+        column = table.column(time_column)
+        if not len(column):
+            return np.array([], dtype='datetime64[ms]')
+        return column.to_numpy()
+
+    # Файлы
+
+    def _path(self, table, symbol, day):
+        return os.path.join(self.directory, table, quote(symbol, safe=''), f"{day.isoformat()}.arrow")
+
+    def _read(self, path):
+        try:
+            source = pa.memory_map(path, 'r')
+        except FileNotFoundError:
+            return None
+        table = pa.ipc.open_file(source).read_all()
+        with self._lock:
+            if path in self._files:
+                self._files.move_to_end(path)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return table
+
+    def _write(self, path, table):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with pa.OSFile(tmp_path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+
+        size = os.path.getsize(path)
+        with self._lock:
+            self.total_bytes += size - self._files.pop(path, 0)
+            self._files[path] = size
+            self._evict()
+
+    def _evict(self):
+        # Вызывается под self._lock. Последний записанный файл остается, даже если он больше бюджета
+        while self.total_bytes > self.max_bytes and len(self._files) > 1:
+            self._remove(next(iter(self._files)))
+            self.evicted_files += 1
+
+    def _remove(self, path):
+        # Вызывается под self._lock. Открытые memory map остаются действительными после удаления файла
+        self.total_bytes -= self._files.pop(path)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _scan(self):
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                if name.endswith('.tmp'):
+                    os.remove(path)
+                elif name.endswith('.arrow'):
+                    stat = os.stat(path)
+                    files.append((stat.st_mtime, path, stat.st_size))
+        with self._lock:
+            for _, path, size in sorted(files):
+                self._files[path] = size
+                self.total_bytes += size
+            self._evict()
+
+    # Дни
+
+    def _closed_before(self):
+        """Дни, закончившиеся до этого момента, закрыты"""
+        return datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=self.settle_seconds)
+
+    @staticmethod
+    def _day_start(day):
+        return datetime(day.year, day.month, day.day)
+
+    @staticmethod
+    def _runs(days):
+        """Подряд идущие дни"""
+        run = []
+        for day in days:
+            if run and day - run[-1] != timedelta(days=1):
+                yield run
+                run = []
+            run.append(day)
+        if run:
+            yield run
@@ -0,0 +1,220 @@
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+# Строк результата, по которым оценивается размер всего результата
+SAMPLE_ROWS = 100
+
+# Строковые литералы сохраняются как есть, остальные пробелы схлопываются
+WHITESPACE_RE = re.compile(r"('(?:[^'\\]|\\.)*')|\s+")
+READ_TABLES_RE = re.compile(r"\b(?:FROM|JOIN)\s+([\w.]+)", re.IGNORECASE)
+WRITE_TABLE_RE = re.compile(
+    r"^\s*(?:INSERT\s+INTO|ALTER\s+TABLE|TRUNCATE\s+(?:TABLE\s+)?(?:IF\s+EXISTS\s+)?|"
+    r"DROP\s+TABLE\s+(?:IF\s+EXISTS\s+)?|OPTIMIZE\s+TABLE|DELETE\s+FROM|EXCHANGE\s+TABLES)\s*([\w.]+)",
+    re.IGNORECASE
+)
+
+
+def normalize_query(query):
+    return WHITESPACE_RE.sub(lambda m: m.group(1) or ' ', query).strip()
+
+
+def read_tables(query):
+    """Таблицы, из которых читает запрос (без имени базы)"""
+    return frozenset(t.split('.')[-1] for t in READ_TABLES_RE.findall(query))
+
+
+def written_table(query):
+    """Таблица, которую изменяет запрос, или None"""
+    match = WRITE_TABLE_RE.match(query)
+    return match.group(1).split('.')[-1] if match else None
+
+
+def cache_key(query, params=None, kwargs=None):
+    freeze = (lambda v: repr(sorted(v.items())) if isinstance(v, dict) else repr(v))
+    return normalize_query(query), freeze(params), freeze(kwargs or {})
+
+
+def estimate_size(value):
+    """Примерный размер результата в памяти (по выборке строк)"""
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple)) and value:
+        sample = value[:SAMPLE_ROWS]
+        size += sum(estimate_size(v) for v in sample) * len(value) // len(sample)
+    return size
+
+
+class ResultEntry:
+    __slots__ = ('value', 'expires_at', 'size', 'tables')
+
+    def __init__(self, value, expires_at, size, tables):
+        self.value = value
+        self.expires_at = expires_at
+        self.size = size
+        self.tables = tables
+
+
+class Flight:
+    """Выполняющийся запрос, результата которого ждут одинаковые запросы"""
+
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ResultCache:
+    """
+    Кэш результатов SELECT в памяти процесса.
+
+    Ключ - текст запроса с нормализованными пробелами, параметры и
+    аргументы execute. Время жизни задается при каждом вызове. Общий
+    размер результатов (оценка по выборке строк) ограничен max_bytes,
+    при превышении удаляются давно не использованные результаты (LRU).
+
+    Одинаковые запросы, пришедшие во время выполнения первого, не идут в
+    ClickHouse, а ждут его результат (или его ошибку). Ошибки не кэшируются.
+
+    invalidate(table) удаляет результаты запросов, читающих таблицу.
+    Результат запроса, выполнявшегося во время инвалидации, не
+    сохраняется. Записи других процессов кэш не видит - их ограничивает
+    только время жизни.
+
+    Возвращается один и тот же объект результата: изменять его нельзя.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, invalidate_on_write=True):
+        """
+        Args:
+            max_bytes: Максимальный размер результатов в кэше (байт)
+            invalidate_on_write: Вставки и изменения через клиент удаляют результаты по таблице
+        """
+        self.max_bytes = max_bytes
+        self.invalidate_on_write = invalidate_on_write
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._flights = {}
+        # Таблица -> ключи результатов, читающих ее
+        self._by_table = {}
+        # Таблица -> номер инвалидации
+        self._generations = {}
+        self.total_bytes = 0
+
+        # Счетчики
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.expired = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.oversized = 0
+
+    def get(self, key, ttl, compute, tables=()):
+        """
+        Результат из кэша или compute()
+
+        Args:
+            key: Ключ (cache_key)
+            ttl: Время жизни результата (сек)
+            compute: Функция без аргументов, выполняющая запрос
+            tables: Таблицы, из которых читает запрос (для invalidate)
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.expires_at > now:
+                    self.hits += 1
+                    self._entries.move_to_end(key)
+                    return entry.value
+                self.expired += 1
+                self._drop(key)
+
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                flight = self._flights[key] = Flight()
+                self.misses += 1
+                leader = True
+                generations = [self._generations.get(t, 0) for t in tables]
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = compute()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+                if flight.error is None and generations == [self._generations.get(t, 0) for t in tables]:
+                    self._store(key, flight.value, time.monotonic() + ttl, tables)
+            flight.done.set()
+        return flight.value
+
+    def invalidate(self, table):
+        """Удаление результатов запросов, читающих таблицу"""
+        with self._lock:
+            self._generations[table] = self._generations.get(table, 0) + 1
+            keys = self._by_table.pop(table, None)
+            if keys:
+                for key in list(keys):
+                    self._drop(key)
+                self.invalidations += len(keys)
+
+    def clear(self):
+        with self._lock:
+            for table in list(self._by_table):
+                self._generations[table] = self._generations.get(table, 0) + 1
+            self._entries.clear()
+            self._by_table.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.total_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'expired': self.expired,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'oversized': self.oversized,
+            }
+
+    def _store(self, key, value, expires_at, tables):
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            self.oversized += 1
+            return
+        self._entries[key] = ResultEntry(value, expires_at, size, tables)
+        self.total_bytes += size
+        for table in tables:
+            self._by_table.setdefault(table, set()).add(key)
+        while self.total_bytes > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        self.total_bytes -= entry.size
+        for table in entry.tables:
+            keys = self._by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_table[table]
@@ -0,0 +1,192 @@
+import time
+from collections import deque
+import fnmatch
+import re
+
+import numpy as np
+
+# Метрика -> поля состояния, из которых она считается
+METRIC_FIELDS = {
+    'last_price': ['lastPrice'],
+    'price_change_24h': ['price24hPcnt'],
+    'price_change_1h': ['lastPrice', 'prevPrice1h'],
+    'funding_rate': ['fundingRate'],
+    'open_interest_change': ['openInterest'],
+    'spread': ['bid1Price', 'ask1Price'],
+}
+
+OPS = ('>', '<', 'abs>')
+
+
+class RulesEngine:
+    """
+    Проверка правил алертов сразу по всем символам.
+
+    Правила компилируются в массивы (метрика, знак, порог) и проверяются
+    одним сравнением матрицы [правила x символы], построенной из снимка
+    TickerStateTable. Правило срабатывает по символу, когда условие
+    становится истинным, и не чаще debounce секунд; пока условие держится,
+    повторов нет.
+    """
+
+    def __init__(self, state, rules, on_trigger, oi_window=900):
+        """
+        Args:
+            state: TickerStateTable
+            rules: Список правил (см. config/alert_rules.py)
+            on_trigger: Функция on_trigger(rule, symbol, value, price)
+            oi_window: Окно изменения открытого интереса (сек)
+        """
+        self.state = state
+        self.rules = [dict(rule) for rule in rules]
+        self.on_trigger = on_trigger
+        self.oi_window = oi_window
+
+        for rule in self.rules:
+            if rule['metric'] not in METRIC_FIELDS:
+                raise ValueError(f"Unknown metric in rule {rule.get('name')}: {rule['metric']}")
+            if rule.get('op', '>') not in OPS:
+                raise ValueError(f"Unknown op in rule {rule.get('name')}: {rule['op']}")
+            patterns = rule.get('symbols', '*')
+            patterns = [patterns] if isinstance(patterns, str) else list(patterns)
+            rule['regex'] = re.compile('|'.join(f"(?:{fnmatch.translate(p)})" for p in patterns))
+
+        self.metrics = sorted({rule['metric'] for rule in self.rules})
+        self.fields = sorted({f for m in self.metrics for f in METRIC_FIELDS[m]} | {'lastPrice'})
+        missing = [f for f in self.fields if f not in state.float_fields]
+        if missing:
+            raise ValueError(f"State table has no fields: {missing}")
+        self._column = {f: j for j, f in enumerate(self.fields)}
+
+        # Правило в виде массивов: сравнение варианта метрики (value, -value или |value|) с порогом.
+        # Варианты считаются один раз на метрику, а не на каждое правило
+        variants = []
+        variant_index = []
+        for rule in self.rules:
+            variant = (self.metrics.index(rule['metric']), rule.get('op', '>'))
+            if variant not in variants:
+                variants.append(variant)
+            variant_index.append(variants.index(variant))
+        self.variants = variants
+        self.variant_index = np.array(variant_index, dtype=np.intp)
+        self.threshold = np.array([
+            -float(rule['threshold']) if rule.get('op', '>') == '<' else float(rule['threshold'])
+            for rule in self.rules
+        ])[:, None]
+        self.debounce = np.array([float(rule.get('debounce', 300)) for rule in self.rules])
+
+        # Состояние по [правило x символ]
+        self.symbols = []
+        self.applies = np.zeros((len(self.rules), 0), dtype=bool)
+        self.active = np.zeros((len(self.rules), 0), dtype=bool)
+        self.last_fired = np.full((len(self.rules), 0), -np.inf)
+
+        # Снимки открытого интереса для расчета изменения за oi_window
+        self._oi_history = deque()
+
+        self.evaluations = 0
+        self.triggered = 0
+        self.last_duration = 0.0
+
+    def evaluate(self, now=None):
+        """
+        Проверка всех правил по текущему состоянию
+
+        Returns:
+            Количество срабатываний
+        """
+        started = time.perf_counter()
+        now = now or time.time()
+
+        symbols, ready, values = self.state.matrix(self.fields)
+        self._resize(symbols)
+
+        metrics = self._metrics(values, now)
+        metrics[~ready] = np.nan
+
+        # Матрицы хранятся как [правила x символы]: строки правил копируются непрерывными блоками
+        compared = np.empty((len(self.variants), len(metrics)))
+        for k, (j, op) in enumerate(self.variants):
+            if op == 'abs>':
+                np.abs(metrics[:, j], out=compared[k])
+            elif op == '<':
+                np.negative(metrics[:, j], out=compared[k])
+            else:
+                compared[k] = metrics[:, j]
+
+        # NaN сравнивается как False
+        hits = compared[self.variant_index] > self.threshold
+        hits &= self.applies
+
+        new = hits & ~self.active
+        self.active = hits
+        fired = 0
+        if new.any():
+            rules, rows = np.nonzero(new)
+            # Debounce проверяется только для новых срабатываний
+            due = now - self.last_fired[rules, rows] >= self.debounce[rules]
+            rules, rows = rules[due], rows[due]
+            self.last_fired[rules, rows] = now
+            fired = len(rows)
+
+            price = values[:, self._column['lastPrice']]
+            for r, i in zip(rules.tolist(), rows.tolist()):
+                metric = self.metrics.index(self.rules[r]['metric'])
+                self.on_trigger(self.rules[r], symbols[i], float(metrics[i, metric]), float(price[i]))
+
+        self.evaluations += 1
+        self.triggered += fired
+        self.last_duration = time.perf_counter() - started
+        return fired
+
+    def _metrics(self, values, now):
+        """Матрица метрик [символы x self.metrics]"""
+        column = {f: values[:, j] for f, j in self._column.items()}
+        metrics = np.empty((len(values), len(self.metrics)))
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for j, metric in enumerate(self.metrics):
+                if metric == 'price_change_1h':
+                    result = column['lastPrice'] / column['prevPrice1h'] - 1
+                elif metric == 'spread':
+                    bid, ask = column['bid1Price'], column['ask1Price']
+                    result = (ask - bid) / ((ask + bid) / 2)
+                elif metric == 'open_interest_change':
+                    result = column['openInterest'] / self._oi_reference(column['openInterest'], now) - 1
+                else:
+                    result = column[METRIC_FIELDS[metric][0]]
+                metrics[:, j] = result
+
+        # Нулевые знаменатели дают inf: такие значения не сравниваются
+        metrics[~np.isfinite(metrics)] = np.nan
+        return metrics
+
+    def _oi_reference(self, open_interest, now):
+        """Открытый интерес примерно oi_window секунд назад (NaN для новых символов)"""
+        history = self._oi_history
+        if not history or now - history[-1][0] >= self.oi_window / 10:
+            history.append((now, open_interest.copy()))
+        while len(history) > 1 and now - history[1][0] >= self.oi_window:
+            history.popleft()
+
+        reference = history[0][1]
+        if len(reference) < len(open_interest):
+            reference = np.concatenate([reference, np.full(len(open_interest) - len(reference), np.nan)])
+        reference = np.where(reference > 0, reference, np.nan)
+        return reference
+
+    def _resize(self, symbols):
+        """Добавление строк для новых символов"""
+        n, known = len(symbols), len(self.symbols)
+        if n == known:
+            return
+
+        new = symbols[known:]
+        applies = np.zeros((len(self.rules), len(new)), dtype=bool)
+        for r, rule in enumerate(self.rules):
+            match = rule['regex'].match
+            applies[r] = [match(symbol) is not None for symbol in new]
+        self.applies = np.hstack([self.applies, applies])
+        self.active = np.hstack([self.active, np.zeros_like(applies)])
+        self.last_fired = np.hstack([self.last_fired, np.full(applies.shape, -np.inf)])
+        self.symbols = list(symbols)
@@ -0,0 +1,234 @@
+"""
+Описание таблиц ClickHouse.
+
+Все таблицы - временные ряды, которые читаются по символу за интервал
+времени, поэтому у каждой таблицы:
+    ORDER BY (symbol, <время>)   - запрос по одному символу читает только его гранулы
+    PARTITION BY toYYYYMM(...)   - месячные партиции, старые месяцы отсекаются целиком
+    LowCardinality(String)       - словарное кодирование символов и категорий
+    Delta/Gorilla + ZSTD         - сжатие монотонного времени и плавающих цен
+    окно дедупликации вставок    - повтор пакета с тем же токеном не дублирует строки
+"""
+from collections import namedtuple
+
+from config.clickhouse_config import CLICKHOUSE_SCHEMA_CONFIG
+
+# Кодеки колонок
+TIME_CODEC = 'CODEC(Delta, ZSTD(1))'
+FLOAT_CODEC = 'CODEC(Gorilla, ZSTD(1))'
+TEXT_CODEC = 'CODEC(ZSTD(1))'
+INT_CODEC = 'CODEC(T64, ZSTD(1))'
+
+# Окно дедупликации вставок по insert_deduplication_token для нереплицированных таблиц:
+# повтор вставки пакета с тем же токеном среди последних DEDUPLICATION_WINDOW вставок игнорируется
+DEDUPLICATION_WINDOW = 1000
+
+Column = namedtuple('Column', ['name', 'type', 'codec', 'default'])
+
+
+def column(name, type, codec=None, default=None):
+    return Column(name, type, codec, default)
+
+
+def time_column(name, type='DateTime64(3)', default=None):
+    return Column(name, type, TIME_CODEC, default)
+
+
+def float_columns(*names):
+    return [Column(name, 'Float64', FLOAT_CODEC, None) for name in names]
+
+
+def symbol_column(name='symbol'):
+    return Column(name, 'LowCardinality(String)', None, None)
+
+
+class TableSchema:
+    """Описание таблицы MergeTree"""
+
+    def __init__(self, name, columns, order_by, partition_by=None, engine='MergeTree()', settings=None):
+        """
+        Args:
+            name: Имя таблицы
+            columns: Список Column
+            order_by: Ключ сортировки (список выражений)
+            partition_by: Выражение партиционирования
+            engine: Движок таблицы
+            settings: SETTINGS таблицы
+        """
+        self.name = name
+        self.columns = list(columns)
+        self.order_by = list(order_by)
+        self.partition_by = partition_by
+        self.engine = engine
+        self.settings = dict(settings or {})
+
+    @property
+    def column_names(self):
+        return [c.name for c in self.columns]
+
+    @property
+    def time_column(self):
+        """Колонка времени ключа сортировки (по ней копируются данные при миграции)"""
+        return self.order_by[-1]
+
+    @property
+    def sorting_key(self):
+        return ', '.join(self.order_by)
+
+    @staticmethod
+    def column_ddl(c):
+        line = f"{c.name} {c.type}"
+        if c.default:
+            line += f" DEFAULT {c.default}"
+        if c.codec:
+            line += f" {c.codec}"
+        return line
+
+    def columns_ddl(self):
+        return ',\n    '.join(self.column_ddl(c) for c in self.columns)
+
+    def ddl(self, table_name=None):
+        """CREATE TABLE для таблицы (или для копии под другим именем)"""
+        sql = (f"CREATE TABLE IF NOT EXISTS {table_name or self.name} (\n    {self.columns_ddl()}\n)\n"
+               f"ENGINE = {self.engine}\n")
+        if self.partition_by:
+            sql += f"PARTITION BY {self.partition_by}\n"
+        sql += f"ORDER BY ({self.sorting_key})"
+        if self.settings:
+            sql += "\nSETTINGS " + ', '.join(f"{k} = {v}" for k, v in self.settings.items())
+        return sql
+
+
+DEDUP_SETTINGS = {'non_replicated_deduplication_window': DEDUPLICATION_WINDOW}
+
+TICKER_ENGINES = {
+    'MergeTree': 'MergeTree()',
+    # Из строк с одинаковым ключом сортировки (symbol, event_time) после слияния остается
+    # последняя по insert_time; до слияния точный результат дают FINAL или argMax
+    'ReplacingMergeTree': 'ReplacingMergeTree(insert_time)',
+}
+TICKER_ENGINE = TICKER_ENGINES[CLICKHOUSE_SCHEMA_CONFIG['ticker_engine']]
+
+TABLES = {}
+
+
+def register(table):
+    TABLES[table.name] = table
+    return table
+
+
+register(TableSchema(
+    'bybit_tickers_linear',
+    [
+        time_column('event_time'),
+        time_column('receive_time'),
+        column('next_funding_time', 'Nullable(DateTime64(3))', TIME_CODEC),
+        symbol_column(),
+        column('tick_direction', 'LowCardinality(String)'),
+        *float_columns(
+            'last_price', 'prev_price_24h', 'price_24h_pcnt', 'high_price_24h', 'low_price_24h',
+            'prev_price_1h', 'mark_price', 'index_price', 'open_interest', 'open_interest_value',
+            'turnover_24h', 'volume_24h', 'funding_rate', 'bid1_price', 'bid1_size', 'ask1_price', 'ask1_size'
+        ),
+        column('is_backfill', 'UInt8', INT_CODEC, default='0'),
+        time_column('insert_time', default='now64(3)'),
+    ],
+    order_by=['symbol', 'event_time'],
+    partition_by='toYYYYMM(event_time)',
+    engine=TICKER_ENGINE,
+    settings=DEDUP_SETTINGS
+))
+
+register(TableSchema(
+    'bybit_tickers_spot',
+    [
+        time_column('event_time'),
+        time_column('receive_time'),
+        symbol_column(),
+        column('tick_direction', 'LowCardinality(String)'),
+        *float_columns(
+            'last_price', 'prev_price_24h', 'price_24h_pcnt', 'high_price_24h', 'low_price_24h',
+            'prev_price_1h', 'mark_price', 'index_price', 'turnover_24h', 'volume_24h',
+            'bid1_price', 'bid1_size', 'ask1_price', 'ask1_size'
+        ),
+        column('is_backfill', 'UInt8', INT_CODEC, default='0'),
+        time_column('insert_time', default='now64(3)'),
+    ],
+    order_by=['symbol', 'event_time'],
+    partition_by='toYYYYMM(event_time)',
+    engine=TICKER_ENGINE,
+    settings=DEDUP_SETTINGS
+))
+
+register(TableSchema(
+    'trades',
+    [
+        time_column('timestamp', 'DateTime'),
+        symbol_column(),
+        column('side', 'LowCardinality(String)'),
+        *float_columns('price', 'quantity'),
+        column('trade_id', 'String', TEXT_CODEC),
+        column('strategy', 'LowCardinality(String)'),
+    ],
+    order_by=['symbol', 'timestamp'],
+    partition_by='toYYYYMM(timestamp)',
+    settings=DEDUP_SETTINGS
+))
+
+register(TableSchema(
+    'orders',
+    [
+        time_column('timestamp', 'DateTime'),
+        symbol_column(),
+        column('order_type', 'LowCardinality(String)'),
+        column('side', 'LowCardinality(String)'),
+        *float_columns('price', 'quantity'),
+        column('status', 'LowCardinality(String)'),
+        column('order_id', 'String', TEXT_CODEC),
+        column('strategy', 'LowCardinality(String)'),
+    ],
+    order_by=['symbol', 'timestamp'],
+    partition_by='toYYYYMM(timestamp)',
+    settings=DEDUP_SETTINGS
+))
+
+register(TableSchema(
+    'market_data',
+    [
+        time_column('timestamp', 'DateTime'),
+        symbol_column(),
+        *float_columns('open', 'high', 'low', 'close', 'volume'),
+        column('timeframe', 'LowCardinality(String)'),
+    ],
+    order_by=['symbol', 'timeframe', 'timestamp'],
+    partition_by='toYYYYMM(timestamp)',
+    settings=DEDUP_SETTINGS
+))
+
+register(TableSchema(
+    'strategy_metrics',
+    [
+        time_column('timestamp', 'DateTime'),
+        column('strategy', 'LowCardinality(String)'),
+        *float_columns('pnl', 'drawdown', 'sharpe_ratio'),
+        column('total_trades', 'Int32', INT_CODEC),
+        column('winning_trades', 'Int32', INT_CODEC),
+    ],
+    order_by=['strategy', 'timestamp'],
+    partition_by='toYYYYMM(timestamp)',
+    settings=DEDUP_SETTINGS
+))
+
+register(TableSchema(
+    'alerts_log',
+    [
+        time_column('timestamp'),
+        column('source', 'LowCardinality(String)'),
+        column('alert_type', 'LowCardinality(String)'),
+        column('severity', 'LowCardinality(String)'),
+        column('message', 'String', TEXT_CODEC),
+    ],
+    order_by=['source', 'timestamp'],
+    partition_by='toYYYYMM(timestamp)',
+    settings=DEDUP_SETTINGS
+))
@@ -0,0 +1,414 @@
+import os
+import json
+import mmap
+import uuid
+import struct
+import hashlib
+import logging
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'ABSP'
+RECORD_HEADER = struct.Struct('<4sI')
+ALIGN = 8
+
+
+class SpillLog:
+    """
+    Локальный журнал строк, которые не удалось записать в ClickHouse.
+
+    Пакеты пишутся в сегменты spill-XXXXXXXX.seg в бинарном колоночном виде:
+    числовые колонки как есть, время в epoch-ms, строки как смещения + UTF-8.
+    При восстановлении связи сегменты читаются через mmap и досылаются
+    крупными пачками. Каждая пачка отправляется с insert_deduplication_token,
+    а успешно досланные пакеты отмечаются в файле .done, поэтому прерванная
+    досылка не приводит к повторной вставке.
+    """
+
+    def __init__(self, directory, max_segment_bytes=64 * 1024 * 1024, replay_batch_rows=100000):
+        """
+        Args:
+            directory: Каталог сегментов
+            max_segment_bytes: Размер сегмента, после которого открывается новый
+            replay_batch_rows: Максимум строк в одной вставке при досылке
+        """
+        self.directory = directory
+        self.max_segment_bytes = max_segment_bytes
+        self.replay_batch_rows = replay_batch_rows
+
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._active = None
+        self._active_path = None
+
+        # Счетчики
+        self.spilled_rows = 0
+        self.replayed_rows = 0
+
+    # Запись
+
+    def append(self, table, column_names, data, token=None):
+        """
+        Сохранение пакета
+
+        Args:
+            table: Имя таблицы
+            column_names: Имена колонок или None для позиционной вставки строк
+            data: Список колонок (колоночный пакет) или список кортежей (если column_names is None)
+            token: Токен дедупликации пакета (по умолчанию генерируется)
+        """
+        if column_names is None:
+            columns = [list(c) for c in zip(*data)]
+            rows = len(data)
+        else:
+            columns = list(data)
+            rows = len(columns[0]) if columns else 0
+
+        if not rows:
+            return
+
+        layout = []
+        chunks = []
+        offset = 0
+        for column in columns:
+            kind, parts = encode_column(column)
+            lengths = []
+            for part in parts:
+                padded = _pad(part)
+                chunks.append(padded)
+                lengths.append(len(part))
+                offset += len(padded)
+            layout.append({'kind': kind, 'lengths': lengths})
+
+        header = json.dumps({
+            'table': table,
+            'columns': column_names,
+            'rows': rows,
+            'token': token or uuid.uuid4().hex,
+            'created': int(datetime.now().timestamp() * 1000),
+            'layout': layout,
+            'payload_bytes': offset,
+        }).encode()
+        header = _pad(header)
+
+        with self._lock:
+            segment = self._segment_for_write()
+            segment.write(RECORD_HEADER.pack(MAGIC, len(header)))
+            segment.write(header)
+            for chunk in chunks:
+                segment.write(chunk)
+            segment.flush()
+            os.fsync(segment.fileno())
+
+            if segment.tell() >= self.max_segment_bytes:
+                self._close_active()
+
+            self.spilled_rows += rows
+
+        logger.warning(f"⚠️ Spilled {rows} rows for {table} to {self._active_path or self.directory}")
+
+    def has_pending(self):
+        """Есть ли недосланные сегменты (включая текущий)"""
+        return self.pending_segments() > 0
+
+    def pending_segments(self):
+        return sum(1 for n in os.listdir(self.directory) if n.startswith('spill-') and n.endswith('.seg'))
+
+    # Досылка
+
+    def replay(self, ch_client, max_rows=None):
+        """
+        Досылка сохраненных пакетов
+
+        Args:
+            ch_client: ClickHouseClient
+            max_rows: Ограничение строк за один вызов (None - все)
+
+        Returns:
+            bool: False, если досылка прервана ошибкой
+        """
+        with self._lock:
+            # Активный сегмент закрываем, чтобы досылать только неизменяемые файлы
+            self._close_active()
+            budget = max_rows
+
+            for path in self._segments():
+                try:
+                    sent = self._replay_segment(ch_client, path, budget)
+                except Exception as e:
+                    logger.error(f"❌ Spill replay failed for {os.path.basename(path)}: {e}")
+                    return False
+
+                # Лимит исчерпан - продолжим при следующем вызове
+                if sent is None:
+                    return True
+                if budget is not None:
+                    budget -= sent
+                    if budget <= 0:
+                        return True
+
+            return True
+
+    def _replay_segment(self, ch_client, path, budget):
+        """Досылка одного сегмента. Возвращает число строк или None, если сегмент не закончен"""
+        done_path = path[:-4] + '.done'
+        done = set()
+        if os.path.exists(done_path):
+            with open(done_path) as f:
+                done = {line.strip() for line in f if line.strip()}
+
+        sent = 0
+        if os.path.getsize(path) == 0:
+            self._remove_segment(path, done_path)
+            return sent
+
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            records = [r for r in read_records(mm) if r['token'] not in done]
+
+            for group in group_records(records, self.replay_batch_rows):
+                if budget is not None and sent >= budget:
+                    return None
+
+                # Исключение держит ссылки на массивы поверх mmap и не дает его закрыть,
+                # поэтому наружу передаем только текст ошибки
+                error = None
+                try:
+                    self._insert_group(ch_client, mm, group)
+                except Exception as e:
+                    error = str(e) or type(e).__name__
+                if error:
+                    raise RuntimeError(error)
+
+                tokens = [r['token'] for r in group]
+
+                with open(done_path, 'a') as done_file:
+                    done_file.write('\n'.join(tokens) + '\n')
+                    done_file.flush()
+                    os.fsync(done_file.fileno())
+
+                rows = sum(r['rows'] for r in group)
+                sent += rows
+                self.replayed_rows += rows
+
+            del records
+
+        self._remove_segment(path, done_path)
+        logger.info(f"✅ Spill segment {os.path.basename(path)} replayed ({sent} rows)")
+        return sent
+
+    def _insert_group(self, ch_client, mm, group):
+        first = group[0]
+        table, column_names = first['table'], first['columns']
+        token = group_token(group)
+
+        decoded = [decode_record(mm, r) for r in group]
+        if column_names is None:
+            rows = []
+            for columns in decoded:
+                columns = [c.tolist() if isinstance(c, np.ndarray) else list(c) for c in columns]
+                rows.extend(zip(*columns))
+            ch_client.insert_data(table, rows, dedup_token=token)
+        else:
+            columns = [concat_columns([c[j] for c in decoded]) for j in range(len(column_names))]
+            ch_client.insert_columns(table, column_names, columns, dedup_token=token)
+
+    # Сегменты
+
+    def _segments(self):
+        names = sorted(n for n in os.listdir(self.directory) if n.startswith('spill-') and n.endswith('.seg'))
+        paths = [os.path.join(self.directory, n) for n in names]
+        return [p for p in paths if p != self._active_path]
+
+    def _segment_for_write(self):
+        if self._active is None:
+            existing = sorted(n for n in os.listdir(self.directory) if n.endswith('.seg'))
+            seq = int(existing[-1][6:14]) + 1 if existing else 1
+            self._active_path = os.path.join(self.directory, f"spill-{seq:08d}.seg")
+            self._active = open(self._active_path, 'ab')
+        return self._active
+
+    def _close_active(self):
+        if self._active is not None:
+            self._active.close()
+            self._active = None
+            self._active_path = None
+
+    def _remove_segment(self, path, done_path):
+        os.remove(path)
+        if os.path.exists(done_path):
+            os.remove(done_path)
+
+    def close(self):
+        with self._lock:
+            self._close_active()
+
+
+# Кодирование колонок
+
+def encode_column(column):
+    """Колонка -> (kind, [bytes...])"""
+    if isinstance(column, pd.DatetimeIndex):
+        ms = column.as_unit('ms').asi8
+        return 'datetime_ms', [np.ascontiguousarray(ms, dtype='<i8').tobytes()]
+
+    if isinstance(column, np.ndarray) and column.dtype != object:
+        array = np.ascontiguousarray(column)
+        return f"np:{array.dtype.str}", [array.tobytes()]
+
+    values = list(column)
+    sample = next((v for v in values if v is not None), None)
+
+    if isinstance(sample, datetime):
+        if sample.tzinfo is None:
+            # Naive время (время сервера ClickHouse) сохраняется как есть, без пересчета из локального пояса
+            ms = [int(v.replace(tzinfo=timezone.utc).timestamp() * 1000) if v is not None else NAT_MS
+                  for v in values]
+            return 'naive_datetime_ms', [np.array(ms, dtype='<i8').tobytes()]
+        ms = [int(v.timestamp() * 1000) if v is not None else NAT_MS for v in values]
+        return 'pydatetime_ms', [np.array(ms, dtype='<i8').tobytes()]
+
+    if isinstance(sample, bool) or not isinstance(sample, (int, float, str)) or \
+            any(v is not None and type(v) is not type(sample) for v in values):
+        encoded = json.dumps(values, default=str).encode()
+        return 'json', [encoded]
+
+    if isinstance(sample, float) and None not in values:
+        return 'np:<f8', [np.array(values, dtype='<f8').tobytes()]
+
+    if isinstance(sample, int) and None not in values:
+        return 'np:<i8', [np.array(values, dtype='<i8').tobytes()]
+
+    if isinstance(sample, str) and None not in values:
+        encoded = [v.encode() for v in values]
+        offsets = np.zeros(len(encoded) + 1, dtype='<i8')
+        np.cumsum([len(v) for v in encoded], out=offsets[1:])
+        return 'str', [offsets.tobytes(), b''.join(encoded)]
+
+    encoded = json.dumps(values).encode()
+    return 'json', [encoded]
+
+
+NAT_MS = np.iinfo(np.int64).min
+
+
+def decode_column(mm, kind, parts):
+    """Части колонки из mmap -> значения для вставки (числовые массивы без копирования)"""
+    if kind.startswith('np:'):
+        dtype, (offset, length) = np.dtype(kind[3:]), parts[0]
+        return np.frombuffer(mm, dtype=dtype, count=length // dtype.itemsize, offset=offset)
+
+    if kind in ('datetime_ms', 'pydatetime_ms', 'naive_datetime_ms'):
+        offset, length = parts[0]
+        ms = np.frombuffer(mm, dtype='<i8', count=length // 8, offset=offset)
+        if kind == 'datetime_ms':
+            values = np.where(ms == NAT_MS, np.nan, ms)
+            return pd.to_datetime(values, unit='ms', utc=True)
+        # Aware значения возвращаются в UTC: naive локальное время драйвер прочитал бы как время сервера
+        values = [datetime.fromtimestamp(v / 1000, tz=timezone.utc) if v != NAT_MS else None for v in ms.tolist()]
+        if kind == 'naive_datetime_ms':
+            return [v.replace(tzinfo=None) if v is not None else None for v in values]
+        return values
+
+    if kind == 'str':
+        (offsets_at, offsets_len), (data_at, data_len) = parts
+        offsets = np.frombuffer(mm, dtype='<i8', count=offsets_len // 8, offset=offsets_at).tolist()
+        data = mm[data_at:data_at + data_len]
+        return np.array([data[offsets[i]:offsets[i + 1]].decode() for i in range(len(offsets) - 1)], dtype=object)
+
+    if kind == 'json':
+        offset, length = parts[0]
+        return json.loads(mm[offset:offset + length])
+
+    raise ValueError(f"Unknown spill column kind: {kind}")
+
+
+def read_records(mm):
+    """Заголовки записей сегмента с абсолютными смещениями колонок"""
+    records = []
+    position = 0
+    size = len(mm)
+
+    while position + RECORD_HEADER.size <= size:
+        magic, header_len = RECORD_HEADER.unpack_from(mm, position)
+        if magic != MAGIC:
+            logger.error(f"❌ Corrupted spill record at offset {position}, rest of segment skipped")
+            break
+
+        header_at = position + RECORD_HEADER.size
+        payload_at = header_at + header_len
+        if payload_at > size:
+            break
+
+        header = json.loads(bytes(mm[header_at:payload_at]).rstrip(b' '))
+        end = payload_at + header['payload_bytes']
+        if end > size:
+            # Запись оборвалась при аварийном завершении
+            logger.error(f"❌ Truncated spill record at offset {position}, rest of segment skipped")
+            break
+
+        cursor = payload_at
+        columns = []
+        for column in header['layout']:
+            parts = []
+            for length in column['lengths']:
+                parts.append((cursor, length))
+                cursor += _padded_length(length)
+            columns.append((column['kind'], parts))
+
+        header['columns_layout'] = columns
+        records.append(header)
+        position = end
+
+    return records
+
+
+def decode_record(mm, record):
+    return [decode_column(mm, kind, parts) for kind, parts in record['columns_layout']]
+
+
+def group_records(records, max_rows):
+    """Последовательные записи одной таблицы и набора колонок объединяются в пачки"""
+    group = []
+    rows = 0
+    for record in records:
+        key = (record['table'], record['columns'])
+        if group and ((group[0]['table'], group[0]['columns']) != key or rows + record['rows'] > max_rows):
+            yield group
+            group, rows = [], 0
+        group.append(record)
+        rows += record['rows']
+    if group:
+        yield group
+
+
+def group_token(group):
+    """Детерминированный токен пачки: совпадает при повторной досылке тех же записей"""
+    if len(group) == 1:
+        return group[0]['token']
+    return hashlib.sha1(','.join(r['token'] for r in group).encode()).hexdigest()
+
+
+def concat_columns(parts):
+    if len(parts) == 1:
+        return parts[0]
+    first = parts[0]
+    if isinstance(first, pd.DatetimeIndex):
+        return first.append(list(parts[1:]))
+    if isinstance(first, np.ndarray):
+        return np.concatenate(parts)
+    return [v for part in parts for v in part]
+
+
+def _padded_length(length):
+    return (length + ALIGN - 1) // ALIGN * ALIGN
+
+
+def _pad(data):
+    padding = _padded_length(len(data)) - len(data)
+    # Пробелы безопасны и для JSON заголовка, и для бинарных колонок
+    return data + b' ' * padding
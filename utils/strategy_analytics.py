@@ -0,0 +1,316 @@
+import json
+import logging
+import math
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime(1970, 1, 1)
+SECONDS_PER_YEAR = 365 * 24 * 3600
+
+# Остаток позиции меньше этого считается закрытой позицией (погрешность float)
+QTY_EPSILON = 1e-12
+
+TRADES_QUERY = """
+    SELECT timestamp, trade_id, strategy, symbol, side, price, quantity
+    FROM trades
+    WHERE (timestamp > %(ts)s OR (timestamp = %(ts)s AND trade_id > %(trade_id)s))
+      AND timestamp <= now() - INTERVAL %(settle)s SECOND
+    ORDER BY timestamp, trade_id
+    LIMIT %(limit)s
+"""
+
+
+def epoch_seconds(ts):
+    """DateTime из ClickHouse (naive, UTC) -> epoch-секунды"""
+    return int(ts.replace(tzinfo=timezone.utc).timestamp())
+
+
+class StrategyState:
+    """
+    Текущее состояние одной стратегии.
+
+    Позиции ведутся по средней цене входа: сделка в сторону позиции
+    увеличивает ее и пересчитывает среднюю, сделка против позиции
+    закрывает часть (или всю позицию с переворотом) и фиксирует PnL.
+    Закрывающая сделка считается в total_trades, прибыльная - еще и в
+    winning_trades.
+
+    Equity = реализованный PnL + нереализованный по последней цене сделки
+    символа (других цен у аналитики нет). От equity считаются максимум
+    (high-water mark) и максимальная просадка, а доходности для Sharpe -
+    приросты equity за период: среднее и сумма квадратов отклонений
+    обновляются по Уэлфорду, без хранения ряда доходностей.
+    """
+
+    __slots__ = ('positions', 'realized', 'unrealized', 'high_water', 'max_drawdown',
+                 'total_trades', 'winning_trades', 'period', 'period_equity',
+                 'returns', 'mean', 'm2', 'last_trade')
+
+    def __init__(self):
+        # symbol -> [количество со знаком, средняя цена входа, последняя цена]
+        self.positions = {}
+        self.realized = 0.0
+        self.unrealized = 0.0
+        self.high_water = 0.0
+        self.max_drawdown = 0.0
+        self.total_trades = 0
+        self.winning_trades = 0
+
+        # Текущий период (номер от epoch) и equity на его начало
+        self.period = None
+        self.period_equity = 0.0
+
+        # Моменты доходностей закрытых периодов
+        self.returns = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+        self.last_trade = None
+
+    @property
+    def equity(self):
+        return self.realized + self.unrealized
+
+    def apply(self, symbol, side, price, quantity):
+        """Учет сделки"""
+        position = self.positions.get(symbol)
+        if position is None:
+            position = self.positions[symbol] = [0.0, 0.0, price]
+        qty, avg, last = position
+        self.unrealized -= qty * (last - avg)
+
+        signed = quantity if side.lower() == 'buy' else -quantity
+        if qty == 0.0 or (qty > 0) == (signed > 0):
+            # Открытие или увеличение позиции
+            total = qty + signed
+            avg = (abs(qty) * avg + quantity * price) / abs(total) if total else 0.0
+            qty = total
+        else:
+            # Закрытие: частичное, полное или с переворотом позиции
+            closed = min(abs(qty), quantity)
+            pnl = closed * (price - avg) * (1.0 if qty > 0 else -1.0)
+            self.realized += pnl
+            self.total_trades += 1
+            if pnl > 0:
+                self.winning_trades += 1
+
+            qty += signed
+            if abs(qty) < QTY_EPSILON:
+                qty, avg = 0.0, 0.0
+            elif (qty > 0) == (signed > 0):
+                avg = price
+
+        position[:] = (qty, avg, price)
+        self.unrealized += qty * (price - avg)
+
+        equity = self.equity
+        if equity > self.high_water:
+            self.high_water = equity
+        self.max_drawdown = max(self.max_drawdown, self.high_water - equity)
+
+    def close_periods(self, period):
+        """
+        Закрытие периодов до period (не включая)
+
+        Returns:
+            True, если был закрыт хотя бы один период
+        """
+        if self.period is None:
+            self.period = period
+            self.period_equity = self.equity
+            return False
+        if period <= self.period:
+            return False
+
+        equity = self.equity
+        self._add_returns(1, equity - self.period_equity)
+        # Периоды без сделок - нулевые доходности
+        self._add_returns(period - self.period - 1, 0.0)
+        self.period = period
+        self.period_equity = equity
+        return True
+
+    def _add_returns(self, count, value):
+        # Объединение моментов с count одинаковыми значениями value (Chan et al.)
+        if count <= 0:
+            return
+        total = self.returns + count
+        delta = value - self.mean
+        self.mean += delta * count / total
+        self.m2 += delta * delta * self.returns * count / total
+        self.returns = total
+
+    def sharpe(self, periods_per_year):
+        """Годовой Sharpe по приростам equity закрытых периодов (без безрисковой ставки)"""
+        if self.returns < 2:
+            return 0.0
+        std = math.sqrt(self.m2 / (self.returns - 1))
+        if std <= 0.0:
+            return 0.0
+        return self.mean / std * math.sqrt(periods_per_year)
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data):
+        state = cls()
+        for name in cls.__slots__:
+            if name in data:
+                setattr(state, name, data[name])
+        return state
+
+
+class StrategyAnalytics:
+    """
+    Инкрементальный расчет strategy_metrics по таблице trades.
+
+    Сделки читаются по возрастанию (timestamp, trade_id) начиная с
+    водяного знака - последней обработанной сделки, поэтому каждый запуск
+    читает только новые строки, а не всю историю. Сделки моложе
+    settle_seconds не читаются: так вставки с небольшой задержкой не
+    оказываются позади водяного знака. Сделки, записанные с временем
+    раньше водяного знака, в расчет не попадают.
+
+    Снимок метрик стратегии пишется в strategy_metrics при закрытии
+    каждого периода (время снимка - последняя секунда периода) и в конце
+    запуска, если у стратегии были новые сделки. Отчеты берут последнюю
+    строку стратегии (argMax по timestamp).
+
+    Состояние стратегий и водяной знак сохраняются в JSON после записи
+    снимков пачки. При сбое между записью и сохранением пачка будет
+    обработана повторно с теми же снимками, и ClickHouse отбросит их
+    повторную вставку по токену дедупликации (хешу содержимого).
+    """
+
+    def __init__(self, ch_client, state_path, period_seconds=3600, settle_seconds=60, batch_rows=100000):
+        """
+        Args:
+            ch_client: Клиент ClickHouse
+            state_path: Файл состояния (JSON)
+            period_seconds: Период доходностей и снимков (сек)
+            settle_seconds: Минимальный возраст обрабатываемой сделки (сек)
+            batch_rows: Сделок в одном запросе
+        """
+        self.ch = ch_client
+        self.state_path = state_path
+        self.period_seconds = period_seconds
+        self.settle_seconds = settle_seconds
+        self.batch_rows = batch_rows
+        self.periods_per_year = SECONDS_PER_YEAR / period_seconds
+
+        self.strategies = {}
+        self.watermark = (EPOCH, '')
+        self._stop = threading.Event()
+        self.load_state()
+
+    def load_state(self):
+        try:
+            with open(self.state_path, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        if data.get('period_seconds') != self.period_seconds:
+            raise ValueError(f"State {self.state_path} was built with period "
+                             f"{data.get('period_seconds')}s, not {self.period_seconds}s")
+        self.watermark = (datetime.fromisoformat(data['watermark'][0]), data['watermark'][1])
+        self.strategies = {name: StrategyState.from_dict(s) for name, s in data['strategies'].items()}
+
+    def save_state(self):
+        # Через временный файл: при сбое остается предыдущее целое состояние
+        directory = os.path.dirname(self.state_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'period_seconds': self.period_seconds,
+                'watermark': [self.watermark[0].isoformat(), self.watermark[1]],
+                'strategies': {name: s.to_dict() for name, s in self.strategies.items()},
+            }, f)
+        os.replace(tmp_path, self.state_path)
+
+    def snapshot(self, name, state, ts):
+        """Строка strategy_metrics: (timestamp, strategy, pnl, drawdown, sharpe_ratio, total_trades, winning_trades)"""
+        return (ts, name, state.equity, state.max_drawdown, state.sharpe(self.periods_per_year),
+                state.total_trades, state.winning_trades)
+
+    def process(self, trades):
+        """
+        Учет пачки сделок, упорядоченной по (timestamp, trade_id)
+
+        Returns:
+            Строки снимков для strategy_metrics
+        """
+        snapshots = []
+        period_seconds = self.period_seconds
+        for ts, trade_id, strategy, symbol, side, price, quantity in trades:
+            state = self.strategies.get(strategy)
+            if state is None:
+                state = self.strategies[strategy] = StrategyState()
+
+            previous = state.period
+            if state.close_periods(epoch_seconds(ts) // period_seconds):
+                boundary = EPOCH + timedelta(seconds=(previous + 1) * period_seconds - 1)
+                snapshots.append(self.snapshot(strategy, state, boundary))
+
+            state.apply(symbol, side, price, quantity)
+            state.last_trade = ts.isoformat()
+
+        if trades:
+            self.watermark = (trades[-1][0], trades[-1][1])
+        return snapshots
+
+    def run_once(self):
+        """
+        Обработка всех накопившихся сделок
+
+        Returns:
+            Количество обработанных сделок
+        """
+        processed = 0
+        changed = set()
+        while True:
+            trades = self.ch.execute(TRADES_QUERY, {
+                'ts': self.watermark[0],
+                'trade_id': self.watermark[1],
+                'settle': self.settle_seconds,
+                'limit': self.batch_rows,
+            })
+            snapshots = self.process(trades)
+            changed.update(t[2] for t in trades)
+            processed += len(trades)
+            last = len(trades) < self.batch_rows
+            if last and changed:
+                # Итоговый снимок стратегий с новыми сделками на время их последней сделки
+                snapshots.extend(self.snapshot(name, self.strategies[name],
+                                               datetime.fromisoformat(self.strategies[name].last_trade))
+                                 for name in sorted(changed))
+
+            if snapshots:
+                self.ch.insert_data('strategy_metrics', snapshots)
+            if trades:
+                self.save_state()
+            if last:
+                break
+
+        if processed:
+            logger.info(f"📈 Strategy analytics: {processed} trades, {len(changed)} strategies, "
+                        f"watermark {self.watermark[0]}")
+        return processed
+
+    def run_forever(self, interval):
+        """Периодический запуск run_once до stop()"""
+        self._stop.clear()
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"❌ Strategy analytics update failed: {e}")
+            self._stop.wait(interval)
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,350 @@
+import json
+import logging
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pybit.unified_trading import WebSocket
+
+from utils.symbol_registry import unsubscribe_topics
+
+logger = logging.getLogger(__name__)
+
+TOPIC = "tickers.{symbol}"
+
+# Ограничения Bybit для публичных соединений:
+#   spot   - не больше 10 args в одном запросе подписки
+#   все    - суммарная длина args соединения не больше 21000 символов
+ARGS_PER_REQUEST = {'spot': 10, 'linear': 1000}
+MAX_ARGS_CHARS = 21000
+
+
+class Connection:
+    """Одно WebSocket соединение и его подписки"""
+
+    def __init__(self, index, symbols):
+        self.index = index
+        self.symbols = list(symbols)
+        self.ws = None
+        self.connect_seconds = 0.0
+
+    @property
+    def args_chars(self):
+        # args передаются JSON строками: кавычки и запятая на каждый топик
+        return sum(len(TOPIC.format(symbol=s)) + 3 for s in self.symbols)
+
+
+class SubscriptionPlanner:
+    """
+    Подписка на тикеры через несколько соединений.
+
+    Символы раскладываются по соединениям не больше topics_per_connection
+    и MAX_ARGS_CHARS на соединение, соединения открываются параллельно,
+    а запросы подписки (по ARGS_PER_REQUEST args) отправляются сразу,
+    без пауз. Успех каждого запроса подтверждается ответом сервера
+    (op=subscribe, success) по req_id: для этого у соединения подменяется
+    _process_subscription_message.
+
+    Для каждого символа запоминается время от начала подписки до первого
+    сообщения (time-to-first-message).
+    """
+
+    def __init__(self, channel_type, callback, topics_per_connection=200, max_connections=16,
+                 ack_timeout=10, on_connection=None, on_first_message=None, testnet=False):
+        """
+        Args:
+            channel_type: Тип канала pybit (linear, spot)
+            callback: Обработчик тикеров
+            topics_per_connection: Максимум символов на соединение
+            max_connections: Максимум одновременно открываемых соединений
+            ack_timeout: Ожидание подтверждения подписки (сек)
+            on_connection: Функция on_connection(ws), вызывается для каждого нового соединения
+            on_first_message: Функция on_first_message(symbol, seconds) - первое сообщение символа
+            testnet: Тестовая сеть Bybit
+        """
+        self.channel_type = channel_type
+        self.callback = callback
+        self.topics_per_connection = topics_per_connection
+        self.max_connections = max_connections
+        self.args_per_request = ARGS_PER_REQUEST.get(channel_type, 10)
+        self.ack_timeout = ack_timeout
+        self.on_connection = on_connection
+        self.on_first_message = on_first_message
+        self.testnet = testnet
+
+        self.connections = []
+        self._lock = threading.Lock()
+        self._acks = {}
+        self._acks_changed = threading.Condition()
+        # Выполняющихся _subscribe: ответы сохраняются только пока их кто-то ждет
+        self._subscribing = 0
+
+        # time-to-first-message: символ -> время запроса подписки
+        self.started_at = None
+        self._awaiting_first = {}
+        self.first_message = {}
+
+    def plan(self, symbols):
+        """Раскладка символов по соединениям"""
+        per_connection = max(1, self.topics_per_connection)
+        connections = []
+        current = []
+        chars = 0
+        for symbol in symbols:
+            size = len(TOPIC.format(symbol=symbol)) + 3
+            if current and (len(current) >= per_connection or chars + size > MAX_ARGS_CHARS):
+                connections.append(current)
+                current, chars = [], 0
+            current.append(symbol)
+            chars += size
+        if current:
+            connections.append(current)
+
+        # Равномерно по соединениям: 450 символов при лимите 200 - три по 150, а не 200+200+50
+        if len(connections) > 1:
+            total = sum(len(c) for c in connections)
+            size = math.ceil(total / len(connections))
+            flat = [s for c in connections for s in c]
+            connections = [flat[i:i + size] for i in range(0, total, size)]
+        return connections
+
+    def start(self, symbols):
+        """
+        Открытие соединений и подписка на символы
+
+        Returns:
+            dict: Отчет о подписке (см. report())
+        """
+        now = time.monotonic()
+        if self.started_at is None:
+            self.started_at = now
+        with self._lock:
+            self._awaiting_first.update(dict.fromkeys(symbols, now))
+
+        plan = self.plan(symbols)
+        connections = [Connection(len(self.connections) + i, chunk) for i, chunk in enumerate(plan)]
+        workers = max(1, min(self.max_connections, len(connections)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"ws-{self.channel_type}") as executor:
+            results = list(executor.map(self._open, connections))
+
+        failed = []
+        for connection, rejected in zip(connections, results):
+            if connection.ws is not None:
+                self.connections.append(connection)
+            failed.extend(rejected)
+
+        report = self.report()
+        report['failed'] = failed
+        return report
+
+    def subscribe(self, symbols):
+        """
+        Подписка на символы на открытых соединениях (новые соединения - если места нет)
+
+        Returns:
+            list: Символы, подписку на которые сервер не подтвердил
+        """
+        symbols = [s for s in symbols if not any(s in c.symbols for c in self.connections)]
+        if not symbols:
+            return []
+        with self._lock:
+            self._awaiting_first.update(dict.fromkeys(symbols, time.monotonic()))
+
+        failed = []
+        remaining = list(symbols)
+        for connection in sorted(self.connections, key=lambda c: len(c.symbols)):
+            room = self.topics_per_connection - len(connection.symbols)
+            chunk = []
+            chars = connection.args_chars
+            while remaining and len(chunk) < room:
+                size = len(TOPIC.format(symbol=remaining[0])) + 3
+                if chars + size > MAX_ARGS_CHARS:
+                    break
+                chars += size
+                chunk.append(remaining.pop(0))
+            if chunk:
+                connection.symbols.extend(chunk)
+                failed.extend(self._subscribe(connection, chunk))
+            if not remaining:
+                break
+
+        if remaining:
+            failed.extend(self.start(remaining)['failed'])
+        return failed
+
+    def unsubscribe(self, symbols):
+        """Отписка от символов на их соединениях"""
+        symbols = set(symbols)
+        for connection in self.connections:
+            removed = [s for s in connection.symbols if s in symbols]
+            if not removed:
+                continue
+            unsubscribe_topics(connection.ws, [TOPIC.format(symbol=s) for s in removed])
+            connection.symbols = [s for s in connection.symbols if s not in symbols]
+        with self._lock:
+            for symbol in symbols:
+                self._awaiting_first.pop(symbol, None)
+
+    def exit(self):
+        """Закрытие всех соединений"""
+        for connection in self.connections:
+            try:
+                connection.ws.exit()
+            except Exception as e:
+                logger.error(f"❌ Error closing WebSocket #{connection.index}: {e}")
+
+    def on_message(self, message):
+        """Обработчик тикеров с учетом первого сообщения символа"""
+        if self._awaiting_first:
+            symbol = message.get('topic', '')[len('tickers.'):]
+            if symbol in self._awaiting_first:
+                self._record_first_message(symbol)
+        self.callback(message)
+
+    def _record_first_message(self, symbol):
+        with self._lock:
+            requested = self._awaiting_first.pop(symbol, None)
+            if requested is None:
+                return
+            seconds = self.first_message[symbol] = time.monotonic() - requested
+        if self.on_first_message:
+            self.on_first_message(symbol, seconds)
+
+    def report(self):
+        """Время до первого сообщения по символам и символы, по которым сообщений еще нет"""
+        with self._lock:
+            delays = sorted(self.first_message.values())
+            waiting = sorted(self._awaiting_first)
+
+        def quantile(q):
+            return delays[min(len(delays) - 1, int(q * len(delays)))] if delays else None
+
+        return {
+            'connections': [{'index': c.index, 'symbols': len(c.symbols), 'connect_seconds': c.connect_seconds}
+                            for c in self.connections],
+            'received': len(delays),
+            'waiting': waiting,
+            'first_message_p50': quantile(0.5),
+            'first_message_p95': quantile(0.95),
+            'first_message_max': delays[-1] if delays else None,
+        }
+
+    def _open(self, connection):
+        """Открытие соединения и подписка (выполняется параллельно для всех соединений)"""
+        started = time.monotonic()
+        try:
+            ws = WebSocket(testnet=self.testnet, channel_type=self.channel_type)
+        except Exception as e:
+            logger.error(f"❌ WebSocket #{connection.index} connection failed: {e}")
+            return list(connection.symbols)
+        connection.connect_seconds = time.monotonic() - started
+
+        self._track_acks(ws)
+        if self.on_connection:
+            self.on_connection(ws)
+        connection.ws = ws
+        return self._subscribe(connection, connection.symbols)
+
+    def _subscribe(self, connection, symbols, per_request=None, retry_rejected=True):
+        """
+        Отправка запросов подписки без пауз и ожидание подтверждений
+
+        Args:
+            per_request: Args в одном запросе (по умолчанию args_per_request канала)
+            retry_rejected: Отклоненные запросы повторяются по одному символу
+        """
+        per_request = per_request or self.args_per_request
+        with self._acks_changed:
+            self._subscribing += 1
+        try:
+            failed, rejected = self._send_and_confirm(connection, symbols, per_request, retry_rejected)
+        finally:
+            with self._acks_changed:
+                self._subscribing -= 1
+                # Никто больше не ждет: невостребованные ответы (переподписка pybit
+                # после переподключения) удаляются, чтобы _acks не рос
+                if not self._subscribing:
+                    self._acks.clear()
+
+        if rejected:
+            # Размер запроса передается параметром: соединения подписываются параллельно
+            failed.extend(self._subscribe(connection, rejected, per_request=1, retry_rejected=False))
+            return failed
+        if failed:
+            logger.error(f"❌ WebSocket #{connection.index}: subscription not confirmed for {failed}")
+            dropped = set(failed)
+            connection.symbols = [s for s in connection.symbols if s not in dropped]
+            with self._lock:
+                for symbol in dropped:
+                    self._awaiting_first.pop(symbol, None)
+        return failed
+
+    def _send_and_confirm(self, connection, symbols, per_request, retry_rejected):
+        """
+        Returns:
+            (неподтвержденные символы, символы отклоненных запросов для повтора по одному)
+        """
+        ws = connection.ws
+        requests = []
+        for i in range(0, len(symbols), per_request):
+            chunk = symbols[i:i + per_request]
+            known = set(ws.subscriptions)
+            try:
+                ws.ticker_stream(symbol=chunk, callback=self.on_message)
+            except Exception as e:
+                logger.error(f"❌ Error subscribing to {chunk}: {e}")
+                requests.append((None, chunk))
+                continue
+            # req_id генерирует pybit: это новый ключ ws.subscriptions
+            req_id = next((r for r in ws.subscriptions if r not in known), None)
+            requests.append((req_id, chunk))
+
+        failed = []
+        rejected = []
+        deadline = time.monotonic() + self.ack_timeout
+        for req_id, chunk in requests:
+            success = self._wait_ack(req_id, deadline) if req_id is not None else None
+            if success:
+                continue
+            # Сервер отклоняет весь запрос из-за одного неизвестного символа: остальные подписываются по одному
+            if success is False and retry_rejected and len(chunk) > 1:
+                rejected.extend(chunk)
+            else:
+                failed.extend(chunk)
+        return failed, rejected
+
+    def _track_acks(self, ws):
+        """Запоминание ответов на подписку по req_id"""
+        process = ws._process_subscription_message
+
+        def _process_subscription_message(message):
+            req_id = message.get('req_id')
+            success = bool(message.get('success'))
+            if req_id:
+                with self._acks_changed:
+                    if self._subscribing:
+                        self._acks[req_id] = success
+                        self._acks_changed.notify_all()
+
+            if not success and req_id in ws.subscriptions:
+                # pybit на отказ удаляет callback по topic[0] строки сообщения (KeyError), поэтому
+                # отклоненный запрос убирается здесь: иначе он повторялся бы при каждом переподключении
+                args = json.loads(ws.subscriptions.pop(req_id))['args']
+                for topic in args:
+                    ws.callback_directory.pop(topic, None)
+                logger.error(f"❌ Subscription rejected for {args}: {message.get('ret_msg')}")
+                return
+            process(message)
+
+        ws._process_subscription_message = _process_subscription_message
+
+    def _wait_ack(self, req_id, deadline):
+        """True/False - ответ сервера, None - ответа нет до deadline"""
+        with self._acks_changed:
+            while req_id not in self._acks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._acks_changed.wait(remaining)
+            return self._acks.pop(req_id)
@@ -0,0 +1,208 @@
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from uuid import uuid4
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+INSTRUMENTS_URL = "https://api.bybit.com/v5/market/instruments-info"
+
+
+class SymbolRegistry:
+    """
+    Список торгуемых символов категории Bybit.
+
+    instruments-info запрашивается постранично (cursor) через одну
+    keep-alive сессию, полный список кэшируется на диске: перезапуск в
+    пределах cache_ttl не ходит в API. Фоновый поток раз в
+    refresh_interval секунд перечитывает список и сообщает о новых и
+    снятых с торгов символах, чтобы стример подписался на них без
+    переподключения.
+
+    Если задан шард, в registry.symbols попадают только символы шарда
+    (тот же crc32, что в ingest_supervisor.partition_symbols).
+    """
+
+    def __init__(self, category, quote_coin='USDT', cache_dir=os.path.join('data', 'symbols'),
+                 cache_ttl=3600, refresh_interval=900, shard_id=0, shards=1, timeout=10, page_limit=1000):
+        """
+        Args:
+            category: Категория Bybit (linear, spot)
+            quote_coin: Валюта котировки
+            cache_dir: Каталог кэша списков символов
+            cache_ttl: Время, в течение которого кэш используется без запроса к API (сек)
+            refresh_interval: Период проверки новых и снятых символов (сек)
+            shard_id: Номер шарда
+            shards: Количество шардов категории
+            timeout: Таймаут HTTP запроса (сек)
+            page_limit: Размер страницы instruments-info
+        """
+        self.category = category
+        self.quote_coin = quote_coin
+        self.cache_path = os.path.join(cache_dir, f"{category}-{quote_coin.lower()}.json")
+        self.cache_ttl = cache_ttl
+        self.refresh_interval = refresh_interval
+        self.shard_id = shard_id
+        self.shards = shards
+        self.timeout = timeout
+        self.page_limit = page_limit
+
+        self.session = requests.Session()
+        self.symbols = []
+        self._stop = threading.Event()
+        self.thread = None
+
+    def owns(self, symbol):
+        """Символ относится к шарду"""
+        return self.shards <= 1 or zlib.crc32(symbol.encode()) % self.shards == self.shard_id
+
+    def fetch(self):
+        """Полный список торгуемых символов из API (все страницы)"""
+        symbols = []
+        params = {'category': self.category, 'limit': self.page_limit}
+        while True:
+            response = self.session.get(INSTRUMENTS_URL, params=params, timeout=self.timeout)
+            response.raise_for_status()
+            body = response.json()
+            if body.get('retCode') != 0:
+                raise RuntimeError(f"instruments-info error {body.get('retCode')}: {body.get('retMsg')}")
+
+            result = body.get('result', {})
+            symbols.extend(s['symbol'] for s in result.get('list', [])
+                           if s.get('quoteCoin') == self.quote_coin and s.get('status') == 'Trading')
+
+            # spot отдает все инструменты одной страницей без курсора
+            cursor = result.get('nextPageCursor')
+            if not cursor:
+                break
+            params['cursor'] = cursor
+
+        return sorted(set(symbols))
+
+    def load(self):
+        """
+        Символы шарда: из кэша, если он свежий, иначе из API
+
+        При недоступном API используется устаревший кэш.
+        """
+        cached, fetched_at = self._read_cache()
+        if cached is not None and time.time() - fetched_at < self.cache_ttl:
+            symbols = cached
+            logger.info(f"✅ {len(symbols)} {self.category} symbols loaded from cache")
+        else:
+            try:
+                symbols = self.fetch()
+                self._write_cache(symbols)
+            except Exception as e:
+                if cached is None:
+                    raise
+                logger.warning(f"⚠️ Symbol fetch failed, using cache from {time.ctime(fetched_at)}: {e}")
+                symbols = cached
+
+        self.symbols = [s for s in symbols if self.owns(s)]
+        return self.symbols
+
+    def refresh(self):
+        """
+        Перечитывание списка из API
+
+        Returns:
+            (added, removed): новые и снятые с торгов символы шарда
+        """
+        symbols = self.fetch()
+        self._write_cache(symbols)
+
+        current = set(self.symbols)
+        fresh = [s for s in symbols if self.owns(s)]
+        added = [s for s in fresh if s not in current]
+        fresh_set = set(fresh)
+        removed = [s for s in self.symbols if s not in fresh_set]
+        self.symbols = fresh
+        return added, removed
+
+    def start(self, on_change):
+        """
+        Запуск периодической проверки
+
+        Args:
+            on_change: Функция on_change(added, removed), вызывается из потока проверки
+        """
+        if self.thread and self.thread.is_alive():
+            return
+        self._stop.clear()
+        self.thread = threading.Thread(target=self._run, args=(on_change,),
+                                       name=f"symbols-{self.category}", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self.thread:
+            self.thread.join(self.timeout + 1)
+
+    def _run(self, on_change):
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                added, removed = self.refresh()
+            except Exception as e:
+                logger.error(f"❌ Symbol refresh failed for {self.category}: {e}")
+                continue
+            if added or removed:
+                logger.info(f"🔄 {self.category} symbols: +{len(added)} -{len(removed)}")
+                try:
+                    on_change(added, removed)
+                except Exception as e:
+                    logger.error(f"❌ Error applying {self.category} symbol changes: {e}")
+
+    def _read_cache(self):
+        try:
+            with open(self.cache_path, 'r') as f:
+                cache = json.load(f)
+            return cache['symbols'], cache['fetched_at']
+        except (OSError, ValueError, KeyError):
+            return None, 0.0
+
+    def _write_cache(self, symbols):
+        # Через временный файл: параллельно стартующие шарды не прочитают недописанный кэш
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'fetched_at': time.time(), 'symbols': symbols}, f)
+        os.replace(tmp_path, self.cache_path)
+
+
+def unsubscribe_topics(ws, topics):
+    """
+    Отписка от топиков на живом соединении pybit
+
+    pybit.unsubscribe() отправляет отписку от всего исходного сообщения
+    подписки (всей группы символов), поэтому отписка отправляется своим
+    сообщением, а сохраненные подписки переписываются без этих топиков,
+    чтобы pybit не подписался на них снова при переподключении.
+    Ответ сервера pybit не найдет среди своих подписок и запишет в лог
+    ошибку - это ожидаемо.
+    """
+    topics = set(topics)
+    if not topics:
+        return
+
+    ws.ws.send(json.dumps({'op': 'unsubscribe', 'req_id': str(uuid4()), 'args': sorted(topics)}))
+
+    for req_id, message in list(ws.subscriptions.items()):
+        subscription = json.loads(message)
+        args = [a for a in subscription['args'] if a not in topics]
+        if len(args) == len(subscription['args']):
+            continue
+        if args:
+            subscription['args'] = args
+            ws.subscriptions[req_id] = json.dumps(subscription)
+        else:
+            del ws.subscriptions[req_id]
+
+    for topic in topics:
+        ws.callback_directory.pop(topic, None)
+        ws.data.pop(topic, None)
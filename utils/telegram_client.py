@@ -1,12 +1,18 @@
 import os
+import html
 import logging
+import time
 from typing import Dict, List, Optional, Union
-from datetime import datetime
+from datetime import datetime, timezone
 import pandas as pd
 from telegram import Bot, Update
 from telegram.ext import Application, CommandHandler, ContextTypes
 import asyncio
 
+from utils.alert_aggregator import SEVERITY_ICONS
+from utils.bot_queries import create_bot_queries, process_stats
+from utils.telegram_dispatcher import get_dispatcher
+
 # Настройка логирования
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -14,6 +20,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Задержка данных тикеров, после которой поток считается остановленным (сек)
+STALE_SECONDS = 60
+
 
 class TelegramBot:
     def __init__(self, token: str, admin_chat_ids: List[int] = None):
@@ -28,11 +37,32 @@ class TelegramBot:
         self.admin_chat_ids = admin_chat_ids or []
         self.application = None
         self.bot = None
+        # Результаты запросов команд обновляются в фоне, команды читают кэш
+        self.queries = create_bot_queries()
+        self.started_at = time.time()
 
     async def initialize(self):
         """Асинхронная инициализация бота"""
+        return self.build_application()
+
+    def build_application(self, post_init=None):
+        """
+        Создание Application с обработчиками команд
+
+        Args:
+            post_init: Дополнительная корутина post_init(application) после запуска кэша запросов
+        """
+        async def on_start(application):
+            await self.queries.start()
+            if post_init:
+                await post_init(application)
+
         try:
-            self.application = Application.builder().token(self.token).build()
+            self.application = (Application.builder()
+                                .token(self.token)
+                                .post_init(on_start)
+                                .post_shutdown(self.queries.stop)
+                                .build())
             self.bot = self.application.bot
 
             # Регистрация обработчиков команд
@@ -66,17 +96,8 @@ class TelegramBot:
         Returns:
             bool: Успешность отправки
         """
-        try:
-            await self.bot.send_message(
-                chat_id=chat_id,
-                text=text,
-                parse_mode=parse_mode,
-                disable_notification=disable_notification
-            )
-            return True
-        except Exception as e:
-            logger.error(f"❌ Error sending message: {e}")
-            return False
+        future = get_dispatcher(self.token).submit(chat_id, text, parse_mode, disable_notification)
+        return await asyncio.wrap_future(future)
 
     async def send_message_to_admins(self,
                                      text: str,
@@ -88,27 +109,24 @@ class TelegramBot:
         Returns:
             Dict: {chat_id: success_status}
         """
-        results = {}
-        for chat_id in self.admin_chat_ids:
-            results[chat_id] = await self.send_message(
-                chat_id, text, parse_mode, disable_notification
-            )
-        return results
+        return await self.broadcast_message(self.admin_chat_ids, text, parse_mode, disable_notification)
 
     async def broadcast_message(self,
                                 chat_ids: List[int],
                                 text: str,
-                                parse_mode: str = 'HTML') -> Dict[int, bool]:
+                                parse_mode: str = 'HTML',
+                                disable_notification: bool = False) -> Dict[int, bool]:
         """
         Рассылка сообщения нескольким чатам
 
+        Сообщения отправляются параллельно общим диспетчером с учетом лимитов Telegram.
+
         Returns:
             Dict: {chat_id: success_status}
         """
-        results = {}
-        for chat_id in chat_ids:
-            results[chat_id] = await self.send_message(chat_id, text, parse_mode)
-        return results
+        futures = get_dispatcher(self.token).broadcast(chat_ids, text, parse_mode, disable_notification)
+        results = await asyncio.gather(*(asyncio.wrap_future(f) for f in futures.values()))
+        return dict(zip(futures, results))
 
     # Обработчики команд
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -134,25 +152,35 @@ class TelegramBot:
     async def stats_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /stats - статистика торговли"""
         try:
-            # Здесь будет интеграция с ClickHouse для получения статистики
-            stats_text = """
+            entry = await self.queries.get('stats')
+            if entry.value is None:
+                raise RuntimeError(entry.error)
+            stats = entry.value
+
+            stats_text = f"""
 📈 <b>Торговая статистика</b>
 
 <b>Общая информация:</b>
-• Активных пар: 15
-• Всего сделок: 1,247
-• Win Rate: 64.3%
+• Пар: {stats['total_symbols']:,}
+• Всего сделок: {stats['total_trades']:,}
 
 <b>За последние 24 часа:</b>
-• Сделок: 42
-• PnL: +2.34%
-• Объем: $124,567
-
-<b>Топ пары:</b>
-1. BTCUSDT: +1.2%
-2. ETHUSDT: +0.8%
-3. SOLUSDT: +0.5%
-            """
+• Сделок: {stats['day_trades']:,}
+• Пар: {stats['day_symbols']:,}
+• Объем: ${stats['day_volume']:,.0f}
+"""
+            if stats['top_symbols']:
+                stats_text += "\n<b>Топ пары по объему:</b>\n"
+                for i, (symbol, volume) in enumerate(stats['top_symbols'], 1):
+                    stats_text += f"{i}. {symbol}: ${volume:,.0f}\n"
+
+            if stats['strategies']:
+                stats_text += "\n<b>Стратегии:</b>\n"
+                for strategy, pnl, total, winning in stats['strategies']:
+                    win_rate = winning / total if total else 0.0
+                    stats_text += f"• {strategy}: PnL {pnl:+.2f}, сделок {total:,}, Win Rate {win_rate:.1%}\n"
+
+            stats_text += self._cache_note(entry)
             await update.message.reply_text(stats_text, parse_mode='HTML')
         except Exception as e:
             await self.send_error(update, f"Ошибка получения статистики: {e}")
@@ -160,21 +188,50 @@ class TelegramBot:
     async def status_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /status - статус системы"""
         try:
-            status_text = """
-🟢 <b>Статус системы</b>
-
-<b>Соединения:</b>
-• Bybit WebSocket: 🟢 Активно
-• ClickHouse DB: 🟢 Активно
-• Telegram Bot: 🟢 Активно
-
-<b>Производительность:</b>
-• Время работы: 12ч 34м
-• Память: 245 MB
-• CPU: 12%
-
-<b>Последняя проверка:</b> 2024-01-15 14:30:25 UTC
-            """
+            entry = await self.queries.get('status')
+            status = entry.value
+
+            if status is None:
+                status_text = f"🔴 <b>Статус системы</b>\n\n• ClickHouse DB: 🔴 {entry.error}\n"
+            else:
+                streams = status['streams']
+                healthy = all(s['lag_seconds'] is not None and s['lag_seconds'] < STALE_SECONDS
+                              for s in streams.values())
+                status_text = f"{'🟢' if healthy else '🟡'} <b>Статус системы</b>\n\n<b>Потоки тикеров:</b>\n"
+                for category, stream in streams.items():
+                    lag = stream['lag_seconds']
+                    icon = '🟢' if lag is not None and lag < STALE_SECONDS else '🔴'
+                    status_text += (f"• {category}: {icon} задержка {self._format_duration(lag)}, "
+                                    f"{stream['rows_5m']:,} строк / {stream['symbols_5m']:,} пар за 5 мин\n")
+
+                pool = status['pool']
+                status_text += (f"\n<b>ClickHouse:</b>\n"
+                                f"• Соединений: {pool['in_use']}/{pool['size']}, "
+                                f"ожидание {pool['avg_wait_ms']:.1f} мс\n"
+                                f"• Время сервера: {status['server_time']}\n")
+
+            ingest = await self.queries.get('ingest')
+            if ingest.value:
+                status_text += "\n<b>Шарды стриминга:</b>\n"
+                for name, shard in sorted(ingest.value.items()):
+                    status_text += (f"• {name}: {shard['rate']:,.0f} msg/s, {shard['symbols']} пар, "
+                                    f"lag p50/p99 {shard['lag_p50'] * 1000:.0f}/{shard['lag_p99'] * 1000:.0f} мс, "
+                                    f"insert p99 {shard['insert_p99'] * 1000:.0f} мс, "
+                                    f"очередь {shard['queue_depth'] or 0:,.0f}, "
+                                    f"переподключений {shard['reconnects']}\n")
+            elif ingest.value is not None:
+                status_text += "\n<b>Шарды стриминга:</b> 🔴 ни один не отвечает\n"
+
+            process = process_stats()
+            dispatcher = get_dispatcher(self.token).stats()
+            status_text += f"""
+<b>Бот:</b>
+• Время работы: {self._format_duration(time.time() - self.started_at)}
+• Память (пик): {process['max_rss_mb']:.0f} MB
+• CPU: {process['cpu_seconds']:.1f} с
+• Отправлено: {dispatcher['sent']:,}, в очереди {dispatcher['pending']}, ошибок {dispatcher['failed']}
+"""
+            status_text += self._cache_note(entry)
             await update.message.reply_text(status_text, parse_mode='HTML')
         except Exception as e:
             await self.send_error(update, f"Ошибка получения статуса: {e}")
@@ -182,19 +239,21 @@ class TelegramBot:
     async def alerts_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /alerts - последние алерты"""
         try:
-            alerts_text = """
-🚨 <b>Последние алерты</b>
-
-<b>Сегодня:</b>
-• 14:25: Переподключение WebSocket
-• 13:45: Новый сигнал BTCUSDT
-• 12:30: Обновление баланса
-
-<b>Вчера:</b>
-• 18:15: Деплой v1.2.3
-• 16:40: Резкий рост волатильности
-• 14:20: Обрыв соединения (восстановлено за 2.3с)
-            """
+            entry = await self.queries.get('alerts')
+            if entry.value is None:
+                raise RuntimeError(entry.error)
+
+            alerts_text = "🚨 <b>Последние алерты</b>\n\n"
+            if not entry.value:
+                alerts_text += "Алертов нет\n"
+            for timestamp, source, alert_type, severity, message in entry.value:
+                icon = SEVERITY_ICONS.get(severity, "📢")
+                # Сводки бывают длинными: в списке только первая строка
+                first_line = html.escape(message.split('\n', 1)[0][:200])
+                alerts_text += (f"{icon} {timestamp:%m-%d %H:%M:%S} <b>{html.escape(alert_type)}</b> "
+                                f"({html.escape(source)})\n{first_line}\n\n")
+
+            alerts_text += self._cache_note(entry)
             await update.message.reply_text(alerts_text, parse_mode='HTML')
         except Exception as e:
             await self.send_error(update, f"Ошибка получения алертов: {e}")
@@ -202,27 +261,65 @@ class TelegramBot:
     async def balance_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /balance - состояние баланса"""
         try:
-            balance_text = """
+            entry = await self.queries.get('balance')
+            if entry.error:
+                raise RuntimeError(entry.error)
+            account = entry.value
+            if account is None:
+                await update.message.reply_text(
+                    "💰 <b>Состояние баланса</b>\n\nAPI ключи Bybit не настроены (BYBIT_API_KEY, BYBIT_API_SECRET)",
+                    parse_mode='HTML')
+                return
+
+            balance_text = f"""
 💰 <b>Состояние баланса</b>
 
-<b>Bybit Main Account:</b>
-• Общий баланс: $15,247.89
-• Доступно: $8,123.45
-• В ордерах: $7,124.44
-• PnL сегодня: +$234.56 (+1.54%)
-
-<b>Распределение:</b>
-• USDT: 65.2%
-• BTC: 22.1%  
-• ETH: 8.7%
-• Другие: 4.0%
-
-<b>Последнее обновление:</b> 2024-01-15 14:28:10 UTC
-            """
+<b>Bybit Unified Account:</b>
+• Общий баланс: ${self._to_float(account.get('totalEquity')):,.2f}
+• Доступно: ${self._to_float(account.get('totalAvailableBalance')):,.2f}
+• Маржа в позициях: ${self._to_float(account.get('totalInitialMargin')):,.2f}
+• Нереализованный PnL: ${self._to_float(account.get('totalPerpUPL')):+,.2f}
+"""
+            total = self._to_float(account.get('totalEquity'))
+            coins = sorted(account.get('coin', []), key=lambda c: self._to_float(c.get('usdValue')), reverse=True)
+            if coins and total > 0:
+                balance_text += "\n<b>Распределение:</b>\n"
+                for coin in coins[:5]:
+                    balance_text += f"• {coin['coin']}: {self._to_float(coin.get('usdValue')) / total:.1%}\n"
+
+            balance_text += self._cache_note(entry)
             await update.message.reply_text(balance_text, parse_mode='HTML')
         except Exception as e:
             await self.send_error(update, f"Ошибка получения баланса: {e}")
 
+    @staticmethod
+    def _cache_note(entry):
+        """Время обновления данных из кэша"""
+        updated = datetime.fromtimestamp(entry.updated_at, tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')
+        note = f"\n<b>Обновлено:</b> {updated}"
+        if entry.error:
+            note += f"\n⚠️ <i>Последнее обновление не удалось: {html.escape(entry.error)}</i>"
+        return note
+
+    @staticmethod
+    def _format_duration(seconds):
+        if seconds is None:
+            return "нет данных"
+        seconds = int(seconds)
+        if seconds < 60:
+            return f"{seconds}с"
+        if seconds < 3600:
+            return f"{seconds // 60}м {seconds % 60}с"
+        return f"{seconds // 3600}ч {seconds % 3600 // 60}м"
+
+    @staticmethod
+    def _to_float(value):
+        # Bybit возвращает числа строками, пустая строка - отсутствие значения
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return 0.0
+
     async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /help"""
         help_text = """
@@ -264,14 +361,7 @@ class TelegramBot:
             message: Текст сообщения
             severity: Уровень важности (info, warning, error, critical)
         """
-        severity_icons = {
-            "info": "ℹ️",
-            "warning": "⚠️",
-            "error": "❌",
-            "critical": "🚨"
-        }
-
-        icon = severity_icons.get(severity, "📢")
+        icon = SEVERITY_ICONS.get(severity, "📢")
         alert_text = f"""
 {icon} <b>Алерт: {alert_type.upper()}</b>
 
@@ -0,0 +1,260 @@
+import asyncio
+import atexit
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from datetime import timedelta
+
+from telegram import Bot
+from telegram.error import NetworkError, RetryAfter
+from telegram.request import HTTPXRequest
+
+logger = logging.getLogger(__name__)
+
+
+class TelegramDispatcher:
+    """
+    Отправка сообщений Telegram из любых потоков без ожидания.
+
+    Один Bot и один HTTP пул живут в собственном потоке с event loop.
+    submit() только ставит сообщение в очередь и сразу возвращает Future
+    с результатом, поэтому потоки стриминга не ждут HTTP запросов.
+
+    У каждого чата своя очередь и задача отправки: чаты обслуживаются
+    параллельно, сообщения одного чата уходят по порядку и не чаще
+    per_chat_interval. Общая скорость ограничена global_rate сообщений
+    в секунду (лимит Telegram - около 30). На RetryAfter чат ждет
+    указанное Telegram время, сетевые ошибки повторяются с задержкой.
+    """
+
+    def __init__(self, token, global_rate=25, per_chat_interval=1.0, max_concurrency=16,
+                 queue_size=1000, max_retries=3):
+        """
+        Args:
+            token: Токен бота
+            global_rate: Максимум сообщений в секунду на все чаты
+            per_chat_interval: Минимальный интервал между сообщениями в один чат (сек)
+            max_concurrency: Максимум одновременных HTTP запросов
+            queue_size: Максимум сообщений в очереди (лишние отбрасываются)
+            max_retries: Повторы при сетевых ошибках и RetryAfter
+        """
+        self.token = token
+        self.global_rate = global_rate
+        self.per_chat_interval = per_chat_interval
+        self.max_concurrency = max_concurrency
+        self.queue_size = queue_size
+        self.max_retries = max_retries
+
+        self.loop = None
+        self.thread = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._pending = 0
+
+        # Создаются в потоке отправки
+        self._bot = None
+        self._initialized = False
+        self._chats = {}
+        self._semaphore = None
+        self._tokens = float(global_rate)
+        self._tokens_at = 0.0
+
+        # Счетчики
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.retried = 0
+        self.rate_limited = 0
+
+    def start(self):
+        """Запуск потока отправки"""
+        with self._lock:
+            if self.thread and self.thread.is_alive():
+                return
+            self._ready.clear()
+            self.thread = threading.Thread(target=self._run, name="telegram-dispatcher", daemon=True)
+            self.thread.start()
+        self._ready.wait(10)
+
+    def submit(self, chat_id, text, parse_mode=None, disable_notification=False):
+        """
+        Постановка сообщения в очередь (не блокирует)
+
+        Returns:
+            concurrent.futures.Future: True после доставки, False при ошибке или переполнении очереди
+        """
+        future = Future()
+        if not self._ready.is_set():
+            self.start()
+
+        with self._lock:
+            if self._pending >= self.queue_size or self.loop is None:
+                self.dropped += 1
+                future.set_result(False)
+                return future
+            self._pending += 1
+
+        message = (chat_id, text, parse_mode, disable_notification, future)
+        try:
+            self.loop.call_soon_threadsafe(self._enqueue, message)
+        except RuntimeError:
+            # Цикл уже остановлен
+            with self._lock:
+                self._pending -= 1
+                self.dropped += 1
+            future.set_result(False)
+        return future
+
+    def broadcast(self, chat_ids, text, parse_mode=None, disable_notification=False):
+        """Постановка сообщения в очередь каждого чата: {chat_id: Future}"""
+        return {chat_id: self.submit(chat_id, text, parse_mode, disable_notification) for chat_id in chat_ids}
+
+    def stats(self):
+        """Счетчики отправки"""
+        with self._lock:
+            pending = self._pending
+        return {
+            'pending': pending,
+            'sent': self.sent,
+            'failed': self.failed,
+            'dropped': self.dropped,
+            'retried': self.retried,
+            'rate_limited': self.rate_limited,
+            'chats': len(self._chats),
+        }
+
+    def stop(self, timeout=10):
+        """Досылка очереди (не дольше timeout секунд) и остановка потока"""
+        if self.loop is None or not self.thread or not self.thread.is_alive():
+            return
+
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                if not self._pending:
+                    break
+            time.sleep(0.05)
+
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout)
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self._bot = Bot(self.token, request=HTTPXRequest(connection_pool_size=self.max_concurrency))
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._tokens_at = time.monotonic()
+            self._ready.set()
+            logger.info("✅ Telegram dispatcher started")
+            self.loop.run_forever()
+        except Exception as e:
+            logger.error(f"❌ Telegram dispatcher error: {e}")
+        finally:
+            tasks = asyncio.all_tasks(self.loop)
+            for task in tasks:
+                task.cancel()
+            self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            if self._initialized:
+                try:
+                    self.loop.run_until_complete(self._bot.shutdown())
+                except Exception:
+                    pass
+            self.loop.close()
+            self.loop = None
+            self._ready.set()
+
+    def _enqueue(self, message):
+        chat_id = message[0]
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            chat = self._chats[chat_id] = asyncio.Queue()
+            self.loop.create_task(self._chat_worker(chat_id, chat))
+        chat.put_nowait(message)
+
+    async def _chat_worker(self, chat_id, chat):
+        """Последовательная отправка сообщений одного чата"""
+        last_sent = 0.0
+        while True:
+            _, text, parse_mode, disable_notification, future = await chat.get()
+
+            wait = last_sent + self.per_chat_interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+            success = await self._send(chat_id, text, parse_mode, disable_notification)
+            last_sent = time.monotonic()
+
+            with self._lock:
+                self._pending -= 1
+            future.set_result(success)
+
+    async def _send(self, chat_id, text, parse_mode, disable_notification):
+        for attempt in range(self.max_retries + 1):
+            await self._acquire_rate()
+            try:
+                if not self._initialized:
+                    # Инициализация запрашивает getMe: при недоступном Telegram повторится со следующим сообщением
+                    await self._bot.initialize()
+                    self._initialized = True
+                async with self._semaphore:
+                    await self._bot.send_message(
+                        chat_id=chat_id,
+                        text=text,
+                        parse_mode=parse_mode,
+                        disable_notification=disable_notification
+                    )
+                self.sent += 1
+                return True
+
+            except RetryAfter as e:
+                delay = e.retry_after
+                if isinstance(delay, timedelta):
+                    delay = delay.total_seconds()
+                self.rate_limited += 1
+                logger.warning(f"⚠️ Telegram flood limit for {chat_id}, retry in {delay}s")
+                if attempt == self.max_retries:
+                    break
+                self.retried += 1
+                await asyncio.sleep(delay)
+
+            except NetworkError as e:
+                if attempt == self.max_retries:
+                    logger.error(f"❌ Error sending message to {chat_id}: {e}")
+                    break
+                self.retried += 1
+                await asyncio.sleep(min(2 ** attempt, 30))
+
+            except Exception as e:
+                logger.error(f"❌ Error sending message to {chat_id}: {e}")
+                break
+
+        self.failed += 1
+        return False
+
+    async def _acquire_rate(self):
+        """Общий лимит скорости (token bucket)"""
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.global_rate, self._tokens + (now - self._tokens_at) * self.global_rate)
+            self._tokens_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.global_rate)
+
+
+_dispatchers = {}
+_dispatchers_lock = threading.Lock()
+
+
+def get_dispatcher(token):
+    """Общий диспетчер процесса для токена (запускается при первом обращении)"""
+    with _dispatchers_lock:
+        dispatcher = _dispatchers.get(token)
+        if dispatcher is None:
+            dispatcher = _dispatchers[token] = TelegramDispatcher(token)
+            atexit.register(dispatcher.stop)
+    dispatcher.start()
+    return dispatcher
@@ -0,0 +1,132 @@
+import json
+import logging
+from collections import namedtuple
+
+try:
+    import orjson
+
+    json_loads = orjson.loads
+    JSON_BACKEND = 'orjson'
+except ImportError:
+    json_loads = json.loads
+    JSON_BACKEND = 'json'
+
+logger = logging.getLogger(__name__)
+
+# Строка таблицы полей: JSON ключ -> колонка -> тип (float, time, text) -> значение по умолчанию
+FieldSpec = namedtuple('FieldSpec', ['key', 'column', 'kind', 'default'])
+
+FIELD_KINDS = ('float', 'time', 'text')
+
+
+def field_specs(float_fields=(), time_fields=(), text_fields=(),
+                float_default=0.0, time_default=0, text_default=''):
+    """Таблица полей из списков пар (JSON ключ, колонка)"""
+    specs = [FieldSpec(key, column, 'float', float_default) for key, column in float_fields]
+    specs += [FieldSpec(key, column, 'time', time_default) for key, column in time_fields]
+    specs += [FieldSpec(key, column, 'text', text_default) for key, column in text_fields]
+    return specs
+
+
+class TickerDecoder:
+    """
+    Разбор поля data тикера Bybit по таблице полей.
+
+    По таблице один раз генерируется функция без циклов: каждое поле
+    читается одним dict.get и преобразуется на месте, без вызова
+    safe_float на каждое значение. Отсутствующее или некорректное
+    значение заменяется default своей строки таблицы.
+
+    decode(data) возвращает (floats, times, texts) в порядке таблицы.
+    """
+
+    def __init__(self, specs):
+        """
+        Args:
+            specs: Список FieldSpec
+        """
+        self.specs = list(specs)
+        for spec in self.specs:
+            if spec.kind not in FIELD_KINDS:
+                raise ValueError(f"Unknown field kind: {spec.kind} ({spec.key})")
+
+        self.float_specs = [s for s in self.specs if s.kind == 'float']
+        self.time_specs = [s for s in self.specs if s.kind == 'time']
+        self.text_specs = [s for s in self.specs if s.kind == 'text']
+        self.decode = self._compile()
+
+    def _compile(self):
+        lines = ["def decode(data):", "    get = data.get"]
+        namespace = {'_float': float, '_int': int}
+        names = {'float': [], 'time': [], 'text': []}
+
+        for n, spec in enumerate(self.specs):
+            var = f"v{n}"
+            default = f"d{n}"
+            namespace[default] = spec.default
+            names[spec.kind].append(var)
+
+            lines.append(f"    {var} = get({spec.key!r})")
+            if spec.kind == 'text':
+                lines.append(f"    if {var} is None: {var} = {default}")
+                continue
+
+            convert = '_float' if spec.kind == 'float' else '_int'
+            # Пустая строка и None - отсутствующее значение
+            lines += [
+                f"    if {var}:",
+                f"        try: {var} = {convert}({var})",
+                f"        except (ValueError, TypeError): {var} = {default}",
+                f"    else: {var} = {default}",
+            ]
+
+        lines.append(
+            f"    return [{', '.join(names['float'])}], "
+            f"({''.join(v + ', ' for v in names['time'])}), "
+            f"({''.join(v + ', ' for v in names['text'])})"
+        )
+
+        exec(compile('\n'.join(lines), f"<ticker decoder {len(self.specs)} fields>", 'exec'), namespace)
+        return namespace['decode']
+
+
+def install_fast_handler(ws):
+    """
+    Ускоренный разбор сообщений pybit WebSocket
+
+    Подменяет _on_message экземпляра: JSON разбирается быстрым бэкендом
+    (orjson, если установлен), а тикеры передаются в callback без
+    copy.deepcopy всего сообщения, которое pybit делает на каждый тикер.
+    Delta по-прежнему накладывается на ws.data[topic], поэтому callback
+    получает полное состояние символа с type='snapshot'.
+
+    Callback не должен изменять полученный data.
+    """
+    handle_incoming = ws.callback
+    is_custom_pong = ws._is_custom_pong
+
+    def on_message(raw):
+        message = json_loads(raw)
+        topic = message.get('topic')
+        if topic is None or not topic.startswith('tickers.'):
+            if not is_custom_pong(message):
+                handle_incoming(message)
+            return
+
+        data = message['data']
+        if message.get('type') == 'snapshot' or topic not in ws.data:
+            ws.data[topic] = data
+        else:
+            ws.data[topic].update(data)
+
+        callback = ws.callback_directory.get(topic)
+        if callback is not None:
+            callback_data = dict(message)
+            callback_data['type'] = 'snapshot'
+            callback_data['data'] = ws.data[topic]
+            callback(callback_data)
+
+    ws._on_message = on_message
+    logger.info(f"Fast ticker handler installed (JSON backend: {JSON_BACKEND})")
+    return ws
+
@@ -0,0 +1,200 @@
+import threading
+import numpy as np
+
+from utils.ticker_decoder import TickerDecoder, field_specs
+
+
+class TickerStateTable:
+    """
+    Последнее состояние тикеров по символам.
+
+    Одна строка на символ, одна колонка на поле. Bybit присылает по linear
+    тикерам snapshot, а затем delta только с изменившимися полями: delta
+    применяется к строке на месте, поэтому наружу всегда уходит полная
+    строка, а не нули вместо отсутствующих полей.
+
+    Таблица обновляется из потока WebSocket и может читаться из любых
+    других потоков через get() и latest().
+    """
+
+    def __init__(self, float_fields, time_fields=(), text_fields=(), capacity=1024):
+        """
+        Args:
+            float_fields: JSON ключи числовых полей (значения хранятся в float64)
+            time_fields: JSON ключи временных полей (epoch-ms, int64)
+            text_fields: JSON ключи строковых полей
+            capacity: Начальное количество строк (растет автоматически)
+        """
+        self.float_fields = list(float_fields)
+        self.time_fields = list(time_fields)
+        self.text_fields = list(text_fields)
+        self.capacity = capacity
+
+        self.symbols = []
+        self.index = {}
+
+        self.values = np.zeros((capacity, len(self.float_fields)), dtype=np.float64)
+        self.seen = np.zeros((capacity, len(self.float_fields)), dtype=bool)
+        self.times = np.zeros((capacity, len(self.time_fields)), dtype=np.int64)
+        self.texts = np.full((capacity, len(self.text_fields)), '', dtype=object)
+        self.event_time = np.zeros(capacity, dtype=np.int64)
+        self.ready = np.zeros(capacity, dtype=bool)
+
+        self._decode = TickerDecoder(field_specs(
+            float_fields=[(key, key) for key in self.float_fields],
+            time_fields=[(key, key) for key in self.time_fields],
+            text_fields=[(key, key) for key in self.text_fields],
+            float_default=np.nan,
+            text_default=None
+        )).decode
+
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def row_index(self, symbol):
+        """Индекс строки символа (создается при первом обращении)"""
+        with self._lock:
+            return self._row_index(symbol)
+
+    def _row_index(self, symbol):
+        i = self.index.get(symbol)
+        if i is None:
+            i = len(self.symbols)
+            if i >= self.capacity:
+                self._grow()
+            self.symbols.append(symbol)
+            self.index[symbol] = i
+        return i
+
+    def apply(self, data, event_time=0, snapshot=False):
+        """
+        Применение snapshot или delta сообщения
+
+        Args:
+            data: Поле data сообщения Bybit
+            event_time: Время события в epoch-ms
+            snapshot: Сообщение содержит все поля символа
+
+        Returns:
+            Индекс строки, если строка полная, иначе None
+        """
+        symbol = data.get('symbol')
+        if not symbol:
+            return None
+
+        # NaN, 0 и None - поле отсутствует в сообщении, значение в строке не меняется
+        floats, times, texts = self._decode(data)
+        floats = np.array(floats, dtype=np.float64)
+        present = floats == floats
+
+        with self._lock:
+            i = self._row_index(symbol)
+            seen = self.seen[i]
+
+            if present.all():
+                self.values[i] = floats
+                seen[:] = True
+            else:
+                self.values[i, present] = floats[present]
+                seen |= present
+
+            for j, value in enumerate(times):
+                if value:
+                    self.times[i, j] = value
+
+            for j, value in enumerate(texts):
+                if value is not None:
+                    self.texts[i, j] = value
+
+            if event_time:
+                self.event_time[i] = event_time
+
+            # Строка считается полной после snapshot или когда все поля пришли хотя бы раз
+            if not self.ready[i] and (snapshot or seen.all()):
+                self.ready[i] = True
+
+            return i if self.ready[i] else None
+
+    def record(self, i):
+        """
+        Полная строка символа для записи
+
+        Returns:
+            (symbol, times, texts, floats) - floats является копией строки
+        """
+        with self._lock:
+            return (
+                self.symbols[i],
+                tuple(int(x) for x in self.times[i]),
+                tuple(self.texts[i]),
+                self.values[i].copy()
+            )
+
+    def get(self, symbol):
+        """Последнее состояние символа в виде словаря или None"""
+        with self._lock:
+            i = self.index.get(symbol)
+            if i is None or not self.ready[i]:
+                return None
+
+            state = dict(zip(self.float_fields, self.values[i].tolist()))
+            state.update(zip(self.time_fields, self.times[i].tolist()))
+            state.update(zip(self.text_fields, self.texts[i]))
+            state['symbol'] = symbol
+            state['ts'] = int(self.event_time[i])
+            return state
+
+    def latest(self, fields=None):
+        """
+        Снимок состояния всех полных строк
+
+        Args:
+            fields: JSON ключи числовых полей (по умолчанию все)
+
+        Returns:
+            (symbols, values) - список символов и матрица float64 [символы x поля]
+        """
+        columns = [self.float_fields.index(f) for f in fields] if fields else slice(None)
+        with self._lock:
+            n = len(self.symbols)
+            ready = np.flatnonzero(self.ready[:n])
+            symbols = [self.symbols[i] for i in ready]
+            values = self.values[ready][:, columns]
+        return symbols, values
+
+    def matrix(self, fields=None):
+        """
+        Снимок состояния всех строк, включая неполные
+
+        Индекс строки совпадает с row_index() символа, поэтому по нему можно
+        хранить собственное состояние символа между вызовами.
+
+        Returns:
+            (symbols, ready, values) - список символов, маска полных строк и матрица float64
+        """
+        columns = [self.float_fields.index(f) for f in fields] if fields else slice(None)
+        with self._lock:
+            n = len(self.symbols)
+            symbols = list(self.symbols)
+            ready = self.ready[:n].copy()
+            values = self.values[:n][:, columns]
+        return symbols, ready, values
+
+    def _grow(self):
+        """Удвоение емкости таблицы"""
+        new_capacity = self.capacity * 2
+
+        def grow(array, fill):
+            grown = np.full((new_capacity,) + array.shape[1:], fill, dtype=array.dtype)
+            grown[:self.capacity] = array
+            return grown
+
+        self.values = grow(self.values, 0.0)
+        self.seen = grow(self.seen, False)
+        self.times = grow(self.times, 0)
+        self.texts = grow(self.texts, '')
+        self.event_time = grow(self.event_time, 0)
+        self.ready = grow(self.ready, False)
+        self.capacity = new_capacity